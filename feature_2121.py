@@ -29,10 +29,35 @@ from pyhid.hidpp.features.hireswheel                import GetWheelMode
 from pyhid.hidpp.features.hireswheel                import GetWheelModeResponse
 from pyhid.hidpp.features.hireswheel                import SetWheelMode
 from pyhid.hidpp.features.hireswheel                import SetWheelModeResponse
-from pyhid.hidpp.features.hireswheel                import GetRatchetSwitchState
-from pyhid.hidpp.features.hireswheel                import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel                import RatchetSwitch
+from pyhid.hidpp.features.hireswheel                import WheelMovement
+from pyhid.hidpp.features.hireswheel                import HiResWheelRequestTemplates
+from pyhid.hidpp.features.hireswheel                import messageClassOf
+from pyhid.hidpp.features.hireswheelpipeline        import HiResWheelPipeline
+from pyhid.hidpp.features.hireswheelstate           import HiResWheelStateMirror
+from pyhid.hidpp.features.hireswheelcapture         import HiResWheelCaptureWriter
+from pyhid.hidpp.features.hireswheeldispatch        import HiResWheelRingBuffer
+from pyhid.hidpp.features.hireswheeldispatch        import HiResWheelRouter
+from pyhid.hidpp.features.hireswheeldispatch        import getConnectionKey
+from pyhid.hidpp.features.hireswheeldispatch        import resetConnection
+from pyhid.hidpp.features.hireswheelcapture         import SENT
+from pyhid.hidpp.features.hireswheellatency         import HiResWheelLatencyRecorder
+from pyhid.hidpp.features.hireswheelclock           import SYSTEM_CLOCK
+from pyhid.hidpp.features.hireswheelclock           import VirtualClock
+from pyhid.hidpp.features.hireswheelemulator        import HiResWheelEmulator
+from pyhid.hidpp.features.hireswheeltransport       import HiResWheelEmulatorTransport
+from pyhid.hidpp.featuremappingcache                import FeatureMappingCache
+from pytestbox.hid.mouse.hireswheelsettings         import HiResWheelSettings
+
+import atexit
+import logging
+import os
 
-import unittest
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+# Run report of the module, see HiResWheelTestCase.tearDownClass()
+LOGGER = logging.getLogger(__name__)
 
 # ----------------------------------------------------------------------------
 # implementation
@@ -42,21 +67,342 @@ class HiResWheelTestCase(BaseTestCase):
     '''
     Validates HiRes Wheel TestCases
     '''
+    # Encoded requests shared by the whole session, see HiResWheelRequestTemplates
+    requestTemplates = HiResWheelRequestTemplates()
+    # Feature indexes shared by the whole session, keyed by device connection, see getDeviceKey()
+    featureMappingCache = FeatureMappingCache()
+    # Last connection key of each device index, a new key forgets the state of the device, see setUp()
+    deviceKeys = {}
+    # HIRESWHEEL product settings by device index, converted on first use, see getHiResWheelSettings()
+    hiResWheelSettings = {}
+    # HiRes Wheel state reported by the device, fed by getMessage()
+    stateMirror = HiResWheelStateMirror()
+    # 0x2121 messages read by the HID dispatcher, one queue per class, installed by setUp(), see createRouter()
+    router = None
+    # WheelMovement and RatchetSwitch are kept in HiResWheelRingBuffer queues of EVENT_CAPACITY events
+    EVENT_CAPACITY = 256
+    EVENT_OVERFLOW_POLICY = HiResWheelRingBuffer.DROP_OLDEST
+    # WheelMovement merge window in seconds and maximum merged count, see WheelMovementCoalescer, None to keep
+    # every notification
+    COALESCE_WINDOW = None
+    COALESCE_COUNT = None
+    # Capture file of the traffic, see HiResWheelCaptureWriter, set by the CAPTURE_PATH_VARIABLE environment variable
+    CAPTURE_PATH_VARIABLE = 'HIRESWHEEL_CAPTURE_PATH'
+    captureWriter = None
+    # Round-trip latency of each function, added to the run report by tearDownClass(), also saved as JSON
+    # when the LATENCY_REPORT_PATH_VARIABLE environment variable is set
+    latencyRecorder = HiResWheelLatencyRecorder()
+    LATENCY_REPORT_PATH_VARIABLE = 'HIRESWHEEL_LATENCY_REPORT_PATH'
+    # Time source of the router and receiveResponse() waits
+    clock = SYSTEM_CLOCK
+    # Wait for a pipelined response, see receiveResponse()
+    RESPONSE_TIMEOUT = 2.0
+    # Rolls the wheel and presses the ratchet switch button, see HiResWheelEmulator, None without a robot arm
+    wheelActuator = None
+    # Wheel movement of the WheelMovement tests, in the unit of the current resolution
+    WHEEL_DELTA_V = 3
 
     def setUp(self):
         """
         Handles test prerequisites.
         """
         super(HiResWheelTestCase, self).setUp()
+        self.setUpHiResWheel()
+    # end def setUp
+
+    def setUpHiResWheel(self):
+        """
+        Handles the 0x2121 prerequisites, on the device and HID dispatcher opened by setUp()
+        """
+        capturePath = os.environ.get(self.CAPTURE_PATH_VARIABLE)
+        if capturePath and HiResWheelTestCase.captureWriter is None:
+            # One capture for the whole run, every test class included
+            HiResWheelTestCase.captureWriter = HiResWheelCaptureWriter(capturePath)
+            atexit.register(HiResWheelTestCase.captureWriter.close)
+        # end if
 
         # ---------------------------------------------------------------------------
         self.logTitle2('Prerequisite 1: Send Root.GetFeature(0x2121)')
         # ---------------------------------------------------------------------------
-        self.featureId = self.updateFeatureMapping(featureId=HiResWheel.FEATURE_ID)
+        deviceKey = self.getDeviceKey()
+        if self.deviceKeys.get(self.deviceIndex) != deviceKey:
+            # New connection: the device may have been reset or updated since the state was mirrored
+            self.stateMirror.invalidate(self.deviceIndex)
+            self.deviceKeys[self.deviceIndex] = deviceKey
+        # end if
+        self.featureId = self.featureMappingCache.getFeatureIndex(
+            deviceKey=deviceKey,
+            featureId=HiResWheel.FEATURE_ID,
+            resolve=lambda: self.updateFeatureMapping(featureId=HiResWheel.FEATURE_ID),
+            register=self.registerFeatureIndex)
+        self.router = self.createRouter(self.COALESCE_WINDOW, self.COALESCE_COUNT)
+        self.router.install(self.hidDispatcher)
 
         # Function that analyze the response
         self.getUsefulBit = lambda desiredValue,desiredBit : bin(int(desiredValue))[2:].zfill(8)[desiredBit]
-    # end def setUp
+    # end def setUpHiResWheel
+
+    def tearDown(self):
+        """
+        Leaves the 0x2121 reports to the HID dispatcher again
+        """
+        self.tearDownHiResWheel()
+        super(HiResWheelTestCase, self).tearDown()
+    # end def tearDown
+
+    def tearDownHiResWheel(self):
+        """
+        Uninstalls the router, reporting the events it dropped
+        """
+        if self.router is not None:
+            self.router.uninstall(self.hidDispatcher)
+            for messageClass in (WheelMovement, RatchetSwitch):
+                events = self.router.getQueue(messageClass)
+                if events.dropped:
+                    LOGGER.warning('%s: %d of %d %s events dropped, the test read them too late', self.id(),
+                                   events.dropped, events.received, messageClass.__name__)
+                # end if
+            # end for
+            self.router = None
+        # end if
+    # end def tearDownHiResWheel
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Adds the latency statistics of the test class to the run report
+
+        The JSON file, if any, is named after the test class: the classes
+        of the module have their own statistics.
+        """
+        if cls.latencyRecorder.histograms:
+            LOGGER.info('%s round-trip latency:\n%s', cls.__name__, cls.latencyRecorder.getReport())
+            LOGGER.info('%s round-trip latency (JSON):\n%s', cls.__name__, cls.latencyRecorder.toJson())
+            latencyReportPath = os.environ.get(cls.LATENCY_REPORT_PATH_VARIABLE)
+            if latencyReportPath:
+                root, extension = os.path.splitext(latencyReportPath)
+                cls.latencyRecorder.save('%s.%s%s' % (root, cls.__name__, extension))
+            # end if
+        # end if
+        super(HiResWheelTestCase, cls).tearDownClass()
+    # end def tearDownClass
+
+    def getDeviceKey(self):
+        """
+        Identifies the current connection of the device for the feature mapping cache
+
+        The firmware of the device can only change across a reset, which
+        ends the connection: the key follows the device itself, whatever
+        the PRODUCT settings say, see getConnectionKey().
+
+        @return (tuple) device index, HID dispatcher session and connection number
+        """
+        return getConnectionKey(self.hidDispatcher, self.deviceIndex)
+    # end def getDeviceKey
+
+    def registerFeatureIndex(self, featureIndex):
+        """
+        Registers a cached 0x2121 feature index in the dispatcher, as updateFeatureMapping() does
+
+        @param  featureIndex           [in] (int)  feature index of 0x2121
+        """
+        self.hidDispatcher.addFeatureEntry(featureIndex, HiResWheel.FEATURE_ID)
+    # end def registerFeatureIndex
+
+    def invalidateDevice(self):
+        """
+        Forgets the feature index and the state cached for the device
+
+        To be called by a test resetting the device itself, the next setUp()
+        then asks the device for the feature index again. A reconnection is
+        seen by getDeviceKey() without it.
+        """
+        self.featureMappingCache.invalidate(self.getDeviceKey())
+        resetConnection(self.hidDispatcher, self.deviceIndex)
+        self.stateMirror.invalidate(self.deviceIndex)
+    # end def invalidateDevice
+
+    def getHiResWheelSettings(self):
+        """
+        Gets the HIRESWHEEL product settings, converted once per session and device index
+
+        @return (HiResWheelSettings) read-only settings record
+        """
+        settings = self.hiResWheelSettings.get(self.deviceIndex)
+        if settings is None:
+            settings = self.hiResWheelSettings[self.deviceIndex] = HiResWheelSettings.fromFeatures(self.getFeatures())
+        # end if
+        return settings
+    # end def getHiResWheelSettings
+
+    def sendReport(self, data):
+        """
+        Sends a report to the device, recording it in the capture, starting its latency measure and
+        forgetting the wheelMode a SetWheelMode changes
+
+        @param  data                   [in] (HidppMessage, HexList, bytearray)  report to send
+        """
+        if self.captureWriter is not None:
+            self.captureWriter.write(SENT, data if isinstance(data, (list, bytearray)) else data.toHexList())
+        # end if
+        if isinstance(data, (list, bytearray)):
+            functionIndex, softwareId = data[3] >> 4, data[3] & 0x0F
+        else:
+            functionIndex, softwareId = int(data.functionIndex), int(data.softwareId)
+        # end if
+        if (data[2] if isinstance(data, (list, bytearray)) else int(data.featureIndex)) == self.featureId:
+            self.stateMirror.requestSent(self.deviceIndex, functionIndex)
+        # end if
+        self.latencyRecorder.requestSent(self.deviceIndex, functionIndex, softwareId)
+        self.device.sendReport(data=data)
+    # end def sendReport
+
+    def getMessage(self, *args, **kwargs):
+        """
+        Gets a message, keeping track of the state reported by the device and ending the latency measure of
+        its request
+
+        @param  args                   [in] (tuple)  see BaseTestCase.getMessage()
+        @param  kwargs                 [in] (dict)   see BaseTestCase.getMessage()
+        @return (HidppMessage) received message
+        """
+        message = self.receiveMessage(*args, **kwargs)
+        if isinstance(message, ErrorCodes):
+            self.latencyRecorder.responseReceived(self.deviceIndex, int(message.softwareId), error=True)
+        elif issubclass(messageClassOf(message), HiResWheel) and not message.EVENT:
+            self.latencyRecorder.responseReceived(int(message.deviceIndex), int(message.softwareId))
+        # end if
+        self.stateMirror.update(message)
+        return message
+    # end def getMessage
+
+    def createRouter(self, coalesceWindow=None, coalesceCount=None):
+        """
+        Creates the router of the 0x2121 messages read by the HID dispatcher, recording them in the capture
+
+        @param  coalesceWindow         [in] (float)  WheelMovement merge window in seconds, None for no limit
+        @param  coalesceCount          [in] (int)    maximum number of merged WheelMovement, None for no limit
+        @return (HiResWheelRouter) router of the 0x2121 feature index, with bounded event queues
+        """
+        return HiResWheelRouter(self.featureId, eventCapacity=self.EVENT_CAPACITY,
+                                overflowPolicy=self.EVENT_OVERFLOW_POLICY,
+                                coalesceWindow=coalesceWindow, coalesceCount=coalesceCount, clock=self.clock,
+                                capture=self.captureWriter)
+    # end def createRouter
+
+    def receiveMessage(self, queue, classType, **kwargs):
+        """
+        Reads a message from the device, from the router queue of its class when the router takes it
+
+        @param  queue                  [in] (Queue)  HID dispatcher queue, see BaseTestCase.getMessage()
+        @param  classType              [in] (type)   message class
+        @param  kwargs                 [in] (dict)   see BaseTestCase.getMessage()
+        @return (HidppMessage) received message, None on timeout
+        """
+        if self.router is not None and self.router.routes(classType):
+            return self.router.getMessage(classType, timeout=kwargs.get('timeout', self.RESPONSE_TIMEOUT))
+        # end if
+        return self.readMessage(queue=queue, classType=classType, **kwargs)
+    # end def receiveMessage
+
+    def readMessage(self, *args, **kwargs):
+        """
+        Reads a message the router does not take from the HID dispatcher
+
+        @param  args                   [in] (tuple)  see BaseTestCase.getMessage()
+        @param  kwargs                 [in] (dict)   see BaseTestCase.getMessage()
+        @return (HidppMessage) received message
+        """
+        return super(HiResWheelTestCase, self).getMessage(*args, **kwargs)
+    # end def readMessage
+
+    def getWheelActuator(self, reason):
+        """
+        Gets the robot arm of the wheel, skipping the test when there is none
+
+        @param  reason                 [in] (str)  skip message
+        @return (HiResWheelEmulator) object with spin(deltaV), toggleRatchet() and clock
+        """
+        if self.wheelActuator is None:
+            self.skipTest(reason)
+        # end if
+        return self.wheelActuator
+    # end def getWheelActuator
+
+    def restoreDefaultIfDirty(self):
+        """
+        Restores the default wheelMode, unless the device already confirmed it
+        """
+        response = self.stateMirror.restoreDefaultIfDirty(
+            deviceIndex=self.deviceIndex,
+            featureIndex=self.featureId,
+            send=lambda request: self.sendReport(data=request),
+            receive=lambda responseClass: self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                                          classType=responseClass))
+        if response is not None:
+            self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        # end if
+    # end def restoreDefaultIfDirty
+
+    def getRatchetSwitchState(self):
+        """
+        Gets the ratchetMode, from the state mirror while it is confident, from the device otherwise
+
+        @return (int) ratchetMode, None if the device did not answer
+        """
+        return self.stateMirror.getRatchetSwitchState(
+            deviceIndex=self.deviceIndex,
+            featureIndex=self.featureId,
+            send=lambda request: self.sendReport(data=request),
+            receive=lambda responseClass: self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                                          classType=responseClass))
+    # end def getRatchetSwitchState
+
+    def assertFieldsEqual(self, expected, obtained, fields):
+        """
+        Checks the settings encoded in a masked field with a single comparison, naming them on a mismatch
+
+        @param  expected               [in] (int)    expected byte, see HiResWheelSettings
+        @param  obtained               [in] (int)    obtained byte, masked
+        @param  fields                 [in] (tuple)  HiResWheelSettings.CAPABILITIES_FIELDS or WHEEL_MODE_FIELDS
+        """
+        if obtained != expected:
+            self.assertEqual(expected=HiResWheelSettings.decodeFields(expected, fields),
+                             obtained=HiResWheelSettings.decodeFields(obtained, fields),
+                             msg='The %s parameter differs from the one expected'
+                                 % ' and '.join(HiResWheelSettings.getDifferentFields(fields, expected, obtained)))
+        # end if
+    # end def assertFieldsEqual
+
+    def receiveResponse(self, responseClass, timeout=None):
+        """
+        Gets the next response or error message, whichever comes first
+
+        The wait blocks on the router until either queue receives a message.
+
+        @param  responseClass          [in] (type)   expected response class
+        @param  timeout                [in] (float)  maximum wait in seconds, RESPONSE_TIMEOUT by default
+        @return (HidppMessage) response or ErrorCodes message, None on timeout
+        """
+        readyClass = self.router.waitForAny((ErrorCodes, responseClass),
+                                            timeout=self.RESPONSE_TIMEOUT if timeout is None else timeout)
+        if readyClass is ErrorCodes:
+            return self.getMessage(queue=self.hidDispatcher.errorMessageQueue, classType=ErrorCodes)
+        elif readyClass is not None:
+            return self.getMessage(queue=self.hidDispatcher.mouseMessageQueue, classType=responseClass)
+        # end if
+        return None
+    # end def receiveResponse
+
+    def createPipeline(self):
+        """
+        Creates a request pipeline on the device mouse and error message queues
+
+        @return (HiResWheelPipeline) pipeline keeping up to 15 requests in flight
+        """
+        return HiResWheelPipeline(send=lambda request: self.sendReport(data=request),
+                                  receive=self.receiveResponse)
+    # end def createPipeline
 
     @features('Feature2121')
     @level('Interface')
@@ -73,29 +419,23 @@ class HiResWheelTestCase(BaseTestCase):
         getWheelCapability = GetWheelCapability(
             deviceIndex=self.deviceIndex,
             featureId=self.featureId)
-        self.device.sendReport(data=getWheelCapability)
+        self.sendReport(data=getWheelCapability)
         response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
                                    classType=GetWheelCapabilityResponse)
         self.logTrace('GetWheelCapability Response: %s\n' % str(response))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Validate GetWheelCapability.multiplier value')
         # ---------------------------------------------------------------------------
-        f = self.getFeatures()
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Multiplier,
+        settings = self.getHiResWheelSettings()
+        self.assertEqual(expected=settings.multiplier,
                          obtained=int(response.multiplier),
                          msg='The multiplier parameter differs from the one expected')
         # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 2: Validate GetWheelCapability.hasSwitch value')
-        # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_HasSwitch,
-                         obtained=getUsefulBit(response.capabilities, 2),
-                         msg='The hasSwitch parameter differs from the one expected')
+        self.logTitle2('Test Check 2: Validate GetWheelCapability.hasSwitch and hasInvert values')
         # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 3: Validate GetWheelCapability.hasInvert value')
-        # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_HasInvert,
-                         obtained=getUsefulBit(response.capabilities, 3),
-                         msg='The hasInvert parameter differs from the one expected')
+        self.assertFieldsEqual(expected=settings.capabilities,
+                               obtained=int(response.capabilities) & settings.CAPABILITIES_MASK,
+                               fields=settings.CAPABILITIES_FIELDS)
 
         self.testCaseChecked("FNT_2121_0001")
     # end def test_GetWheelCapability
@@ -115,29 +455,17 @@ class HiResWheelTestCase(BaseTestCase):
         getWheelMode = GetWheelMode(
            deviceIndex=self.deviceIndex,
             featureId=self.featureId)
-        self.device.sendReport(data=getWheelMode)
+        self.sendReport(data=getWheelMode)
         response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
                                    classType=GetWheelModeResponse)
         self.logTrace('GetWheelMode Response: %s\n' % str(response))
         # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 1: Validate GetWheelMode.target value')
-        # ---------------------------------------------------------------------------
-        f = self.getFeatures()
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Target_Default,
-                         obtained=getUsefulBit(response.wheelMode, 0),
-                         msg='The target parameter differs from the one expected')
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 2: Validate GetWheelMode.resolution value')
-        # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Resolution_Default,
-                         obtained=getUsefulBit(response.wheelMode, 1),
-                         msg='The resolution parameter differs from the one expected')
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 3: Validate GetWheelMode.invert value')
+        self.logTitle2('Test Check 1: Validate GetWheelMode.target, resolution and invert values')
         # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Invert_Default,
-                         obtained=getUsefulBit(response.wheelMode, 2),
-                         msg='The invert parameter differs from the one expected')
+        settings = self.getHiResWheelSettings()
+        self.assertFieldsEqual(expected=settings.defaultWheelMode,
+                               obtained=int(response.wheelMode) & settings.WHEEL_MODE_MASK,
+                               fields=settings.WHEEL_MODE_FIELDS)
 
         self.testCaseChecked("FNT_2121_0002")
     # end def test_GetWheelMode
@@ -158,39 +486,20 @@ class HiResWheelTestCase(BaseTestCase):
             deviceIndex=self.deviceIndex,
             featureId=self.featureId,
             wheelMode=7)
-        self.device.sendReport(data=setWheelMode)
+        self.sendReport(data=setWheelMode)
         response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
                                    classType=SetWheelModeResponse)
         self.logTrace('SetWheelMode Response: %s\n' % str(response))
         # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 1: Validate SetWheelMode.target value')
-        # ---------------------------------------------------------------------------
-        f = self.getFeatures()
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Target,
-                         obtained=getUsefulBit(response.wheelMode, 0),
-                         msg='The target parameter differs from the one expected')
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 2: Validate SetWheelMode.resolution value')
+        self.logTitle2('Test Check 1: Validate SetWheelMode.target, resolution and invert values')
         # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Resolution,
-                         obtained=getUsefulBit(response.wheelMode, 1),
-                         msg='The resolution parameter differs from the one expected')
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 3: Validate SetWheelMode.invert value')
-        # ---------------------------------------------------------------------------
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Invert,
-                         obtained=getUsefulBit(response.wheelMode, 2),
-                         msg='The invert parameter differs from the one expected')
+        settings = self.getHiResWheelSettings()
+        self.assertFieldsEqual(expected=settings.wheelMode,
+                               obtained=int(response.wheelMode) & settings.WHEEL_MODE_MASK,
+                               fields=settings.WHEEL_MODE_FIELDS)
 
         # Reset the parameters for other tests
-        setWheelMode = SetWheelMode(
-            deviceIndex=self.deviceIndex,
-            featureId=self.featureId,
-            wheelMode=0)
-        self.device.sendReport(data=setWheelMode)
-        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                   classType=SetWheelModeResponse)
-        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("FNT_2121_0003")
     # end def test_SetWheelMode
@@ -208,29 +517,33 @@ class HiResWheelTestCase(BaseTestCase):
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Send SetWheelMode with the 3 bits set consist of (0,1) for each bit')
         # ---------------------------------------------------------------------------
+        pipeline = self.createPipeline()
+        futures = []
         for modeValue in range(0, 8):
-            setWheelMode = SetWheelMode(
-                deviceIndex=self.deviceIndex,
-                featureId=self.featureId,
-                wheelMode=modeValue)
-            self.device.sendReport(data=setWheelMode)
-            responseFromSet = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                       classType=SetWheelModeResponse)
-            self.logTrace('SetWheelMode Response: %s\n' % str(responseFromSet))
+            setWheelMode = self.requestTemplates.getRequest(SetWheelMode,
+                                                            deviceIndex=self.deviceIndex,
+                                                            featureIndex=self.featureId,
+                                                            wheelMode=modeValue)
+            setFuture = pipeline.submit(HexList(setWheelMode), SetWheelModeResponse)
             # ---------------------------------------------------------------------------
             self.logTitle2('Test Step 2: Test Step 2: Send HiResWheel.GetWheelMode')
             # ---------------------------------------------------------------------------
-            getWheelMode = GetWheelMode(
-                deviceIndex=self.deviceIndex,
-                featureId=self.featureId)
-            self.device.sendReport(data=getWheelMode)
-            responseFromGet = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                              classType=GetWheelModeResponse)
+            getWheelMode = self.requestTemplates.getRequest(GetWheelMode,
+                                                            deviceIndex=self.deviceIndex,
+                                                            featureIndex=self.featureId)
+            getFuture = pipeline.submit(HexList(getWheelMode), GetWheelModeResponse)
+            futures.append((setFuture, getFuture))
+        # end for
+        pipeline.drain()
+
+        for setFuture, getFuture in futures:
+            responseFromSet = setFuture.result()
+            self.logTrace('SetWheelMode Response: %s\n' % str(responseFromSet))
+            responseFromGet = getFuture.result()
             self.logTrace('SetWheelMode Response: %s\n' % str(responseFromGet))
             # ---------------------------------------------------------------------------
             self.logTitle2('Test Check 1: Compare return value of SetWheelMode.target with GetWheelMode.target ')
             # ---------------------------------------------------------------------------
-            f = self.getFeatures()
             self.assertEqual(expected=getUsefulBit(responseFromSet.wheelMode, 0),
                              obtained=getUsefulBit(responseFromGet.wheelMode, 0),
                              msg='The target parameter differs from the one expected')
@@ -249,14 +562,7 @@ class HiResWheelTestCase(BaseTestCase):
         # end for
 
         # Reset the parameters for other tests
-        setWheelMode = SetWheelMode(
-            deviceIndex=self.deviceIndex,
-            featureId=self.featureId,
-            wheelMode=0)
-        self.device.sendReport(data=setWheelMode)
-        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                   classType=SetWheelModeResponse)
-        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("FNT_2121_0004")
     # end def test_SetWheelModeWithAllSets
@@ -273,25 +579,19 @@ class HiResWheelTestCase(BaseTestCase):
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Send GetRatchetSwitchState')
         # ---------------------------------------------------------------------------
-        getRatchetSwitchState = GetRatchetSwitchState(
-            deviceIndex=self.deviceIndex,
-            featureId=self.featureId)
-        self.device.sendReport(data=getRatchetSwitchState)
-        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                   classType=GetRatchetSwitchStateResponse)
-        self.logTrace('GetRatchetSwitchState Response: %s\n' % str(response))
+        ratchetMode = self.getRatchetSwitchState()
+        self.logTrace('GetRatchetSwitchState ratchetMode: %s\n' % ratchetMode)
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Validate GetRatchetSwitchState.state value')
         # ---------------------------------------------------------------------------
-        f = self.getFeatures()
-        self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_RatchetMode,
-                         obtained=getUsefulBit(response.ratchetMode, 0),
+        settings = self.getHiResWheelSettings()
+        self.assertEqual(expected=settings.ratchetMode,
+                         obtained=ratchetMode,
                          msg='The ratchetMode parameter differs from the one expected')
 
         self.testCaseChecked("FNT_2121_0005")
     # end def test_GetRatchetSwitchState
 
-    @unittest.skip("Need external robust arm to press the button")
     @features('Feature2121')
     @level('Interface')
     def test_RatchetSwitch(self):
@@ -301,18 +601,29 @@ class HiResWheelTestCase(BaseTestCase):
         HiRes Wheel
          state [event1]RatchetSwitch
         """
+        wheelActuator = self.getWheelActuator('Need external robust arm to press the button')
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Press the free-spin button to change the ratchet mode')
         # ---------------------------------------------------------------------------
-
+        wheelActuator.toggleRatchet()
+        ratchetSwitch = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=RatchetSwitch)
+        self.logTrace('RatchetSwitch Event: %s\n' % str(ratchetSwitch))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Validate the return value of RatchetSwitch.state')
         # ---------------------------------------------------------------------------
+        settings = self.getHiResWheelSettings()
+        self.assertEqual(expected=settings.ratchetMode ^ 1,
+                         obtained=int(ratchetSwitch.ratchetMode),
+                         msg='The ratchetMode parameter differs from the one expected')
+
+        # Reset the parameters for other tests
+        wheelActuator.toggleRatchet()
+        self.getMessage(queue=self.hidDispatcher.mouseMessageQueue, classType=RatchetSwitch)
 
         self.testCaseChecked("FNT_2121_0006")
     # end def test_RatchetSwitch
 
-    @unittest.skip("Need external robust arm to press the button")
     @features('Feature2121')
     @level('Business')
     def test_RatchetSwitchWithTwoPress(self):
@@ -322,26 +633,41 @@ class HiResWheelTestCase(BaseTestCase):
         HiRes Wheel
          state [event1]RatchetSwitch
         """
+        wheelActuator = self.getWheelActuator('Need external robust arm to press the button')
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Press the free-spin button to change the ratchet mode')
         # ---------------------------------------------------------------------------
-
+        wheelActuator.toggleRatchet()
+        ratchetSwitch = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=RatchetSwitch)
+        self.logTrace('RatchetSwitch Event: %s\n' % str(ratchetSwitch))
+        ratchetMode = self.getRatchetSwitchState()
+        self.logTrace('GetRatchetSwitchState ratchetMode: %s\n' % ratchetMode)
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Compare the return value of RatchetSwitch.state with GetRatchetSwitchState.state')
         # ---------------------------------------------------------------------------
-
+        self.assertEqual(expected=int(ratchetSwitch.ratchetMode),
+                         obtained=ratchetMode,
+                         msg='The ratchetMode parameter differs from the one expected')
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 2: Press the free-spin button to change the ratchet mode again')
         # ---------------------------------------------------------------------------
-
+        wheelActuator.toggleRatchet()
+        ratchetSwitch = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=RatchetSwitch)
+        self.logTrace('RatchetSwitch Event: %s\n' % str(ratchetSwitch))
+        ratchetMode = self.getRatchetSwitchState()
+        self.logTrace('GetRatchetSwitchState ratchetMode: %s\n' % ratchetMode)
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 2: Compare the return value of RatchetSwitch.state with GetRatchetSwitchState.state')
         # ---------------------------------------------------------------------------
+        self.assertEqual(expected=int(ratchetSwitch.ratchetMode),
+                         obtained=ratchetMode,
+                         msg='The ratchetMode parameter differs from the one expected')
 
         self.testCaseChecked("FNT_2121_0007")
     # end def test_RatchetSwitchWithTwoPress
 
-    @unittest.skip("Need external robust arm to roll the wheel")
     @features('Feature2121')
     @level('Interface')
     def test_WheelMovement(self):
@@ -351,26 +677,50 @@ class HiResWheelTestCase(BaseTestCase):
         HiRes Wheel
          resolution, periods, deltaV [event0]WheelMovement
         """
+        wheelActuator = self.getWheelActuator('Need external robust arm to roll the wheel')
         # ---------------------------------------------------------------------------
-        self.logTitle2('Test Step 1: Roll the mouse wheel')
+        self.logTitle2('Test Step 1: Send SetWheelMode to report the wheel with HID++ notifications')
         # ---------------------------------------------------------------------------
-
+        setWheelMode = SetWheelMode(
+            deviceIndex=self.deviceIndex,
+            featureId=self.featureId,
+            wheelMode=HiResWheelSettings.encodeWheelMode(target=1, resolution=0, invert=0))
+        self.sendReport(data=setWheelMode)
+        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                   classType=SetWheelModeResponse)
+        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        # ---------------------------------------------------------------------------
+        self.logTitle2('Test Step 2: Roll the mouse wheel')
+        # ---------------------------------------------------------------------------
+        wheelActuator.spin(self.WHEEL_DELTA_V)
+        wheelMovement = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=WheelMovement)
+        self.logTrace('WheelMovement Event: %s\n' % str(wheelMovement))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Validate WheelMovement.resolution value')
         # ---------------------------------------------------------------------------
-
+        self.assertEqual(expected=0,
+                         obtained=int(bool(int(wheelMovement.resAndPeriods) & WheelMovement.RESOLUTION_MASK)),
+                         msg='The resolution parameter differs from the one expected')
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 2: Validate WheelMovement.periods value')
         # ---------------------------------------------------------------------------
-
+        self.assertEqual(expected=1,
+                         obtained=int(wheelMovement.resAndPeriods) & WheelMovement.PERIODS_MASK,
+                         msg='The periods parameter differs from the one expected')
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 3: Validate WheelMovement.deltaV value')
         # ---------------------------------------------------------------------------
+        self.assertEqual(expected=self.WHEEL_DELTA_V,
+                         obtained=wheelMovement.getSignedDeltaV(),
+                         msg='The deltaV parameter differs from the one expected')
+
+        # Reset the parameters for other tests
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("FNT_2121_0008")
     # end def test_WheelMovement
 
-    @unittest.skip("Need external robust arm to roll the wheel")
     @features('Feature2121')
     @level('Business')
     def test_WheelMovementRollUpAndDown(self):
@@ -380,35 +730,74 @@ class HiResWheelTestCase(BaseTestCase):
         HiRes Wheel
          resolution, periods, deltaV [event0]WheelMovement
         """
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Step 1: Send SetWheelMode with the 3 bits set consist of (0,1) for each bit')
-        # ---------------------------------------------------------------------------
-
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Step 2: Send GetWheelMode')
-        # ---------------------------------------------------------------------------
-
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Step 3: Spin up and spin down the wheel')
-        # ---------------------------------------------------------------------------
-
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 1: Compare the return value of GetWheelMode.resolution with WheelMovement.resolution')
-        # ---------------------------------------------------------------------------
-
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 2: Validate WheelMovement.periods value')
-        # ---------------------------------------------------------------------------
+        wheelActuator = self.getWheelActuator('Need external robust arm to roll the wheel')
+        for resolution in range(0, 2):
+            for invert in range(0, 2):
+                # ---------------------------------------------------------------------------
+                self.logTitle2('Test Step 1: Send SetWheelMode with the 3 bits set consist of (0,1) for each bit')
+                # ---------------------------------------------------------------------------
+                # The wheel is only notified with HID++ reporting, the target bit stays set
+                setWheelMode = SetWheelMode(
+                    deviceIndex=self.deviceIndex,
+                    featureId=self.featureId,
+                    wheelMode=HiResWheelSettings.encodeWheelMode(target=1, resolution=resolution, invert=invert))
+                self.sendReport(data=setWheelMode)
+                response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                           classType=SetWheelModeResponse)
+                self.logTrace('SetWheelMode Response: %s\n' % str(response))
+                # ---------------------------------------------------------------------------
+                self.logTitle2('Test Step 2: Send GetWheelMode')
+                # ---------------------------------------------------------------------------
+                getWheelMode = GetWheelMode(
+                    deviceIndex=self.deviceIndex,
+                    featureId=self.featureId)
+                self.sendReport(data=getWheelMode)
+                responseFromGet = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                                  classType=GetWheelModeResponse)
+                self.logTrace('GetWheelMode Response: %s\n' % str(responseFromGet))
+                # ---------------------------------------------------------------------------
+                self.logTitle2('Test Step 3: Spin up and spin down the wheel')
+                # ---------------------------------------------------------------------------
+                movements = []
+                for deltaV in (self.WHEEL_DELTA_V, -self.WHEEL_DELTA_V):
+                    wheelActuator.spin(deltaV)
+                    wheelMovement = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                                    classType=WheelMovement)
+                    self.logTrace('WheelMovement Event: %s\n' % str(wheelMovement))
+                    movements.append((deltaV, wheelMovement))
+                # end for
+                for deltaV, wheelMovement in movements:
+                    # ---------------------------------------------------------------------------
+                    self.logTitle2('Test Check 1: Compare the return value of GetWheelMode.resolution with '
+                                   'WheelMovement.resolution')
+                    # ---------------------------------------------------------------------------
+                    self.assertEqual(expected=getUsefulBit(responseFromGet.wheelMode, 1),
+                                     obtained=int(bool(int(wheelMovement.resAndPeriods)
+                                                       & WheelMovement.RESOLUTION_MASK)),
+                                     msg='The resolution parameter differs from the one expected')
+                    # ---------------------------------------------------------------------------
+                    self.logTitle2('Test Check 2: Validate WheelMovement.periods value')
+                    # ---------------------------------------------------------------------------
+                    self.assertEqual(expected=1,
+                                     obtained=int(wheelMovement.resAndPeriods) & WheelMovement.PERIODS_MASK,
+                                     msg='The periods parameter differs from the one expected')
+                    # ---------------------------------------------------------------------------
+                    self.logTitle2('Test Check 3: Validate change of WheelMovement.deltaV according to the '
+                                   'GetWheelMode.resolution and GetWheelMode.invert')
+                    # ---------------------------------------------------------------------------
+                    self.assertEqual(expected=-deltaV if getUsefulBit(responseFromGet.wheelMode, 2) else deltaV,
+                                     obtained=wheelMovement.getSignedDeltaV(),
+                                     msg='The deltaV parameter differs from the one expected')
+                # end for
+            # end for
+        # end for
 
-        # ---------------------------------------------------------------------------
-        self.logTitle2('Test Check 3: Validate change of WheelMovement.deltaV according to the GetWheelMode.resolution '
-                       'and GetWheelMode.invert')
-        # ---------------------------------------------------------------------------
+        # Reset the parameters for other tests
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("FNT_2121_0009")
-    # end def test_WheelMovement
+    # end def test_WheelMovementRollUpAndDown
 
-    @unittest.skip("Need external robust arm to roll the wheel")
     @features('Feature2121')
     @level('Functionality')
     def test_WheelMovementPeriodValue(self):
@@ -419,25 +808,114 @@ class HiResWheelTestCase(BaseTestCase):
         HiRes Wheel
          resolution, periods, deltaV [event0]WheelMovement
         """
+        wheelActuator = self.getWheelActuator('Need external robust arm to roll the wheel')
+        wheelMode = HiResWheelSettings.encodeWheelMode(target=1, resolution=0, invert=0)
+        setWheelMode = SetWheelMode(
+            deviceIndex=self.deviceIndex,
+            featureId=self.featureId,
+            wheelMode=wheelMode)
+        self.sendReport(data=setWheelMode)
+        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                   classType=SetWheelModeResponse)
+        self.logTrace('SetWheelMode Response: %s\n' % str(response))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Scroll up and down the wheel')
         # ---------------------------------------------------------------------------
-
+        for deltaV in (self.WHEEL_DELTA_V, -self.WHEEL_DELTA_V):
+            wheelActuator.spin(deltaV)
+            wheelMovement = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                            classType=WheelMovement)
+            self.logTrace('WheelMovement Event: %s\n' % str(wheelMovement))
+        # end for
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 2: Press the free-spin button to change the ratchet mode')
         # ---------------------------------------------------------------------------
-
+        wheelActuator.toggleRatchet()
+        ratchetSwitch = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=RatchetSwitch)
+        self.logTrace('RatchetSwitch Event: %s\n' % str(ratchetSwitch))
+        wheelActuator.spin(self.WHEEL_DELTA_V)
+        afterRatchetSwitch = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                             classType=WheelMovement)
+        self.logTrace('WheelMovement Event: %s\n' % str(afterRatchetSwitch))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 3: Send SetWheelMode')
         # ---------------------------------------------------------------------------
-
+        self.sendReport(data=setWheelMode)
+        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                   classType=SetWheelModeResponse)
+        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        wheelActuator.spin(self.WHEEL_DELTA_V)
+        afterSetWheelMode = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                            classType=WheelMovement)
+        self.logTrace('WheelMovement Event: %s\n' % str(afterSetWheelMode))
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Check 1: Validate if WheelMovement.periods change to 2 after the interrupt event')
         # ---------------------------------------------------------------------------
+        for wheelMovement in (afterRatchetSwitch, afterSetWheelMode):
+            self.assertEqual(expected=2,
+                             obtained=int(wheelMovement.resAndPeriods) & WheelMovement.PERIODS_MASK,
+                             msg='The periods parameter differs from the one expected')
+        # end for
+
+        # Reset the parameters for other tests
+        wheelActuator.toggleRatchet()
+        self.getMessage(queue=self.hidDispatcher.mouseMessageQueue, classType=RatchetSwitch)
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("FNT_2121_0010")
     # end def test_WheelMovementPeriodValue
 
+    @features('Feature2121')
+    @level('Functionality')
+    def test_WheelMovementCoalesced(self):
+        """
+        Validate the net scroll of WheelMovement notifications merged on the dispatcher read path (Feature 0x2121)
+
+        HiRes Wheel
+         resolution, periods, deltaV [event0]WheelMovement
+        """
+        wheelActuator = self.getWheelActuator('Need external robust arm to roll the wheel')
+        deltaVs = (self.WHEEL_DELTA_V, 2 * self.WHEEL_DELTA_V, -self.WHEEL_DELTA_V)
+        self.router.uninstall(self.hidDispatcher)
+        self.router = self.createRouter(coalesceCount=len(deltaVs))
+        self.router.install(self.hidDispatcher)
+        # ---------------------------------------------------------------------------
+        self.logTitle2('Test Step 1: Send SetWheelMode to report the wheel with HID++ notifications')
+        # ---------------------------------------------------------------------------
+        setWheelMode = SetWheelMode(
+            deviceIndex=self.deviceIndex,
+            featureId=self.featureId,
+            wheelMode=HiResWheelSettings.encodeWheelMode(target=1, resolution=0, invert=0))
+        self.sendReport(data=setWheelMode)
+        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                   classType=SetWheelModeResponse)
+        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        # ---------------------------------------------------------------------------
+        self.logTitle2('Test Step 2: Roll the mouse wheel up, further up, then down')
+        # ---------------------------------------------------------------------------
+        for deltaV in deltaVs:
+            wheelActuator.spin(deltaV)
+        # end for
+        wheelMovement = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
+                                        classType=WheelMovement)
+        self.logTrace('Merged WheelMovement Event: %s\n' % str(wheelMovement))
+        # ---------------------------------------------------------------------------
+        self.logTitle2('Test Check 1: Validate the periods and deltaV values of the merged WheelMovement')
+        # ---------------------------------------------------------------------------
+        self.assertEqual(expected=len(deltaVs),
+                         obtained=int(wheelMovement.resAndPeriods) & WheelMovement.PERIODS_MASK,
+                         msg='The periods parameter differs from the one expected')
+        self.assertEqual(expected=sum(deltaVs),
+                         obtained=wheelMovement.getSignedDeltaV(),
+                         msg='The deltaV parameter differs from the one expected')
+
+        # Reset the parameters for other tests
+        self.restoreDefaultIfDirty()
+
+        self.testCaseChecked("FNT_2121_0011")
+    # end def test_WheelMovementCoalesced
+
     @features('Feature2121')
     @level('ErrorHandling')
     def test_WrongFunctionIndex(self):
@@ -456,7 +934,7 @@ class HiResWheelTestCase(BaseTestCase):
                 deviceIndex=self.deviceIndex,
                 featureId=self.featureId)
             getWheelCapability.functionIndex = int(functionIndex)
-            self.device.sendReport(data=getWheelCapability)
+            self.sendReport(data=getWheelCapability)
             response = self.getMessage(queue=self.hidDispatcher.errorMessageQueue,
                                        classType=ErrorCodes)
             self.logTrace('GetWheelCapability Error Response: %s\n' % str(response))
@@ -492,15 +970,15 @@ class HiResWheelTestCase(BaseTestCase):
                 deviceIndex=self.deviceIndex,
                 featureId=self.featureId,
                 wheelMode=modeValue)
-            self.device.sendReport(data=setWheelMode)
+            self.sendReport(data=setWheelMode)
             response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
                                        classType=SetWheelModeResponse)
             self.logTrace('SetWheelMode Response: %s\n' % str(response))
             # ---------------------------------------------------------------------------
             self.logTitle2('Test Check 1: Validate SetWheelMode response received')
             # ---------------------------------------------------------------------------
-            f = self.getFeatures()
-            self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Target,
+            settings = self.getHiResWheelSettings()
+            self.assertEqual(expected=settings.target,
                              obtained=int(getUsefulBit(response.wheelMode, 1)),
                              msg='The target parameter differs from the one expected')
             # ---------------------------------------------------------------------------
@@ -513,14 +991,7 @@ class HiResWheelTestCase(BaseTestCase):
         # end for
 
         # Reset the parameters for other tests
-        setWheelMode = SetWheelMode(
-            deviceIndex=self.deviceIndex,
-            featureId=self.featureId,
-            wheelMode=0)
-        self.device.sendReport(data=setWheelMode)
-        response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                   classType=SetWheelModeResponse)
-        self.logTrace('SetWheelMode Response: %s\n' % str(response))
+        self.restoreDefaultIfDirty()
 
         self.testCaseChecked("ROT_1000_0002")
     # end def test_WrongIndex
@@ -537,20 +1008,25 @@ class HiResWheelTestCase(BaseTestCase):
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Send GetWheelCapability with several value for softwareId')
         # ---------------------------------------------------------------------------
+        pipeline = self.createPipeline()
+        futures = []
         for softwareId in range(1, 0x10):
-            getWheelCapability = GetWheelCapability(
-                deviceIndex=self.deviceIndex,
-                featureId=self.featureId)
-            getWheelCapability.softwareId = softwareId
-            self.device.sendReport(data=getWheelCapability)
-            response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                       classType=GetWheelCapabilityResponse)
+            getWheelCapability = self.requestTemplates.getRequest(GetWheelCapability,
+                                                                  deviceIndex=self.deviceIndex,
+                                                                  featureIndex=self.featureId)
+            futures.append(pipeline.submit(HexList(getWheelCapability), GetWheelCapabilityResponse,
+                                           softwareId=softwareId))
+        # end for
+        pipeline.drain()
+
+        for future in futures:
+            response = future.result()
             self.logTrace('GetWheelCapability Response: %s\n' % str(response))
             # ---------------------------------------------------------------------------
             self.logTitle2('Test Check 1: Validate GetWheelCapability response received')
             # ---------------------------------------------------------------------------
-            f = self.getFeatures()
-            self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Multiplier,
+            settings = self.getHiResWheelSettings()
+            self.assertEqual(expected=settings.multiplier,
                              obtained=int(response.multiplier),
                              msg='The multiplier parameter differs from the one expected')
         # end for
@@ -570,21 +1046,26 @@ class HiResWheelTestCase(BaseTestCase):
         # ---------------------------------------------------------------------------
         self.logTitle2('Test Step 1: Send GetWheelCapability with several value for padding')
         # ---------------------------------------------------------------------------
+        pipeline = self.createPipeline()
+        futures = []
         for paddingByte in computeSupValues(HexList(Numeral(GetWheelCapability.DEFAULT.PADDING,
                                                             GetWheelCapability.LEN.PADDING // 8))):
             getWheelCapability = GetWheelCapability(
                 deviceIndex=self.deviceIndex,
                 featureId=self.featureId)
             getWheelCapability.padding = paddingByte
-            self.device.sendReport(data=getWheelCapability)
-            response = self.getMessage(queue=self.hidDispatcher.mouseMessageQueue,
-                                       classType=GetWheelCapabilityResponse)
+            futures.append(pipeline.submit(getWheelCapability, GetWheelCapabilityResponse))
+        # end for
+        pipeline.drain()
+
+        for future in futures:
+            response = future.result()
             self.logTrace('GetWheelCapabilityResponse: %s\n' % str(response))
             # ---------------------------------------------------------------------------
             self.logTitle2('Test Check 1: Validate GetWheelCapability response received')
             # ---------------------------------------------------------------------------
-            f = self.getFeatures()
-            self.assertEqual(expected=f.PRODUCT.MOUSE.HIRESWHEEL.F_Multiplier,
+            settings = self.getHiResWheelSettings()
+            self.assertEqual(expected=settings.multiplier,
                              obtained=int(response.multiplier),
                              msg='The multiplier parameter differs from the one expected')
         # end for
@@ -594,6 +1075,90 @@ class HiResWheelTestCase(BaseTestCase):
 
 # end class HiResWheelTestCase
 
+
+class HiResWheelEmulatorTestCase(HiResWheelTestCase):
+    '''
+    Validates HiRes Wheel TestCases against HiResWheelEmulator
+
+    The emulator stands in for the device, the HID dispatcher and the robot
+    arm. It starts in the state given by the HIRESWHEEL product settings and
+    is a new device in every test. Its clock is virtual and only moves with
+    the waits of the test, so the periods of the WheelMovement notifications
+    follow the time the emulated device takes, not the load of the host.
+
+    BaseTestCase.setUp() and tearDown() are skipped, they open and close
+    the real device: the transport is the device and the HID dispatcher.
+    '''
+    # The emulator gets its own feature index, state and latencies, apart from the real device
+    featureMappingCache = FeatureMappingCache()
+    deviceKeys = {}
+    stateMirror = HiResWheelStateMirror()
+    latencyRecorder = HiResWheelLatencyRecorder()
+    EMULATED_DEVICE_INDEX = 0x01
+    EMULATED_FEATURE_INDEX = 0x0B
+    deviceIndex = EMULATED_DEVICE_INDEX
+
+    def setUp(self):
+        """
+        Starts the emulator, then handles the 0x2121 prerequisites.
+        """
+        settings = self.getHiResWheelSettings()
+        self.clock = VirtualClock()
+        self.transport = HiResWheelEmulatorTransport(HiResWheelEmulator(
+            deviceIndex=self.deviceIndex,
+            featureIndex=self.EMULATED_FEATURE_INDEX,
+            multiplier=settings.multiplier,
+            capabilities=settings.capabilities,
+            wheelMode=settings.defaultWheelMode,
+            ratchetMode=settings.ratchetMode,
+            clock=self.clock), synchronous=True)
+        self.transport.start()
+        self.device = self.hidDispatcher = self.transport
+        self.wheelActuator = self.transport.emulator
+
+        self.setUpHiResWheel()
+    # end def setUp
+
+    def tearDown(self):
+        """
+        Stops the emulator, the next test starts a new device
+        """
+        self.tearDownHiResWheel()
+        self.transport.close()
+        self.invalidateDevice()
+    # end def tearDown
+
+    def updateFeatureMapping(self, featureId):
+        """
+        Gets the feature index of the emulator, which has no Root feature
+
+        @param  featureId              [in] (int)  feature Id, 0x2121
+        @return (int) feature index
+        """
+        return self.EMULATED_FEATURE_INDEX
+    # end def updateFeatureMapping
+
+    def registerFeatureIndex(self, featureIndex):
+        """
+        Nothing to register, the transport routes the reports of the emulated feature index only
+
+        @param  featureIndex           [in] (int)  feature index of 0x2121
+        """
+        pass
+    # end def registerFeatureIndex
+
+    def readMessage(self, *args, **kwargs):
+        """
+        Reads a message the router does not take from the emulator
+
+        @param  args                   [in] (tuple)  see HiResWheelEmulatorTransport.getMessage()
+        @param  kwargs                 [in] (dict)   see HiResWheelEmulatorTransport.getMessage()
+        @return (HidppMessage) received message, None on timeout
+        """
+        return self.transport.getMessage(*args, **kwargs)
+    # end def readMessage
+# end class HiResWheelEmulatorTestCase
+
 # Function that analyze the response and get the bit you want
 def getUsefulBit(desiredValue, desiredBit):
     return int(bin(int(desiredValue))[2:].zfill(8)[::-1][desiredBit])
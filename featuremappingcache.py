@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.featuremappingcache
+
+@brief  HID++ 2.0 feature index cache
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+import json
+import os
+import threading
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class FeatureMappingCache(object):
+    """
+    Feature indexes of the devices, kept for the whole session
+
+    A feature index only changes with the firmware, so the mapping is keyed
+    by anything the firmware cannot change under: the device identity and
+    its firmware version read from the device, or the device connection. It
+    can be persisted to a JSON file to survive the session, when the keys do.
+    invalidate() forgets a device, the next lookup then asks it again.
+    """
+
+    def __init__(self, path=None):
+        """
+        Constructor
+
+        @param  path                   [in] (str)  JSON file persisting the cache, None to keep it in memory
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.mappings = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+        # end if
+    # end def __init__
+
+    @staticmethod
+    def _key(deviceKey):
+        """
+        Converts a device key to its persisted form
+
+        @param  deviceKey              [in] (tuple)  device key
+        @return (str) persisted key
+        """
+        return '/'.join(str(item) for item in deviceKey)
+    # end def _key
+
+    def getFeatureIndex(self, deviceKey, featureId, resolve, register=None):
+        """
+        Gets the index of a feature, asking the device only on a cache miss
+
+        resolve() is expected to register the mapping wherever the framework
+        needs it, register() does the same for a cached index.
+
+        @param  deviceKey              [in] (tuple)     device key
+        @param  featureId              [in] (int)       feature Id, 0x2121 for instance
+        @param  resolve                [in] (callable)  returns the feature index from the device
+        @param  register               [in] (callable)  register(featureIndex), called on a cache hit
+        @return (int) feature index
+        """
+        key = self._key(deviceKey)
+        featureKey = '0x%04X' % featureId
+        with self.lock:
+            featureIndex = self.mappings.get(key, {}).get(featureKey)
+        # end with
+        if featureIndex is not None:
+            self.hits += 1
+            if register is not None:
+                register(featureIndex)
+            # end if
+            return featureIndex
+        # end if
+
+        self.misses += 1
+        featureIndex = int(resolve())
+        with self.lock:
+            self.mappings.setdefault(key, {})[featureKey] = featureIndex
+        # end with
+        if self.path is not None:
+            self.save()
+        # end if
+        return featureIndex
+    # end def getFeatureIndex
+
+    def invalidate(self, deviceKey=None):
+        """
+        Forgets the mapping of a device
+
+        @param  deviceKey              [in] (tuple)  device key, None for every device
+        """
+        with self.lock:
+            if deviceKey is None:
+                self.mappings.clear()
+            else:
+                self.mappings.pop(self._key(deviceKey), None)
+            # end if
+        # end with
+        if self.path is not None:
+            self.save()
+        # end if
+    # end def invalidate
+
+    def load(self):
+        """
+        Reads the persisted mappings
+        """
+        with open(self.path) as cacheFile:
+            mappings = json.load(cacheFile)
+        # end with
+        with self.lock:
+            self.mappings = mappings
+        # end with
+    # end def load
+
+    def save(self):
+        """
+        Writes the mappings, atomically replacing the previous file
+        """
+        with self.lock:
+            content = json.dumps(self.mappings, indent=2, sort_keys=True)
+        # end with
+        temporaryPath = self.path + '.tmp'
+        with open(temporaryPath, 'w') as cacheFile:
+            cacheFile.write(content + '\n')
+        # end with
+        os.replace(temporaryPath, self.path)
+    # end def save
+# end class FeatureMappingCache
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
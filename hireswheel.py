@@ -23,12 +23,306 @@ from pyhid.field                     import CheckInt
 from pylibrary.tools.hexlist         import HexList
 from pylibrary.tools.numeral         import Numeral
 
+import struct
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+# class attributes copied from a message class to its compact representation
+COMPACT_CLASS_CONSTANTS = ('FEATURE_ID', 'VERSION', 'MSG_TYPE', 'FUNCTION_INDEX', 'EVENT')
+
 
 # ----------------------------------------------------------------------------
 # implementation
 # ----------------------------------------------------------------------------
 
 
+class HiResWheelLayout(object):
+    """
+    Precompiled byte layout of a HiResWheel message
+
+    The FIELDS tuple of a message class is walked once, when the class is
+    created, and reduced to a big-endian struct format plus one decoding step
+    per field. Byte aligned integer fields of 8 or 16 bits map to a single
+    struct integer, the padding and the other multi-byte fields stay raw bytes,
+    decoded as HexList as the generic BitField decoder does. The 4-bit
+    FunctionID/SoftwareID nibbles share one byte and are extracted with a
+    shift and a mask.
+
+    The CheckHexList, CheckByte and CheckInt checks of the fields are
+    compiled at the same time into one (name, offset, size, minimum,
+    maximum) entry per checked slot: the slot length is fixed by the
+    layout, and every byte of the slot must stay within the range.
+    """
+    SHORT_REPORT_ID = 0x10
+    LONG_REPORT_ID  = 0x11
+    SHORT_SIZE      = 7
+    LONG_SIZE       = 20
+    BYTES_FIELDS    = ('padding',)
+    CHECK_TYPES     = (CheckHexList, CheckByte, CheckInt)
+
+    def __init__(self, fields):
+        """
+        Constructor
+
+        @param  fields                 [in] (tuple)  BitField definitions of the message class
+        """
+        formats = []
+        steps = []
+        nibbles = []
+        nibbleBits = 0
+        checkedSlots = []
+        for index, field in enumerate(fields):
+            length = field.getLength()
+            isValue = index >= len(HidppMessage.FIELDS)
+            step = [field.getName(), len(formats), 0, None, length // 8, isValue, field.getDefaultValue()]
+            if len(formats) not in [slot for _, slot in checkedSlots] and \
+                    any(isinstance(check, self.CHECK_TYPES) for check in (field.getChecks() or ())):
+                checkedSlots.append((field.getName(), len(formats)))
+            # end if
+            if (length % 8) or nibbles:
+                nibbles.append((step, length))
+                nibbleBits += length
+                if nibbleBits > 8:
+                    raise ValueError('Field %s crosses a byte boundary' % field.getName())
+                # end if
+                if nibbleBits == 8:
+                    shift = 8
+                    for nibbleStep, nibbleLength in nibbles:
+                        shift -= nibbleLength
+                        nibbleStep[2] = shift
+                        nibbleStep[3] = (1 << nibbleLength) - 1
+                        steps.append(nibbleStep)
+                    # end for
+                    formats.append('B')
+                    nibbles = []
+                    nibbleBits = 0
+                # end if
+                continue
+            elif length == 8 and field.getName() not in self.BYTES_FIELDS:
+                formats.append('B')
+            elif length == 16 and field.getName() not in self.BYTES_FIELDS:
+                formats.append('H')
+            else:
+                formats.append('%ds' % (length // 8))
+            # end if
+            steps.append(step)
+        # end for
+        if nibbles:
+            raise ValueError('Incomplete byte at the end of the layout')
+        # end if
+
+        self.struct = struct.Struct('>' + ''.join(formats))
+        self.size = self.struct.size
+        self.slotCount = len(formats)
+        self.steps = tuple(tuple(step) for step in steps)
+        self.slotFormats = tuple(struct.Struct('>' + fmt) for fmt in formats)
+        self.bytesSlots = frozenset(slot for slot, fmt in enumerate(formats) if fmt.endswith('s'))
+        self.slotOffsets = tuple(struct.calcsize('>' + ''.join(formats[:slot])) for slot in range(len(formats)))
+        self.fieldChecks = tuple((name, self.slotOffsets[slot], self.slotFormats[slot].size, 0x00, 0xFF)
+                                 for name, slot in checkedSlots)
+        self.reportId = self.SHORT_REPORT_ID if self.size == self.SHORT_SIZE else self.LONG_REPORT_ID
+    # end def __init__
+
+    def getStep(self, name):
+        """
+        Gets the decoding step of a field
+
+        @param  name                   [in] (str)  field name
+        @return (tuple) (name, slot, shift, mask, size, isValue, default)
+        """
+        for step in self.steps:
+            if step[0] == name:
+                return step
+            # end if
+        # end for
+        raise AttributeError('No field named %s in the layout' % name)
+    # end def getStep
+
+    def checkLength(self, data):
+        """
+        Validates the length of a raw report
+
+        @param  data                   [in] (HexList, bytes, memoryview)  raw report
+        """
+        if len(data) != self.size:
+            raise ValueError('Wrong report length: %d bytes received, %d expected' % (len(data), self.size))
+        # end if
+    # end def checkLength
+
+    def check(self, data):
+        """
+        Validates the length of a raw report and runs the compiled field checks
+
+        The slot lengths are fixed once the report length is validated. The
+        value ranges only need a check on a list: bytes, bytearray and
+        memoryview values are bytes by construction.
+
+        @param  data                   [in] (HexList, bytes, memoryview)  raw report
+        """
+        self.checkLength(data)
+        if isinstance(data, list):
+            for name, offset, size, minimum, maximum in self.fieldChecks:
+                value = data[offset:offset + size]
+                if min(value) < minimum or max(value) > maximum:
+                    raise ValueError('Wrong %s value: %r, bytes in [0x%02X, 0x%02X] expected'
+                                     % (name, value, minimum, maximum))
+                # end if
+            # end for
+        # end if
+    # end def check
+
+    def unpack(self, data, check=True, numerals=False):
+        """
+        Decodes a raw report
+
+        Integer fields are returned as plain int, padding and other byte fields as HexList.
+
+        @param  data                   [in] (HexList, bytes, memoryview)  raw report
+        @param  check                  [in] (bool)  also run the compiled field checks, the length is always
+                                                    validated
+        @param  numerals               [in] (bool)  wrap the message specific integer fields in Numeral
+        @return (list) (name, value) pairs, in FIELDS order
+        """
+        if check:
+            self.check(data)
+        else:
+            self.checkLength(data)
+        # end if
+        if isinstance(data, list):
+            data = bytearray(data)
+        # end if
+        raw = self.struct.unpack_from(data)
+        values = []
+        for name, slot, shift, mask, size, isValue, _ in self.steps:
+            value = raw[slot]
+            if mask is not None:
+                value = (value >> shift) & mask
+            elif not isinstance(value, int):
+                value = HexList(bytearray(value))
+            elif numerals and isValue:
+                value = Numeral(value, size)
+            # end if
+            values.append((name, value))
+        # end for
+        return values
+    # end def unpack
+
+    def pack(self, message):
+        """
+        Encodes a message
+
+        @param  message                [in] (HiResWheel)  message to encode
+        @return (bytes) raw report
+        """
+        raw = [0] * self.slotCount
+        for name, slot, shift, mask, size, _, default in self.steps:
+            value = getattr(message, name, None)
+            if value is None:
+                value = self.reportId if slot == 0 else default
+            # end if
+            if value is None:
+                value = 0
+            # end if
+            if mask is not None:
+                raw[slot] |= (int(value) & mask) << shift
+            elif slot in self.bytesSlots:
+                raw[slot] = self.toBytes(name, value, size)
+            else:
+                raw[slot] = int(value)
+            # end if
+        # end for
+        return self.struct.pack(*raw)
+    # end def pack
+
+    @staticmethod
+    def toBytes(name, value, size):
+        """
+        Converts a multi-byte field value to its raw representation
+
+        @param  name                   [in] (str)  field name, for error reporting
+        @param  value                  [in] (HexList, bytes, int)  field value
+        @param  size                   [in] (int)  field length in bytes
+        @return (bytes) raw field value
+        """
+        if isinstance(value, (list, tuple, bytes, bytearray)):
+            value = bytes(bytearray(value))
+            if len(value) != size:
+                raise ValueError('Wrong %s length: %d bytes given, %d expected' % (name, len(value), size))
+            # end if
+            return value
+        # end if
+        return int(value).to_bytes(size, 'big')
+    # end def toBytes
+# end class HiResWheelLayout
+
+
+class HiResWheelValidation(object):
+    """
+    Validation policy applied when decoding trusted reports
+
+    The report length is validated on every decode. The CheckHexList and
+    CheckByte checks of the fields are always run on reports from an
+    untrusted source. On reports flagged as trusted, i.e. read passively
+    from the device, they are run according to the mode:
+     - FULL: on every report, the default
+     - SAMPLED: on one report out of samplePeriod
+     - OFF: never
+    The validated and skipped counters cover every decoded report.
+    """
+    FULL    = 'full'
+    SAMPLED = 'sampled'
+    OFF     = 'off'
+
+    def __init__(self, mode=FULL, samplePeriod=100):
+        """
+        Constructor
+
+        @param  mode                   [in] (str)  FULL, SAMPLED or OFF
+        @param  samplePeriod           [in] (int)  validate one trusted report every samplePeriod, in SAMPLED mode
+        """
+        if mode not in (self.FULL, self.SAMPLED, self.OFF):
+            raise ValueError('Unknown validation mode: %s' % mode)
+        # end if
+        if samplePeriod < 1:
+            raise ValueError('The sample period must be positive: %d' % samplePeriod)
+        # end if
+        self.mode = mode
+        self.samplePeriod = samplePeriod
+        self.resetCounters()
+    # end def __init__
+
+    def resetCounters(self):
+        """
+        Resets the validated and skipped counters
+        """
+        self.validated = 0
+        self.skipped = 0
+        self.trustedCount = 0
+    # end def resetCounters
+
+    def shouldValidate(self, trusted=False):
+        """
+        Tells if the field checks have to be run on the next report, and counts it
+
+        @param  trusted                [in] (bool)  True if the report comes from a trusted source
+        @return (bool) True if the report has to be validated
+        """
+        if trusted and self.mode != self.FULL:
+            self.trustedCount += 1
+            if self.mode == self.OFF or (self.trustedCount % self.samplePeriod):
+                self.skipped += 1
+                return False
+            # end if
+        # end if
+        self.validated += 1
+        return True
+    # end def shouldValidate
+# end class HiResWheelValidation
+
+
 class HiResWheel(HidppMessage):
     """
     HiResWheel implementation class
@@ -44,6 +338,12 @@ class HiResWheel(HidppMessage):
     """
     FEATURE_ID = 0x2121
     MAX_FUNCTION_INDEX = 3
+    LAYOUT = None
+    VALIDATION = HiResWheelValidation()
+    NUMERAL_FIELDS = False
+    EVENT = False
+    COMPACT = False
+    COMPACT_CLASS = None
 
     def __init__(self, deviceIndex, featureIndex):
         """
@@ -56,9 +356,291 @@ class HiResWheel(HidppMessage):
 
         self.deviceIndex = deviceIndex
         self.featureIndex = featureIndex
+    # end def __init__
+
+    @classmethod
+    def fromHexList(cls, *args, **kwargs):
+        """
+        Builds a message from its raw representation, using the compiled LAYOUT
+
+        When COMPACT is set on the class, the COMPACT_CLASS representation is
+        returned instead of a full message. The length is always validated.
+        The field checks are run on trusted reports according to the
+        VALIDATION policy, and always on the other reports.
+
+        @param  args                   [in] (tuple)  raw report, as accepted by HexList
+        @param  kwargs                 [in] (dict)   trusted (bool) flag, the rest is forwarded to the generic decoder
+        @return (HiResWheel, HiResWheelCompact) decoded message
+        """
+        trusted = kwargs.pop('trusted', False)
+        if cls.LAYOUT is None:
+            return super(HiResWheel, cls).fromHexList(*args, **kwargs)
+        # end if
+        data = args[0] if len(args) == 1 else HexList(*args)
+        check = cls.VALIDATION.shouldValidate(trusted)
+        if cls.COMPACT:
+            if check:
+                cls.checkFields(data)
+            # end if
+            return cls.COMPACT_CLASS(data)
+        # end if
+        return cls.fromLayout(data, check=check)
+    # end def fromHexList
+
+    @classmethod
+    def checkFields(cls, data):
+        """
+        Runs the CheckHexList and CheckByte checks of every field, as compiled in the LAYOUT
+
+        @param  data                   [in] (HexList, bytes, memoryview)  raw report
+        """
+        cls.LAYOUT.check(data)
+    # end def checkFields
+
+    @classmethod
+    def fromLayout(cls, data, check=True):
+        """
+        Builds a full message from its raw representation, using the compiled LAYOUT
+
+        Integer fields are decoded as plain int. Set NUMERAL_FIELDS on the
+        class to get Numeral values, as the generic BitField decoder returns.
+
+        @param  data                   [in] (HexList, bytes, memoryview)  raw report
+        @param  check                  [in] (bool)  run the field checks, the length is always validated
+        @return (HiResWheel) decoded message
+        """
+        if check:
+            cls.checkFields(data)
+        # end if
+        message = cls.__new__(cls)
+        super(HiResWheel, message).__init__()
+        for name, value in cls.LAYOUT.unpack(data, False, cls.NUMERAL_FIELDS):
+            setattr(message, name, value)
+        # end for
+        return message
+    # end def fromLayout
+
+    def toHexList(self):
+        """
+        Encodes the message, using the compiled LAYOUT
+
+        @return (HexList) raw report
+        """
+        if self.LAYOUT is None:
+            return super(HiResWheel, self).toHexList()
+        # end if
+        return HexList(bytearray(self.LAYOUT.pack(self)))
+    # end def toHexList
 # end class HiResWheel
 
 
+class HiResWheelFieldView(object):
+    """
+    Descriptor decoding one field of a raw report on attribute access
+
+    The owner instance holds the report in its _buffer attribute. Nothing is
+    decoded, copied or checked until the attribute is read.
+    """
+
+    def __init__(self, layout, name):
+        """
+        Constructor
+
+        @param  layout                 [in] (HiResWheelLayout)  layout of the viewed message class
+        @param  name                   [in] (str)  field name
+        """
+        _, slot, self.shift, self.mask, self.size, self.isValue, _ = layout.getStep(name)
+        self.format = layout.slotFormats[slot]
+        self.offset = layout.slotOffsets[slot]
+    # end def __init__
+
+    def __get__(self, instance, owner):
+        """
+        Decodes the field from the owner buffer
+
+        @param  instance               [in] (object)  owner instance
+        @param  owner                  [in] (type)    owner class
+        @return (int, Numeral, HexList) field value, typed as HiResWheelLayout.unpack
+        """
+        if instance is None:
+            return self
+        # end if
+        value = self.format.unpack_from(instance._buffer, self.offset)[0]
+        if self.mask is not None:
+            return (value >> self.shift) & self.mask
+        elif not isinstance(value, int):
+            return HexList(bytearray(value))
+        elif self.isValue and instance.MESSAGE_CLASS.NUMERAL_FIELDS:
+            return Numeral(value, self.size)
+        # end if
+        return value
+    # end def __get__
+# end class HiResWheelFieldView
+
+
+class HiResWheelView(object):
+    """
+    Base class of the read-only messages backed by a raw report
+
+    Subclasses declare one HiResWheelFieldView per field of MESSAGE_CLASS, so
+    an instance only holds the report buffer: no per-instance dictionary and
+    no decoded field objects.
+    """
+    __slots__ = ('_buffer',)
+
+    MESSAGE_CLASS = None
+    LAYOUT = None
+
+    def __init__(self, data):
+        """
+        Constructor
+
+        @param  data                   [in] (HexList, bytes, bytearray, memoryview)  raw report
+        """
+        buffer = self._wrap(data)
+        if len(buffer) != self.LAYOUT.size:
+            raise ValueError('Wrong report length: %d bytes received, %d expected' % (len(buffer), self.LAYOUT.size))
+        # end if
+        self._buffer = buffer
+    # end def __init__
+
+    @staticmethod
+    def _wrap(data):
+        """
+        Wraps the raw report, copying it once if it is a list such as a HexList
+
+        @param  data                   [in] (HexList, bytes, bytearray, memoryview)  raw report
+        @return (memoryview) report buffer
+        """
+        if isinstance(data, list):
+            data = bytearray(data)
+        # end if
+        return memoryview(data)
+    # end def _wrap
+
+    def toHexList(self):
+        """
+        Copies the raw report
+
+        @return (HexList) raw report
+        """
+        return HexList(bytearray(self._buffer))
+    # end def toHexList
+
+    def materialize(self):
+        """
+        Builds the equivalent MESSAGE_CLASS message
+
+        @return (HiResWheel) decoded message
+        """
+        return self.MESSAGE_CLASS.fromLayout(self._buffer)
+    # end def materialize
+
+    def __eq__(self, other):
+        """
+        Compares the raw reports
+
+        @param  other                  [in] (HiResWheel, HiResWheelView)  message to compare with
+        @return (bool) True if both messages encode to the same report
+        """
+        if not hasattr(other, 'toHexList'):
+            return NotImplemented
+        # end if
+        return self.toHexList() == other.toHexList()
+    # end def __eq__
+
+    def __ne__(self, other):
+        """
+        Compares the raw reports
+
+        @param  other                  [in] (HiResWheel, HiResWheelView)  message to compare with
+        @return (bool) True if the messages encode to different reports
+        """
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+    # end def __ne__
+
+    def __str__(self):
+        """
+        Formats the message as MESSAGE_CLASS does
+
+        @return (str) message description
+        """
+        return str(self.materialize())
+    # end def __str__
+# end class HiResWheelView
+
+
+class HiResWheelCompact(HiResWheelView):
+    """
+    Base class of the compact message representations
+
+    The report is copied once into an immutable bytes object, about 50 bytes
+    per message instead of a HidppMessage instance dictionary plus one object
+    per field. Classes are built by compactClass() and selected per message
+    class with the COMPACT flag.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def _wrap(data):
+        """
+        Copies the raw report into an immutable buffer
+
+        @param  data                   [in] (HexList, bytes, bytearray, memoryview)  raw report
+        @return (bytes) report buffer
+        """
+        return bytes(bytearray(data))
+    # end def _wrap
+
+    def __hash__(self):
+        """
+        Hashes the raw report
+
+        @return (int) hash value
+        """
+        return hash(self._buffer)
+    # end def __hash__
+# end class HiResWheelCompact
+
+
+def compactClass(messageClass):
+    """
+    Builds the compact representation of a message class
+
+    @param  messageClass               [in] (type)  HiResWheel message class with a LAYOUT
+    @return (type) HiResWheelCompact subclass exposing the same field names and class constants
+    """
+    attributes = {'__slots__': (),
+                  '__doc__': 'Compact %s, see HiResWheelCompact' % messageClass.__name__,
+                  'MESSAGE_CLASS': messageClass,
+                  'LAYOUT': messageClass.LAYOUT}
+    for name in COMPACT_CLASS_CONSTANTS:
+        if hasattr(messageClass, name):
+            attributes[name] = getattr(messageClass, name)
+        # end if
+    # end for
+    for step in messageClass.LAYOUT.steps:
+        attributes[step[0]] = HiResWheelFieldView(messageClass.LAYOUT, step[0])
+    # end for
+    return type('Compact' + messageClass.__name__, (HiResWheelCompact,), attributes)
+# end def compactClass
+
+
+def messageClassOf(message):
+    """
+    Gets the message class of a message, whatever its representation
+
+    Compact messages and views are resolved to their MESSAGE_CLASS, so
+    queues and type checks work on the HiResWheel class hierarchy.
+
+    @param  message                    [in] (object)  message, full, compact or view
+    @return (type) message class
+    """
+    return getattr(message, 'MESSAGE_CLASS', None) or type(message)
+# end def messageClassOf
+
+
 class GetWheelCapability(HiResWheel):
     """
     HiResWheel GetWheelCapability implementation class
@@ -100,6 +682,7 @@ class GetWheelCapability(HiResWheel):
                  name='padding',
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId):
@@ -189,6 +772,7 @@ class GetWheelCapabilityResponse(HiResWheel):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId,
@@ -252,6 +836,7 @@ class GetWheelMode(HiResWheel):
                  name='padding',
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId):
@@ -328,6 +913,7 @@ class GetWheelModeResponse(HiResWheel):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId,
@@ -400,6 +986,7 @@ class SetWheelMode(HiResWheel):
                  name='padding',
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId,
@@ -479,6 +1066,7 @@ class SetWheelModeResponse(HiResWheel):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId,
@@ -539,6 +1127,7 @@ class GetRatchetSwitchState(HiResWheel):
                  name='padding',
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId):
@@ -615,6 +1204,7 @@ class GetRatchetSwitchStateResponse(HiResWheel):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                         featureId,
@@ -652,7 +1242,11 @@ class WheelMovement(HiResWheel):
     || Padding                    || 104          ||
     """
     MSG_TYPE = TYPE.RESPONSE
+    FUNCTION_INDEX = 0
+    EVENT = True
     VERSION = 0
+    RESOLUTION_MASK = 0x10
+    PERIODS_MASK    = 0x0F
 
     class FID(HiResWheel.FID):
         """
@@ -705,6 +1299,7 @@ class WheelMovement(HiResWheel):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                  featureId,
@@ -724,9 +1319,58 @@ class WheelMovement(HiResWheel):
         self.resAndPeriods = resAndPeriods
         self.deltaV = deltaV
     # end def __init__
+
+    def getSignedDeltaV(self):
+        """
+        Gets deltaV as the signed 16-bit value sent by the device
+
+        @return (int) vertical wheel motion delta
+        """
+        deltaV = int(self.deltaV)
+        return deltaV - 0x10000 if deltaV & 0x8000 else deltaV
+    # end def getSignedDeltaV
 # end class WheelMovement
 
 
+class WheelMovementView(HiResWheelView, WheelMovement):
+    """
+    Lazy, zero-copy view over a raw WheelMovement report
+
+    Wraps a memoryview of the 20-byte long report and decodes each field only
+    when it is read. The padding bytes are neither copied nor checked unless
+    the padding attribute is accessed. A HexList report is copied once into a
+    bytearray. The view is a WheelMovement: field names, values, encoding and
+    class attributes (FUNCTION_INDEX, EVENT, ...) are the ones of
+    WheelMovement, and isinstance() checks match it.
+    """
+    __slots__ = ()
+
+    MESSAGE_CLASS = WheelMovement
+    LAYOUT        = WheelMovement.LAYOUT
+
+    reportId      = HiResWheelFieldView(WheelMovement.LAYOUT, 'reportId')
+    deviceIndex   = HiResWheelFieldView(WheelMovement.LAYOUT, 'deviceIndex')
+    featureIndex  = HiResWheelFieldView(WheelMovement.LAYOUT, 'featureIndex')
+    functionIndex = HiResWheelFieldView(WheelMovement.LAYOUT, 'functionIndex')
+    softwareId    = HiResWheelFieldView(WheelMovement.LAYOUT, 'softwareId')
+    resAndPeriods = HiResWheelFieldView(WheelMovement.LAYOUT, 'resAndPeriods')
+    deltaV        = HiResWheelFieldView(WheelMovement.LAYOUT, 'deltaV')
+    padding       = HiResWheelFieldView(WheelMovement.LAYOUT, 'padding')
+
+    @classmethod
+    def fromHexList(cls, data, trusted=False):
+        """
+        Wraps a raw report, the fields are only decoded when read
+
+        @param  data                   [in] (HexList, bytes, bytearray, memoryview)  raw report
+        @param  trusted                [in] (bool)  unused, the report is not validated before a field is read
+        @return (WheelMovementView) view over the report
+        """
+        return cls(data)
+    # end def fromHexList
+# end class WheelMovementView
+
+
 class RatchetSwitch(GetRatchetSwitchStateResponse):
     """
     HiResWheel RatchetSwitch implementation class
@@ -744,6 +1388,8 @@ class RatchetSwitch(GetRatchetSwitchStateResponse):
     || Padding                    || 120          ||
     """
     MSG_TYPE = TYPE.RESPONSE
+    FUNCTION_INDEX = 1
+    EVENT = True
     VERSION = 0
 
     class FID(HiResWheel.FID):
@@ -785,6 +1431,7 @@ class RatchetSwitch(GetRatchetSwitchStateResponse):
                          CheckByte(),),
                  defaultValue=HiResWheel.DEFAULT.PADDING),
     )
+    LAYOUT = HiResWheelLayout(FIELDS)
 
     def __init__(self, deviceIndex,
                  featureId,
@@ -796,7 +1443,7 @@ class RatchetSwitch(GetRatchetSwitchStateResponse):
         @param  featureId             [in] (int)  desired feature Id
         @param  ratchetMode           [in] (int)  returned the mode of ratchet
         """
-        super(RatchetSwitch, self).__init__(deviceIndex, featureId)
+        super(RatchetSwitch, self).__init__(deviceIndex, featureId, ratchetMode)
 
         self.functionIndex = self.FUNCTION_INDEX
         self.ratchetMode = ratchetMode
@@ -804,6 +1451,154 @@ class RatchetSwitch(GetRatchetSwitchStateResponse):
 # end class RatchetSwitch
 
 
+MESSAGE_CLASSES = (GetWheelCapability,
+                   GetWheelCapabilityResponse,
+                   GetWheelMode,
+                   GetWheelModeResponse,
+                   SetWheelMode,
+                   SetWheelModeResponse,
+                   GetRatchetSwitchState,
+                   GetRatchetSwitchStateResponse,
+                   WheelMovement,
+                   RatchetSwitch)
+
+RESPONSE_CLASSES = (GetWheelCapabilityResponse,
+                    GetWheelModeResponse,
+                    SetWheelModeResponse,
+                    GetRatchetSwitchStateResponse)
+
+EVENT_CLASSES = (WheelMovement,
+                 RatchetSwitch)
+
+for _messageClass in MESSAGE_CLASSES:
+    _messageClass.COMPACT_CLASS = compactClass(_messageClass)
+# end for
+
+
+class HiResWheelClassifier(object):
+    """
+    Maps incoming 0x2121 long reports to their message class
+
+    The table is keyed on (featureIndex, functionIndex, isEvent) and filled
+    once, so routing a report costs a single dict lookup. Events are told
+    apart from responses by their SoftwareID: the device sends notifications
+    with SoftwareID 0, while responses echo the non-zero SoftwareID of the
+    request.
+    """
+    EVENT_SOFTWARE_ID = 0
+
+    def __init__(self, featureIndex, messageClasses=RESPONSE_CLASSES + EVENT_CLASSES):
+        """
+        Constructor
+
+        @param  featureIndex           [in] (int)    feature index of 0x2121 on the device
+        @param  messageClasses         [in] (tuple)  response and event classes to index
+        """
+        self.featureIndex = int(featureIndex)
+        self.table = {}
+        for messageClass in messageClasses:
+            key = (self.featureIndex, messageClass.FUNCTION_INDEX, messageClass.EVENT)
+            if key in self.table:
+                raise ValueError('%s and %s share the key %r' % (self.table[key].__name__, messageClass.__name__, key))
+            # end if
+            self.table[key] = messageClass
+        # end for
+    # end def __init__
+
+    def getMessageClass(self, report):
+        """
+        Gets the message class of a raw report
+
+        @param  report                 [in] (HexList, bytes, memoryview)  raw report
+        @return (type) matching message class, None if the report is not a 0x2121 long report
+        """
+        if len(report) != HiResWheelLayout.LONG_SIZE:
+            return None
+        # end if
+        functionAndSoftwareId = report[3]
+        return self.table.get((report[2],
+                               functionAndSoftwareId >> 4,
+                               (functionAndSoftwareId & 0x0F) == self.EVENT_SOFTWARE_ID))
+    # end def getMessageClass
+
+    def decode(self, report, trusted=False):
+        """
+        Decodes a raw report with its message class
+
+        @param  report                 [in] (HexList, bytes, memoryview)  raw report
+        @param  trusted                [in] (bool)  True if the report was read passively from the device
+        @return (HiResWheel) decoded message, None if the report is not a 0x2121 long report
+        """
+        messageClass = self.getMessageClass(report)
+        if messageClass is None:
+            return None
+        # end if
+        return messageClass.fromHexList(report, trusted=trusted)
+    # end def decode
+# end class HiResWheelClassifier
+
+
+class HiResWheelRequestTemplates(object):
+    """
+    Cache of pre-encoded 0x2121 requests
+
+    A request is encoded once per (deviceIndex, featureIndex, functionIndex).
+    Each call copies the cached short report and only patches the SoftwareID
+    nibble and the parameter bytes of the copy: the returned buffer belongs
+    to the caller, and the cached report is never modified.
+    """
+    FUNCTION_INDEXES = dict((response.REQUEST_LIST, response.FUNCTION_INDEX) for response in RESPONSE_CLASSES)
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.templates = {}
+    # end def __init__
+
+    def getRequest(self, requestClass, deviceIndex, featureIndex, softwareId=None, **parameters):
+        """
+        Gets the encoded request, patched with the given SoftwareID and parameters
+
+        @param  requestClass           [in] (type)  request class, GetWheelCapability for instance
+        @param  deviceIndex            [in] (int)   Device Index
+        @param  featureIndex           [in] (int)   feature Index
+        @param  softwareId             [in] (int)   SoftwareID, None to keep the class default
+        @param  parameters             [in] (dict)  request parameters by field name, wheelMode for instance
+        @return (bytearray) raw short report, a new buffer on every call
+        """
+        functionIndex = self.FUNCTION_INDEXES[requestClass]
+        key = (deviceIndex, featureIndex, functionIndex)
+        entry = self.templates.get(key)
+        if entry is None:
+            pristine = bytes(requestClass.LAYOUT.pack(requestClass(deviceIndex, featureIndex, **parameters)))
+            entry = self.templates[key] = (pristine, pristine[3] & 0x0F)
+        # end if
+        pristine, defaultSoftwareId = entry
+
+        if softwareId is None:
+            softwareId = defaultSoftwareId
+        # end if
+        request = bytearray(pristine)
+        request[3] = (functionIndex << 4) | (softwareId & 0x0F)
+        layout = requestClass.LAYOUT
+        for name, value in parameters.items():
+            _, slot, _, _, size, _, _ = layout.getStep(name)
+            offset = layout.slotOffsets[slot]
+            request[offset:offset + size] = layout.toBytes(name, value, size)
+        # end for
+        return request
+    # end def getRequest
+
+    def clear(self):
+        """
+        Drops every cached request
+        """
+        self.templates.clear()
+    # end def clear
+# end class HiResWheelRequestTemplates
+
+
 # ----------------------------------------------------------------------------
 # END OF FILE
 # ----------------------------------------------------------------------------
\ No newline at end of file
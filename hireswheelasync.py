@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelasync
+
+@brief  HID++ 2.0 HiResWheel asyncio transport
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error      import ErrorCodes
+from pyhid.hidpp.features.hireswheel import HiResWheelClassifier
+from pylibrary.tools.hexlist         import HexList
+
+import asyncio
+import os
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelAsyncDevice(object):
+    """
+    asyncio interface to a 0x2121 device
+
+    The device file descriptor, a hidraw node for instance, is watched with
+    loop.add_reader(): one event loop drives any number of devices without a
+    reader thread per device, and notifications never block the requests.
+
+    A request that timed out keeps its SoftwareID blocked until its late
+    response or error arrives, or until the quarantine period is over: a
+    late response is dropped and counted in lateResponses, instead of being
+    taken for the response of a new request that reused the SoftwareID.
+
+    Usage:
+        device = HiResWheelAsyncDevice(fd, deviceIndex, featureIndex)
+        device.start()
+        response = await device.request(GetWheelMode(deviceIndex, featureIndex))
+        async for event in device.notifications():
+            ...
+    """
+    ERROR_FEATURE_INDEX = 0xFF
+    REPORT_SIZE = 64
+    SOFTWARE_IDS = tuple(range(1, 0x10))
+    TIMEOUT = 2.0
+    QUARANTINE = 2.0
+
+    def __init__(self, fd, deviceIndex, featureIndex, loop=None, quarantine=QUARANTINE):
+        """
+        Constructor
+
+        @param  fd                     [in] (int)  non-blocking file descriptor of the device
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  featureIndex           [in] (int)  feature index of 0x2121 on the device
+        @param  loop                   [in] (asyncio.AbstractEventLoop)  event loop, the running one by default
+        @param  quarantine             [in] (float)  time a timed-out SoftwareID stays blocked without late
+                                                     response, in seconds
+        """
+        self.fd = fd
+        self.deviceIndex = deviceIndex
+        self.featureIndex = featureIndex
+        self.loop = loop
+        self.quarantine = quarantine
+        self.classifier = HiResWheelClassifier(featureIndex)
+        self.pending = {}
+        self.timedOut = {}
+        self.events = asyncio.Queue()
+        self.ignoredReports = 0
+        self.lateResponses = 0
+    # end def __init__
+
+    def start(self):
+        """
+        Starts watching the device
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        # end if
+        self.loop.add_reader(self.fd, self._onReadable)
+    # end def start
+
+    def close(self):
+        """
+        Stops watching the device and cancels the outstanding requests
+        """
+        self.loop.remove_reader(self.fd)
+        for future in self.pending.values():
+            future.cancel()
+        # end for
+        self.pending.clear()
+        self.timedOut.clear()
+    # end def close
+
+    def _getFreeSoftwareId(self):
+        """
+        Gets a SoftwareID that no outstanding or quarantined request uses, releasing the expired quarantines
+
+        @return (int) SoftwareID, None if every SoftwareID is busy
+        """
+        now = self.loop.time()
+        for softwareId, releaseTime in list(self.timedOut.items()):
+            if releaseTime <= now:
+                del self.timedOut[softwareId]
+            # end if
+        # end for
+        return next((value for value in self.SOFTWARE_IDS
+                     if value not in self.pending and value not in self.timedOut), None)
+    # end def _getFreeSoftwareId
+
+    async def request(self, message, timeout=TIMEOUT):
+        """
+        Sends a request and waits for its response
+
+        The request gets a SoftwareID that no other outstanding or
+        quarantined request uses, so several requests may be awaited
+        concurrently.
+
+        @param  message                [in] (HiResWheel)  request
+        @param  timeout                [in] (float)  maximum wait, in seconds
+        @return (HiResWheel, ErrorCodes) response or error message
+        """
+        softwareId = self._getFreeSoftwareId()
+        while softwareId is None:
+            nextRelease = max(min(self.timedOut.values()) - self.loop.time(), 0) if self.timedOut else None
+            if self.pending:
+                await asyncio.wait(list(self.pending.values()), timeout=nextRelease,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(nextRelease)
+            # end if
+            softwareId = self._getFreeSoftwareId()
+        # end while
+        message.softwareId = softwareId
+        future = self.loop.create_future()
+        self.pending[softwareId] = future
+        try:
+            os.write(self.fd, bytes(bytearray(message.toHexList())))
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            if self.pending.get(softwareId) is future:
+                del self.pending[softwareId]
+                if not future.done():
+                    # Timed out or cancelled, the response may still come
+                    future.cancel()
+                    self.timedOut[softwareId] = self.loop.time() + self.quarantine
+                # end if
+            # end if
+        # end try
+    # end def request
+
+    async def notifications(self):
+        """
+        Iterates over the WheelMovement and RatchetSwitch notifications
+
+        @return (async iterator) notifications, in reception order
+        """
+        while True:
+            yield await self.events.get()
+        # end while
+    # end def notifications
+
+    def _onReadable(self):
+        """
+        Reads one report and dispatches it
+
+        A receiver node carries the reports of every paired device: the
+        reports of another Device Index are ignored.
+        """
+        report = os.read(self.fd, self.REPORT_SIZE)
+        if len(report) < 4 or report[1] != self.deviceIndex:
+            self.ignoredReports += 1
+            return
+        # end if
+        if len(report) > 4 and report[2] == self.ERROR_FEATURE_INDEX and report[3] == self.featureIndex:
+            self._resolve(report[4] & 0x0F, ErrorCodes.fromHexList(HexList(bytearray(report))))
+            return
+        # end if
+
+        message = self.classifier.decode(report, trusted=True)
+        if message is None:
+            self.ignoredReports += 1
+        elif message.EVENT:
+            self.events.put_nowait(message)
+        else:
+            self._resolve(int(message.softwareId), message)
+        # end if
+    # end def _onReadable
+
+    def _resolve(self, softwareId, message):
+        """
+        Resolves the request waiting for a response
+
+        @param  softwareId             [in] (int)  SoftwareID of the response
+        @param  message                [in] (HiResWheel, ErrorCodes)  response or error message
+        """
+        if self.timedOut.pop(softwareId, None) is not None:
+            self.lateResponses += 1
+            return
+        # end if
+        future = self.pending.pop(softwareId, None)
+        if future is None or future.done():
+            self.ignoredReports += 1
+            return
+        # end if
+        future.set_result(message)
+    # end def _resolve
+# end class HiResWheelAsyncDevice
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelbatch
+
+@brief  HID++ 2.0 HiResWheel columnar batch decoding of WheelMovement streams
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel import WheelMovement
+
+import numpy
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+def _rawRecordType(layout):
+    """
+    Builds the record type matching the raw layout of a WheelMovement report
+
+    @param  layout                     [in] (HiResWheelLayout)  WheelMovement layout
+    @return (numpy.dtype) raw record type
+    """
+    names = ('reportId', 'deviceIndex', 'featureIndex', 'functionIndex', 'resAndPeriods', 'deltaV')
+    formats = ('u1', 'u1', 'u1', 'u1', 'u1', '>i2')
+    offsets = [layout.slotOffsets[layout.getStep(name)[1]] for name in names]
+    return numpy.dtype({'names': names,
+                        'formats': formats,
+                        'offsets': offsets,
+                        'itemsize': layout.size})
+# end def _rawRecordType
+
+RAW_WHEEL_MOVEMENT = _rawRecordType(WheelMovement.LAYOUT)
+
+# Byte 3 of a WheelMovement notification: function index 0 and SoftwareID 0
+WHEEL_MOVEMENT_FUNCTION = WheelMovement.FUNCTION_INDEX << 4
+
+WHEEL_MOVEMENT = numpy.dtype([('deviceIndex',   'u1'),
+                              ('featureIndex',  'u1'),
+                              ('functionIndex', 'u1'),
+                              ('resolution',    'u1'),
+                              ('periods',       'u1'),
+                              ('deltaV',        'i2')])
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+def decodeWheelMovements(data, featureIndex):
+    """
+    Decodes N concatenated WheelMovement long reports at once
+
+    The raw buffer is reinterpreted in place and only the output columns are
+    allocated. deltaV is decoded as the signed 16-bit value sent by the device.
+
+    Only the WheelMovement notifications of the feature index are decoded:
+    the rows with another feature index, or another value than
+    WHEEL_MOVEMENT_FUNCTION in byte 3, RatchetSwitch events or responses
+    for instance, are dropped.
+
+    @param  data                       [in] (bytes, bytearray, memoryview)  N * 20 bytes of raw reports
+    @param  featureIndex               [in] (int)  feature index of 0x2121
+    @return (numpy.ndarray) one record of type WHEEL_MOVEMENT per WheelMovement notification
+    """
+    size = WheelMovement.LAYOUT.size
+    if len(data) % size:
+        raise ValueError('Buffer length %d is not a multiple of the %d-byte report' % (len(data), size))
+    # end if
+    raw = numpy.frombuffer(data, dtype=RAW_WHEEL_MOVEMENT)
+    wrongReports = numpy.flatnonzero(raw['reportId'] != WheelMovement.LAYOUT.reportId)
+    if len(wrongReports):
+        raise ValueError('Report %d is not a long report' % wrongReports[0])
+    # end if
+    raw = raw[(raw['featureIndex'] == featureIndex) & (raw['functionIndex'] == WHEEL_MOVEMENT_FUNCTION)]
+
+    result = numpy.empty(len(raw), dtype=WHEEL_MOVEMENT)
+    result['deviceIndex'] = raw['deviceIndex']
+    result['featureIndex'] = raw['featureIndex']
+    result['functionIndex'] = raw['functionIndex'] >> 4
+    result['resolution'] = (raw['resAndPeriods'] & WheelMovement.RESOLUTION_MASK) != 0
+    result['periods'] = raw['resAndPeriods'] & WheelMovement.PERIODS_MASK
+    result['deltaV'] = raw['deltaV']
+    return result
+# end def decodeWheelMovements
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
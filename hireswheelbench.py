@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelbench
+
+@brief  HID++ 2.0 HiResWheel codec micro-benchmarks
+
+Measures construction, encode, decode, equality and str() of every 0x2121
+message class from representative payloads, without any device. decode is
+the default fromHexList() of an untrusted report, with the field checks.
+decodeTrusted skips them, as the OFF validation mode does on passive reads,
+and decodeBaseline runs the generic BitField decoder the layout replaces.
+
+Usage: python hireswheelbench.py [--output results.json] [--baseline previous.json] [--threshold 0.2]
+                                 [--allocation-threshold 0.2]
+
+The results are written as JSON. When a baseline is given, the run fails
+(exit code 1) if any measurement is slower than the baseline by more than
+the threshold, or allocates more than the baseline by more than the
+allocation threshold. ALLOCATION_SLACK bytes are always tolerated, so an
+operation allocating nothing in the baseline may still allocate a few
+bytes of interpreter noise.
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel import GetRatchetSwitchState
+from pyhid.hidpp.features.hireswheel import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel import GetWheelCapability
+from pyhid.hidpp.features.hireswheel import GetWheelCapabilityResponse
+from pyhid.hidpp.features.hireswheel import GetWheelMode
+from pyhid.hidpp.features.hireswheel import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel import HiResWheel
+from pyhid.hidpp.features.hireswheel import HiResWheelValidation
+from pyhid.hidpp.features.hireswheel import RatchetSwitch
+from pyhid.hidpp.features.hireswheel import SetWheelMode
+from pyhid.hidpp.features.hireswheel import SetWheelModeResponse
+from pyhid.hidpp.features.hireswheel import WheelMovement
+from pylibrary.tools.hexlist         import HexList
+
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+DEVICE_INDEX  = 0x01
+FEATURE_INDEX = 0x0B
+
+THRESHOLD            = 0.2
+ALLOCATION_THRESHOLD = 0.2
+ALLOCATION_SLACK     = 64
+
+OPERATIONS = ('construct', 'encode', 'decode', 'decodeTrusted', 'decodeBaseline', 'equal', 'str')
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+def _withPadding(message, padding):
+    """
+    Sets the padding of a message
+
+    @param  message                    [in] (HiResWheel)  message to update
+    @param  padding                    [in] (list)  padding bytes
+    @return (HiResWheel) updated message
+    """
+    message.padding = HexList(padding)
+    return message
+# end def _withPadding
+
+
+# Representative payload of each message class, as (name, constructor)
+SAMPLES = (
+    ('GetWheelCapability',
+     lambda: _withPadding(GetWheelCapability(DEVICE_INDEX, FEATURE_INDEX), [0xAA, 0xBB, 0xCC])),
+    ('GetWheelCapabilityResponse',
+     lambda: GetWheelCapabilityResponse(DEVICE_INDEX, FEATURE_INDEX, multiplier=8, capabilities=0x0C)),
+    ('GetWheelMode',
+     lambda: GetWheelMode(DEVICE_INDEX, FEATURE_INDEX)),
+    ('GetWheelModeResponse',
+     lambda: GetWheelModeResponse(DEVICE_INDEX, FEATURE_INDEX, wheelMode=0x06)),
+    ('SetWheelMode',
+     lambda: SetWheelMode(DEVICE_INDEX, FEATURE_INDEX, wheelMode=0x07)),
+    ('SetWheelModeResponse',
+     lambda: SetWheelModeResponse(DEVICE_INDEX, FEATURE_INDEX, wheelMode=0x07)),
+    ('GetRatchetSwitchState',
+     lambda: GetRatchetSwitchState(DEVICE_INDEX, FEATURE_INDEX)),
+    ('GetRatchetSwitchStateResponse',
+     lambda: GetRatchetSwitchStateResponse(DEVICE_INDEX, FEATURE_INDEX, ratchetMode=1)),
+    ('WheelMovement',
+     lambda: WheelMovement(DEVICE_INDEX, FEATURE_INDEX, resAndPeriods=0x11, deltaV=0xFFF8)),
+    ('RatchetSwitch',
+     lambda: RatchetSwitch(DEVICE_INDEX, FEATURE_INDEX, ratchetMode=0)),
+)
+
+
+def _operations(factory):
+    """
+    Builds the benchmarked operations of one message class
+
+    @param  factory                    [in] (callable)  builds the sample message
+    @return (dict) callables by operation name
+    """
+    message = factory()
+    other = factory()
+    messageClass = type(message)
+    report = message.toHexList()
+    # same class with the OFF validation mode, the class policy of the suite stays untouched
+    trustedClass = type(messageClass.__name__, (messageClass,),
+                        {'VALIDATION': HiResWheelValidation(HiResWheelValidation.OFF)})
+    return {'construct': factory,
+            'encode': message.toHexList,
+            'decode': lambda: messageClass.fromHexList(report),
+            'decodeTrusted': lambda: trustedClass.fromHexList(report, trusted=True),
+            'decodeBaseline': lambda: super(HiResWheel, messageClass).fromHexList(report),
+            'equal': lambda: message == other,
+            'str': lambda: str(message)}
+# end def _operations
+
+
+def _measure(operation, minTime):
+    """
+    Measures the throughput and allocations of one operation
+
+    @param  operation                  [in] (callable)  operation to measure
+    @param  minTime                    [in] (float)  minimal duration of a timing run, in seconds
+    @return (dict) opsPerSecond and bytesPerOp
+    """
+    timer = timeit.Timer(operation)
+    count = 1
+    while timer.timeit(count) < minTime:
+        count *= 2
+    # end while
+    best = min(timer.repeat(repeat=3, number=count))
+
+    operation()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # end try
+    return {'opsPerSecond': count / best,
+            'bytesPerOp': peak - current}
+# end def _measure
+
+
+def run(minTime=0.2):
+    """
+    Runs the whole suite
+
+    @param  minTime                    [in] (float)  minimal duration of a timing run, in seconds
+    @return (dict) {class name: {operation: {opsPerSecond, bytesPerOp}}}
+    """
+    results = {}
+    for name, factory in SAMPLES:
+        operations = _operations(factory)
+        results[name] = dict((operation, _measure(operations[operation], minTime)) for operation in OPERATIONS)
+    # end for
+    return results
+# end def run
+
+
+def compare(results, baseline, threshold=THRESHOLD, allocationThreshold=ALLOCATION_THRESHOLD):
+    """
+    Lists the measurements slower or allocating more than the baseline
+
+    @param  results                    [in] (dict)  current results, as returned by run()
+    @param  baseline                   [in] (dict)  previous results
+    @param  threshold                  [in] (float)  tolerated slowdown, 0.2 for 20%
+    @param  allocationThreshold        [in] (float)  tolerated growth of bytesPerOp, 0.2 for 20%
+    @return (list) description of each regression
+    """
+    regressions = []
+    for name, operations in sorted(results.items()):
+        for operation, measure in sorted(operations.items()):
+            reference = baseline.get(name, {}).get(operation)
+            if reference is None:
+                continue
+            # end if
+            ratio = measure['opsPerSecond'] / reference['opsPerSecond']
+            if ratio < 1 - threshold:
+                regressions.append('%s.%s: %.0f ops/s, baseline %.0f ops/s (%+.1f%%)'
+                                   % (name, operation, measure['opsPerSecond'], reference['opsPerSecond'],
+                                      (ratio - 1) * 100))
+            # end if
+            limit = reference['bytesPerOp'] * (1 + allocationThreshold) + ALLOCATION_SLACK
+            if measure['bytesPerOp'] > limit:
+                regressions.append('%s.%s: %d bytes/op, baseline %d bytes/op'
+                                   % (name, operation, measure['bytesPerOp'], reference['bytesPerOp']))
+            # end if
+        # end for
+    # end for
+    return regressions
+# end def compare
+
+
+def main(args):
+    """
+    Runs the suite from the command line
+
+    @param  args                       [in] (list)  command line arguments
+    @return (int) exit code, 1 if a slowdown or an allocation regression was found
+    """
+    parser = argparse.ArgumentParser(description='HiResWheel codec micro-benchmarks')
+    parser.add_argument('--output', help='JSON file receiving the results, stdout by default')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='tolerated slowdown (default: %s)' % THRESHOLD)
+    parser.add_argument('--allocation-threshold', type=float, default=ALLOCATION_THRESHOLD,
+                        help='tolerated growth of bytesPerOp (default: %s)' % ALLOCATION_THRESHOLD)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal duration of a timing run, in seconds')
+    options = parser.parse_args(args)
+
+    results = run(options.min_time)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as outputFile:
+            outputFile.write(output + '\n')
+        # end with
+    else:
+        sys.stdout.write(output + '\n')
+    # end if
+
+    if options.baseline:
+        with open(options.baseline) as baselineFile:
+            regressions = compare(results, json.load(baselineFile), options.threshold,
+                                  options.allocation_threshold)
+        # end with
+        for regression in regressions:
+            sys.stderr.write('REGRESSION %s\n' % regression)
+        # end for
+        if regressions:
+            return 1
+        # end if
+    # end if
+    return 0
+# end def main
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelcapture
+
+@brief  HID++ 2.0 HiResWheel traffic capture and replay
+
+File layout, little endian:
+ - header: magic 'HRWC', version, 3 reserved bytes
+ - records: timestamp (float64), direction (uint8), length (uint8) and the
+   7 or 20 bytes of the report
+ - footer, written by close(): one (record number, offset, timestamp)
+   entry every blockSize records
+ - trailer: footer offset (uint64), record count (uint64), blockSize
+   (uint32) and magic 'HRWI'
+
+Records are only appended, so a capture interrupted before close() stays
+readable: the reader then rebuilds the index by scanning the records.
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import HiResWheelLayout
+from pyhid.hidpp.features.hireswheelclock import SYSTEM_CLOCK
+
+import bisect
+import mmap
+import struct
+import threading
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+MAGIC = b'HRWC'
+INDEX_MAGIC = b'HRWI'
+VERSION = 1
+
+HEADER = struct.Struct('<4sB3x')
+RECORD = struct.Struct('<dBB')
+INDEX_ENTRY = struct.Struct('<QQd')
+TRAILER = struct.Struct('<QQI4s')
+
+SENT = 0
+RECEIVED = 1
+
+REPORT_SIZES = (HiResWheelLayout.SHORT_SIZE, HiResWheelLayout.LONG_SIZE)
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelCaptureWriter(object):
+    """
+    Appends reports to a capture file
+
+    write() may be called from the dispatcher thread and from the test
+    thread at the same time. Reports written after close() are dropped.
+
+    Usage:
+        writer = HiResWheelCaptureWriter('run.hrwc')
+        writer.write(SENT, request)
+        writer.write(RECEIVED, response)
+        writer.close()
+    """
+    BLOCK_SIZE = 1024
+
+    def __init__(self, path, clock=SYSTEM_CLOCK, blockSize=BLOCK_SIZE):
+        """
+        Constructor
+
+        @param  path                   [in] (str)  capture file, overwritten
+        @param  clock                  [in] (SystemClock)  time source of the timestamps
+        @param  blockSize              [in] (int)  number of records between two index entries
+        """
+        self.path = path
+        self.clock = clock
+        self.blockSize = blockSize
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.offset = HEADER.size
+        self.count = 0
+        self.index = []
+        self.lock = threading.Lock()
+    # end def __init__
+
+    def write(self, direction, report, timestamp=None):
+        """
+        Appends one report
+
+        @param  direction              [in] (int)  SENT or RECEIVED
+        @param  report                 [in] (HexList, bytes)  raw short or long report
+        @param  timestamp              [in] (float)  time of the report, the clock time by default
+        """
+        payload = bytes(bytearray(report))
+        if len(payload) not in REPORT_SIZES:
+            raise ValueError('A report has 7 or 20 bytes: %d' % len(payload))
+        # end if
+        with self.lock:
+            if self.file is None:
+                # Closed: the dispatcher thread may still read reports
+                return
+            # end if
+            if timestamp is None:
+                timestamp = self.clock.time()
+            # end if
+            if self.count % self.blockSize == 0:
+                self.index.append((self.count, self.offset, timestamp))
+            # end if
+            record = RECORD.pack(timestamp, direction, len(payload)) + payload
+            self.file.write(record)
+            self.offset += len(record)
+            self.count += 1
+        # end with
+    # end def write
+
+    def close(self):
+        """
+        Writes the footer and closes the file
+        """
+        with self.lock:
+            if self.file is None:
+                return
+            # end if
+            for entry in self.index:
+                self.file.write(INDEX_ENTRY.pack(*entry))
+            # end for
+            self.file.write(TRAILER.pack(self.offset, self.count, self.blockSize, INDEX_MAGIC))
+            self.file.close()
+            self.file = None
+        # end with
+    # end def close
+# end class HiResWheelCaptureWriter
+
+
+class HiResWheelCaptureReader(object):
+    """
+    Memory-mapped capture file
+
+    Only the index is loaded, the records are read from the mapping when
+    iterated, whatever the size of the capture.
+
+    Usage:
+        with HiResWheelCaptureReader('run.hrwc') as capture:
+            capture.replay(router.dispatch, paced=True)
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        @param  path                   [in] (str)  capture file
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('Not a HiResWheel capture: %s' % path)
+        # end if
+        if not self._loadIndex():
+            self._buildIndex()
+        # end if
+        self.blockTimes = [entry[2] for entry in self.index]
+    # end def __init__
+
+    def _loadIndex(self):
+        """
+        Reads the footer index
+
+        @return (bool) False if the capture was not closed
+        """
+        if len(self.data) < HEADER.size + TRAILER.size:
+            return False
+        # end if
+        footerOffset, self.count, self.blockSize, magic = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+        if magic != INDEX_MAGIC:
+            return False
+        # end if
+        self.end = footerOffset
+        entryCount = (len(self.data) - TRAILER.size - footerOffset) // INDEX_ENTRY.size
+        self.index = [INDEX_ENTRY.unpack_from(self.data, footerOffset + i * INDEX_ENTRY.size)
+                      for i in range(entryCount)]
+        return True
+    # end def _loadIndex
+
+    def _buildIndex(self):
+        """
+        Scans the records of a capture that was not closed, a truncated last record is ignored
+        """
+        self.blockSize = HiResWheelCaptureWriter.BLOCK_SIZE
+        self.index = []
+        self.count = 0
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self.data):
+            timestamp, _, length = RECORD.unpack_from(self.data, offset)
+            if length not in REPORT_SIZES or offset + RECORD.size + length > len(self.data):
+                break
+            # end if
+            if self.count % self.blockSize == 0:
+                self.index.append((self.count, offset, timestamp))
+            # end if
+            offset += RECORD.size + length
+            self.count += 1
+        # end while
+        self.end = offset
+    # end def _buildIndex
+
+    def __len__(self):
+        return self.count
+    # end def __len__
+
+    def __enter__(self):
+        return self
+    # end def __enter__
+
+    def __exit__(self, *args):
+        self.close()
+    # end def __exit__
+
+    def close(self):
+        """
+        Unmaps and closes the file
+        """
+        self.data.close()
+        self.file.close()
+    # end def close
+
+    def _offsetOf(self, recordNumber):
+        """
+        Finds the offset of a record from the closest index entry
+
+        @param  recordNumber           [in] (int)  record number
+        @return (int) offset of the record in the file
+        """
+        number, offset, _ = self.index[recordNumber // self.blockSize]
+        while number < recordNumber:
+            offset += RECORD.size + self.data[offset + RECORD.size - 1]
+            number += 1
+        # end while
+        return offset
+    # end def _offsetOf
+
+    def readRecord(self, offset):
+        """
+        Reads the record at an offset
+
+        @param  offset                 [in] (int)  offset of the record in the file
+        @return (tuple) timestamp, direction and payload
+        """
+        timestamp, direction, length = RECORD.unpack_from(self.data, offset)
+        return timestamp, direction, self.data[offset + RECORD.size:offset + RECORD.size + length]
+    # end def readRecord
+
+    def records(self, start=0, stop=None):
+        """
+        Iterates over the records
+
+        @param  start                  [in] (int)  first record number
+        @param  stop                   [in] (int)  record number after the last one, None for the end
+        @return (generator) (recordNumber, offset, timestamp, direction, payload) tuples
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        # end if
+        offset = self._offsetOf(start)
+        for recordNumber in range(start, stop):
+            timestamp, direction, length = RECORD.unpack_from(self.data, offset)
+            payloadOffset = offset + RECORD.size
+            yield recordNumber, offset, timestamp, direction, self.data[payloadOffset:payloadOffset + length]
+            offset = payloadOffset + length
+        # end for
+    # end def records
+
+    def __iter__(self):
+        for _, _, timestamp, direction, payload in self.records():
+            yield timestamp, direction, payload
+        # end for
+    # end def __iter__
+
+    def findTime(self, timestamp):
+        """
+        Finds the first record at or after a time
+
+        @param  timestamp              [in] (float)  time in seconds
+        @return (int) record number, len(self) if every record is older
+        """
+        block = max(bisect.bisect_right(self.blockTimes, timestamp) - 1, 0)
+        for recordNumber, _, recordTime, _, _ in self.records(block * self.blockSize):
+            if recordTime >= timestamp:
+                return recordNumber
+            # end if
+        # end for
+        return self.count
+    # end def findTime
+
+    def replay(self, dispatch, direction=RECEIVED, paced=False, clock=SYSTEM_CLOCK, start=0, stop=None):
+        """
+        Feeds the captured reports back
+
+        @param  dispatch               [in] (callable)  receives each report, HiResWheelRouter.dispatch for instance
+        @param  direction              [in] (int)   SENT, RECEIVED or None for both
+        @param  paced                  [in] (bool)  keep the original time between reports, full speed otherwise
+        @param  clock                  [in] (SystemClock)  time source of the pacing
+        @param  start                  [in] (int)   first record number
+        @param  stop                   [in] (int)   record number after the last one, None for the end
+        @return (int) number of replayed reports
+        """
+        count = 0
+        origin = None
+        for _, _, timestamp, recordDirection, payload in self.records(start, stop):
+            if direction is not None and recordDirection != direction:
+                continue
+            # end if
+            if paced:
+                if origin is None:
+                    origin = (timestamp, clock.time())
+                # end if
+                delay = timestamp - origin[0] - (clock.time() - origin[1])
+                if delay > 0:
+                    clock.sleep(delay)
+                # end if
+            # end if
+            dispatch(payload)
+            count += 1
+        # end for
+        return count
+    # end def replay
+# end class HiResWheelCaptureReader
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
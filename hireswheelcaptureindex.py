@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelcaptureindex
+
+@brief  HID++ 2.0 HiResWheel capture index and queries
+
+The sidecar index, '<capture>.idx' by default, lists the records of each
+0x2121 message class as sorted timestamps and file offsets. Little endian
+layout:
+ - header: magic 'HRWX', version, feature index, then the record count,
+   the size and the modification time in nanoseconds of the capture
+   (uint64 each) and the class count (uint32)
+ - per class: name length (uint8), name, entry count (uint64), then the
+   float64 timestamps and the uint64 offsets
+
+The timestamps of a capture are not always monotonic: the clock may step
+back, and the writer records the time given by its caller. build() sorts
+each class by timestamp, records of equal time staying in file order,
+so that the queries can bisect. An index whose record count, size or
+modification time differs from the capture is stale and rebuilt.
+
+Usage:
+    with HiResWheelCaptureReader('run.hrwc') as capture:
+        index = HiResWheelCaptureIndex.open(capture, featureIndex=0x0B)
+        for ratchet, movement in index.followedBy(RatchetSwitch, WheelMovement, within=0.05):
+            ...
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error             import ErrorCodes
+from pyhid.hidpp.features.hireswheel        import HiResWheelClassifier
+from pyhid.hidpp.features.hireswheel        import HiResWheelRequestTemplates
+from pyhid.hidpp.features.hireswheel        import MESSAGE_CLASSES
+from pyhid.hidpp.features.hireswheelcapture import RECEIVED
+from pyhid.hidpp.features.hireswheelcapture import SENT
+from pylibrary.tools.hexlist                import HexList
+
+from array                                  import array
+
+import bisect
+import os
+import struct
+import sys
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+INDEX_MAGIC = b'HRWX'
+INDEX_VERSION = 2
+
+INDEX_HEADER = struct.Struct('<4sBBQQQI')
+CLASS_HEADER = struct.Struct('<B')
+CLASS_COUNT = struct.Struct('<Q')
+
+ERROR_FEATURE_INDEX = 0xFF
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+def _littleEndian(values):
+    """
+    Converts an array between the native and the file byte order, in place
+
+    @param  values                     [in] (array)  timestamps or offsets
+    @return (array) the same array
+    """
+    if sys.byteorder != 'little':
+        values.byteswap()
+    # end if
+    return values
+# end def _littleEndian
+
+
+class HiResWheelCaptureIndex(object):
+    """
+    Per-class index of a HiResWheel capture
+
+    The queries only read the records they return: a range scan is two
+    bisections, a followedBy() join one bisection per event A. Neither
+    rescans the capture.
+    """
+    MESSAGE_CLASSES = dict((messageClass.__name__, messageClass) for messageClass in MESSAGE_CLASSES + (ErrorCodes,))
+
+    def __init__(self, reader, featureIndex, timestamps, offsets, captureStat):
+        """
+        Constructor
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  indexed capture
+        @param  featureIndex           [in] (int)   feature index of 0x2121 in the capture
+        @param  timestamps             [in] (dict)  sorted timestamps by class name
+        @param  offsets                [in] (dict)  record offsets by class name
+        @param  captureStat            [in] (tuple)  size and modification time of the indexed capture
+        """
+        self.reader = reader
+        self.featureIndex = featureIndex
+        self.timestamps = timestamps
+        self.offsets = offsets
+        self.captureStat = captureStat
+    # end def __init__
+
+    @staticmethod
+    def getCaptureStat(reader):
+        """
+        Gets the size and modification time of a capture file
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  capture
+        @return (tuple) size in bytes and modification time in nanoseconds
+        """
+        stat = os.stat(reader.path)
+        return stat.st_size, stat.st_mtime_ns
+    # end def getCaptureStat
+
+    @staticmethod
+    def getPath(reader):
+        """
+        Gets the default sidecar path of a capture
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  capture
+        @return (str) sidecar path
+        """
+        return reader.path + '.idx'
+    # end def getPath
+
+    @classmethod
+    def open(cls, reader, featureIndex, path=None):
+        """
+        Loads the sidecar index, building it when it is missing or stale
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  capture
+        @param  featureIndex           [in] (int)  feature index of 0x2121 in the capture
+        @param  path                   [in] (str)  sidecar path, see getPath()
+        @return (HiResWheelCaptureIndex) index
+        """
+        path = cls.getPath(reader) if path is None else path
+        if os.path.exists(path):
+            index = cls.load(reader, path)
+            if index is not None and index.featureIndex == featureIndex:
+                return index
+            # end if
+        # end if
+        index = cls.build(reader, featureIndex)
+        index.save(path)
+        return index
+    # end def open
+
+    @classmethod
+    def build(cls, reader, featureIndex):
+        """
+        Scans the capture once to index every 0x2121 record
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  capture
+        @param  featureIndex           [in] (int)  feature index of 0x2121 in the capture
+        @return (HiResWheelCaptureIndex) index
+        """
+        captureStat = cls.getCaptureStat(reader)
+        classifier = HiResWheelClassifier(featureIndex)
+        requestClasses = dict((functionIndex, requestClass.__name__) for requestClass, functionIndex
+                              in HiResWheelRequestTemplates.FUNCTION_INDEXES.items())
+        timestamps = {}
+        offsets = {}
+        for _, offset, timestamp, direction, payload in reader.records():
+            name = None
+            if direction == SENT:
+                if payload[2] == featureIndex:
+                    name = requestClasses.get(payload[3] >> 4)
+                # end if
+            elif direction == RECEIVED:
+                if payload[2] == ERROR_FEATURE_INDEX and payload[3] == featureIndex:
+                    name = ErrorCodes.__name__
+                else:
+                    messageClass = classifier.getMessageClass(payload)
+                    name = None if messageClass is None else messageClass.__name__
+                # end if
+            # end if
+            if name is None:
+                continue
+            # end if
+            if name not in timestamps:
+                timestamps[name] = array('d')
+                offsets[name] = array('Q')
+            # end if
+            timestamps[name].append(timestamp)
+            offsets[name].append(offset)
+        # end for
+        for name in timestamps:
+            cls._sort(timestamps, offsets, name)
+        # end for
+        return cls(reader, featureIndex, timestamps, offsets, captureStat)
+    # end def build
+
+    @staticmethod
+    def _sort(timestamps, offsets, name):
+        """
+        Sorts the entries of a class by timestamp, when they are not sorted already
+
+        @param  timestamps             [in] (dict)  timestamps by class name, updated
+        @param  offsets                [in] (dict)  record offsets by class name, updated
+        @param  name                   [in] (str)   class name
+        """
+        times = timestamps[name]
+        if all(times[position] <= times[position + 1] for position in range(len(times) - 1)):
+            return
+        # end if
+        order = sorted(range(len(times)), key=times.__getitem__)
+        timestamps[name] = array('d', (times[position] for position in order))
+        offsets[name] = array('Q', (offsets[name][position] for position in order))
+    # end def _sort
+
+    @classmethod
+    def load(cls, reader, path):
+        """
+        Reads a sidecar index
+
+        @param  reader                 [in] (HiResWheelCaptureReader)  capture
+        @param  path                   [in] (str)  sidecar path
+        @return (HiResWheelCaptureIndex) index, None if it does not match the capture
+        """
+        with open(path, 'rb') as indexFile:
+            data = indexFile.read()
+        # end with
+        if len(data) < INDEX_HEADER.size:
+            return None
+        # end if
+        magic, version, featureIndex, recordCount, size, mtime, classCount = INDEX_HEADER.unpack_from(data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or recordCount != len(reader):
+            return None
+        # end if
+        if (size, mtime) != cls.getCaptureStat(reader):
+            return None
+        # end if
+        offset = INDEX_HEADER.size
+        timestamps = {}
+        offsets = {}
+        for _ in range(classCount):
+            nameLength, = CLASS_HEADER.unpack_from(data, offset)
+            offset += CLASS_HEADER.size
+            name = data[offset:offset + nameLength].decode('ascii')
+            offset += nameLength
+            count, = CLASS_COUNT.unpack_from(data, offset)
+            offset += CLASS_COUNT.size
+            timestamps[name] = _littleEndian(array('d', data[offset:offset + count * 8]))
+            offset += count * 8
+            offsets[name] = _littleEndian(array('Q', data[offset:offset + count * 8]))
+            offset += count * 8
+        # end for
+        return cls(reader, featureIndex, timestamps, offsets, (size, mtime))
+    # end def load
+
+    def save(self, path):
+        """
+        Writes the sidecar index
+
+        @param  path                   [in] (str)  sidecar path
+        """
+        with open(path, 'wb') as indexFile:
+            indexFile.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.featureIndex,
+                                              len(self.reader), self.captureStat[0], self.captureStat[1],
+                                              len(self.timestamps)))
+            for name in sorted(self.timestamps):
+                encodedName = name.encode('ascii')
+                indexFile.write(CLASS_HEADER.pack(len(encodedName)) + encodedName)
+                indexFile.write(CLASS_COUNT.pack(len(self.timestamps[name])))
+                indexFile.write(_littleEndian(array('d', self.timestamps[name])).tobytes())
+                indexFile.write(_littleEndian(array('Q', self.offsets[name])).tobytes())
+            # end for
+        # end with
+    # end def save
+
+    @staticmethod
+    def _getName(messageClass):
+        """
+        Gets the indexed name of a message class
+
+        @param  messageClass           [in] (type, str)  message class or its name
+        @return (str) class name
+        """
+        return messageClass if isinstance(messageClass, str) else messageClass.__name__
+    # end def _getName
+
+    def count(self, messageClass):
+        """
+        Counts the records of a class
+
+        @param  messageClass           [in] (type, str)  message class or its name
+        @return (int) number of records
+        """
+        return len(self.timestamps.get(self._getName(messageClass), ()))
+    # end def count
+
+    def _decode(self, name, position):
+        """
+        Decodes an indexed record
+
+        @param  name                   [in] (str)  class name
+        @param  position               [in] (int)  position in the class index
+        @return (tuple) timestamp and decoded message
+        """
+        timestamp, _, payload = self.reader.readRecord(self.offsets[name][position])
+        messageClass = self.MESSAGE_CLASSES[name]
+        if messageClass is ErrorCodes:
+            return timestamp, ErrorCodes.fromHexList(HexList(bytearray(payload)))
+        # end if
+        return timestamp, messageClass.fromHexList(HexList(bytearray(payload)), trusted=True)
+    # end def _decode
+
+    def range(self, messageClass, start=None, end=None, where=None):
+        """
+        Iterates over the records of a class within a time range
+
+        @param  messageClass           [in] (type, str)  message class or its name
+        @param  start                  [in] (float)  first time, included, None for the beginning
+        @param  end                    [in] (float)  last time, included, None for the end
+        @param  where                  [in] (callable)  message filter, None to keep every message
+        @return (generator) (timestamp, message) tuples in time order
+        """
+        name = self._getName(messageClass)
+        timestamps = self.timestamps.get(name, ())
+        first = 0 if start is None else bisect.bisect_left(timestamps, start)
+        last = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+        for position in range(first, last):
+            timestamp, message = self._decode(name, position)
+            if where is None or where(message):
+                yield timestamp, message
+            # end if
+        # end for
+    # end def range
+
+    def followedBy(self, first, second, within, whereFirst=None, whereSecond=None, start=None, end=None):
+        """
+        Finds the records of a class followed by records of another class within a delay
+
+        "every WheelMovement within 50 ms after a RatchetSwitch" is
+        followedBy(RatchetSwitch, WheelMovement, 0.05).
+
+        @param  first                  [in] (type, str)  class of the event A
+        @param  second                 [in] (type, str)  class of the event B
+        @param  within                 [in] (float)  maximum delay between A and B, in seconds
+        @param  whereFirst             [in] (callable)  filter of the A messages, None to keep them all
+        @param  whereSecond            [in] (callable)  filter of the B messages, None to keep them all
+        @param  start                  [in] (float)  first time of A, included, None for the beginning
+        @param  end                    [in] (float)  last time of A, included, None for the end
+        @return (generator) ((timeA, messageA), (timeB, messageB)) tuples, one per matching B
+        """
+        secondName = self._getName(second)
+        secondTimestamps = self.timestamps.get(secondName, ())
+        for firstTime, firstMessage in self.range(first, start, end, whereFirst):
+            position = bisect.bisect_right(secondTimestamps, firstTime)
+            last = bisect.bisect_right(secondTimestamps, firstTime + within)
+            for secondPosition in range(position, last):
+                secondTime, secondMessage = self._decode(secondName, secondPosition)
+                if whereSecond is None or whereSecond(secondMessage):
+                    yield (firstTime, firstMessage), (secondTime, secondMessage)
+                # end if
+            # end for
+        # end for
+    # end def followedBy
+# end class HiResWheelCaptureIndex
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelclock
+
+@brief  HID++ 2.0 HiResWheel time sources
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+import heapq
+import itertools
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class SystemClock(object):
+    """
+    Wall clock time source
+    """
+
+    def time(self):
+        """
+        Gets the current time
+
+        @return (float) time in seconds
+        """
+        return time.time()
+    # end def time
+
+    def sleep(self, duration):
+        """
+        Waits for a duration
+
+        @param  duration               [in] (float)  duration in seconds
+        """
+        time.sleep(duration)
+    # end def sleep
+
+    def callLater(self, delay, callback, *args):
+        """
+        Registers a callback, run from a timer thread
+
+        @param  delay                  [in] (float)  delay in seconds
+        @param  callback               [in] (callable)  function to call
+        @param  args                   [in] (tuple)  callback arguments
+        """
+        timer = threading.Timer(delay, callback, args)
+        timer.daemon = True
+        timer.start()
+    # end def callLater
+
+    def waitFor(self, condition, predicate, timeout=None):
+        """
+        Waits on a condition variable until a predicate is true, the condition lock being held
+
+        @param  condition              [in] (threading.Condition)  condition notified when the predicate may change
+        @param  predicate              [in] (callable)  returns True when the wait is over
+        @param  timeout                [in] (float)  maximum wait in seconds, None to wait forever
+        @return (bool) last value of the predicate
+        """
+        return condition.wait_for(predicate, timeout)
+    # end def waitFor
+# end class SystemClock
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock(SystemClock):
+    """
+    Simulated time source
+
+    Time only moves when sleep() or advance() is called, or when a wait has
+    to reach its next timer or its timeout. Callbacks registered with
+    callLater() run in the calling thread, in time order, as the clock goes
+    past them. A timing scenario of several minutes therefore runs as fast
+    as its callbacks and always in the same order.
+
+    A wait that no timer can satisfy returns at once, the clock being moved
+    to its timeout, instead of blocking forever.
+    """
+
+    def __init__(self, start=0.0):
+        """
+        Constructor
+
+        @param  start                  [in] (float)  initial time in seconds
+        """
+        self.now = start
+        self.timers = []
+        self.sequence = itertools.count()
+        self.lock = threading.RLock()
+    # end def __init__
+
+    def time(self):
+        """
+        Gets the simulated time
+
+        @return (float) time in seconds
+        """
+        return self.now
+    # end def time
+
+    def callLater(self, delay, callback, *args):
+        """
+        Registers a callback
+
+        @param  delay                  [in] (float)  delay in seconds
+        @param  callback               [in] (callable)  function to call
+        @param  args                   [in] (tuple)  callback arguments
+        """
+        with self.lock:
+            heapq.heappush(self.timers, (self.now + delay, next(self.sequence), callback, args))
+        # end with
+    # end def callLater
+
+    def _runNext(self):
+        """
+        Moves to the next timer and runs its callback
+        """
+        with self.lock:
+            deadline, _, callback, args = heapq.heappop(self.timers)
+            self.now = max(self.now, deadline)
+        # end with
+        callback(*args)
+    # end def _runNext
+
+    def advance(self, duration):
+        """
+        Moves the clock forward, running the callbacks on the way
+
+        @param  duration               [in] (float)  duration in seconds
+        """
+        deadline = self.now + duration
+        while self.timers and self.timers[0][0] <= deadline:
+            self._runNext()
+        # end while
+        self.now = max(self.now, deadline)
+    # end def advance
+
+    def sleep(self, duration):
+        """
+        Waits for a duration in simulated time, see advance()
+
+        @param  duration               [in] (float)  duration in seconds
+        """
+        self.advance(duration)
+    # end def sleep
+
+    def waitFor(self, condition, predicate, timeout=None):
+        """
+        Runs the callbacks until a predicate is true or the timeout is reached
+
+        @param  condition              [in] (threading.Condition)  unused, the callbacks run in the calling thread
+        @param  predicate              [in] (callable)  returns True when the wait is over
+        @param  timeout                [in] (float)  maximum wait in seconds, None to wait forever
+        @return (bool) last value of the predicate
+        """
+        deadline = None if timeout is None else self.now + timeout
+        result = predicate()
+        while not result and self.timers and (deadline is None or self.timers[0][0] <= deadline):
+            self._runNext()
+            result = predicate()
+        # end while
+        if not result and deadline is not None:
+            self.now = max(self.now, deadline)
+        # end if
+        return result
+    # end def waitFor
+# end class VirtualClock
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
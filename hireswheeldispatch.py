@@ -0,0 +1,841 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheeldispatch
+
+@brief  HID++ 2.0 HiResWheel per-class message queues
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error             import ErrorCodes
+from pyhid.hidpp.features.hireswheel        import EVENT_CLASSES
+from pyhid.hidpp.features.hireswheel        import HiResWheelClassifier
+from pyhid.hidpp.features.hireswheel        import RESPONSE_CLASSES
+from pyhid.hidpp.features.hireswheel        import WheelMovement
+from pyhid.hidpp.features.hireswheel        import messageClassOf
+from pyhid.hidpp.features.hireswheelcapture import RECEIVED
+from pyhid.hidpp.features.hireswheelcapture import REPORT_SIZES
+from pyhid.hidpp.features.hireswheelclock   import SYSTEM_CLOCK
+
+from collections                            import deque
+
+import itertools
+import logging
+import queue
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+LOGGER = logging.getLogger(__name__)
+# Queues of the HID dispatcher receiving the 0x2121 reports, see HiResWheelDispatcherQueue
+DISPATCHER_QUEUES = ('mouseMessageQueue', 'errorMessageQueue')
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelMessageQueue(object):
+    """
+    Message queue of a single 0x2121 message class
+
+    The put/get interface is the one of queue.Queue, so the queue can be
+    given to getMessage(queue=...). Each queue has its own condition
+    variable: a waiter is only woken by a message of its class.
+    """
+
+    def __init__(self, clock=SYSTEM_CLOCK):
+        """
+        Constructor
+
+        @param  clock                  [in] (SystemClock)  time source of the waits
+        """
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.messages = deque()
+    # end def __init__
+
+    def put(self, message, block=True, timeout=None):
+        """
+        Appends a message and wakes one waiter
+
+        @param  message                [in] (HiResWheel)  message to queue
+        @param  block                  [in] (bool)  unused, the queue is unbounded
+        @param  timeout                [in] (float) unused, the queue is unbounded
+        """
+        with self.condition:
+            if self._append(message):
+                self.condition.notify()
+            # end if
+        # end with
+    # end def put
+
+    def put_nowait(self, message):
+        """
+        Appends a message, see put()
+
+        @param  message                [in] (HiResWheel)  message to queue
+        """
+        self.put(message, block=False)
+    # end def put_nowait
+
+    def get(self, block=True, timeout=None):
+        """
+        Pops the oldest message
+
+        @param  block                  [in] (bool)  wait for a message if the queue is empty
+        @param  timeout                [in] (float) maximum wait in seconds, None to wait forever
+        @return (HiResWheel) oldest message
+        @raise  queue.Empty            if no message was received in time
+        """
+        with self.condition:
+            if block and not self.clock.waitFor(self.condition, self.qsize, timeout):
+                raise queue.Empty()
+            # end if
+            if not self.qsize():
+                raise queue.Empty()
+            # end if
+            return self._pop()
+        # end with
+    # end def get
+
+    def get_nowait(self):
+        """
+        Pops the oldest message without waiting, see get()
+
+        @return (HiResWheel) oldest message
+        """
+        return self.get(block=False)
+    # end def get_nowait
+
+    def qsize(self):
+        """
+        Gets the number of queued messages
+
+        @return (int) queue length
+        """
+        return len(self.messages)
+    # end def qsize
+
+    def empty(self):
+        """
+        Tells if the queue is empty
+
+        @return (bool) True if no message is queued
+        """
+        return not self.qsize()
+    # end def empty
+
+    def _append(self, message):
+        """
+        Stores a message, called with the condition held
+
+        @param  message                [in] (HiResWheel)  message to store
+        @return (bool) True if a new message is available
+        """
+        self.messages.append(message)
+        return True
+    # end def _append
+
+    def _pop(self):
+        """
+        Removes the oldest message, called with the condition held
+
+        @return (HiResWheel) oldest message
+        """
+        return self.messages.popleft()
+    # end def _pop
+# end class HiResWheelMessageQueue
+
+
+def mergeWheelMovements(previous, message):
+    """
+    Merges two consecutive WheelMovement notifications
+
+    The notifications are merged only if they come from the same device and
+    feature with the same resolution bit, and if the summed deltaV and
+    periods still fit in their fields.
+
+    @param  previous               [in] (WheelMovement)  older notification
+    @param  message                [in] (WheelMovement)  newer notification
+    @return (WheelMovement) merged notification, None if they cannot be merged
+    """
+    if not issubclass(messageClassOf(previous), WheelMovement) or \
+            not issubclass(messageClassOf(message), WheelMovement):
+        return None
+    # end if
+    if int(previous.deviceIndex) != int(message.deviceIndex) or \
+            int(previous.featureIndex) != int(message.featureIndex):
+        return None
+    # end if
+    previousResAndPeriods = int(previous.resAndPeriods)
+    resAndPeriods = int(message.resAndPeriods)
+    if (previousResAndPeriods ^ resAndPeriods) & ~WheelMovement.PERIODS_MASK:
+        return None
+    # end if
+    periods = (previousResAndPeriods & WheelMovement.PERIODS_MASK) + (resAndPeriods & WheelMovement.PERIODS_MASK)
+    deltaV = WheelMovement.getSignedDeltaV(previous) + WheelMovement.getSignedDeltaV(message)
+    if periods > WheelMovement.PERIODS_MASK or not -0x8000 <= deltaV <= 0x7FFF:
+        return None
+    # end if
+    merged = WheelMovement(int(message.deviceIndex),
+                           int(message.featureIndex),
+                           resAndPeriods=(resAndPeriods & ~WheelMovement.PERIODS_MASK) | periods,
+                           deltaV=deltaV & 0xFFFF)
+    merged.softwareId = int(message.softwareId)
+    return merged
+# end def mergeWheelMovements
+
+
+class HiResWheelRingBuffer(HiResWheelMessageQueue):
+    """
+    Fixed-capacity message queue for high-rate notifications
+
+    The slots are allocated once. When the buffer is full, the overflow
+    policy applies:
+     - DROP_OLDEST: the oldest message is overwritten
+     - DROP_NEWEST: the incoming message is discarded
+     - COALESCE: the incoming message is merged into the newest one, or the
+       oldest one is dropped when they cannot be merged
+    The dropped, coalesced and highWaterMark counters tell whether the
+    reader fell behind.
+
+    COALESCE never merges across a boundary: each message is stored with
+    the boundary sequence number current when it arrived, and two messages
+    with different numbers are not merged. The HiResWheelRouter moves the
+    number on every message queued elsewhere, a RatchetSwitch or a
+    SetWheelModeResponse for instance. A WheelMovement whose periods is not
+    1 is never merged either, so the sign that the device itself grouped
+    several periods is kept.
+    """
+    DROP_OLDEST = 'dropOldest'
+    DROP_NEWEST = 'dropNewest'
+    COALESCE    = 'coalesce'
+
+    def __init__(self, capacity, policy=DROP_OLDEST, merge=mergeWheelMovements, clock=SYSTEM_CLOCK, boundary=None):
+        """
+        Constructor
+
+        @param  capacity               [in] (int)       maximum number of queued messages
+        @param  policy                 [in] (str)       DROP_OLDEST, DROP_NEWEST or COALESCE
+        @param  merge                  [in] (callable)  merge(previous, message) used by COALESCE,
+                                                        returns None if the messages cannot be merged
+        @param  clock                  [in] (SystemClock)  time source of the waits
+        @param  boundary               [in] (callable)  returns the current boundary sequence number, None when
+                                                        the messages have no boundary
+        """
+        if capacity < 1:
+            raise ValueError('The capacity must be positive: %d' % capacity)
+        # end if
+        if policy not in (self.DROP_OLDEST, self.DROP_NEWEST, self.COALESCE):
+            raise ValueError('Unknown overflow policy: %s' % policy)
+        # end if
+        super(HiResWheelRingBuffer, self).__init__(clock)
+        self.messages = [None] * capacity
+        self.mergeKeys = [None] * capacity
+        self.capacity = capacity
+        self.policy = policy
+        self.merge = merge
+        self.boundary = boundary
+        self.head = 0
+        self.size = 0
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.highWaterMark = 0
+    # end def __init__
+
+    def qsize(self):
+        """
+        Gets the number of queued messages
+
+        @return (int) queue length
+        """
+        return self.size
+    # end def qsize
+
+    def _append(self, message):
+        """
+        Stores a message, applying the overflow policy when full
+
+        @param  message                [in] (HiResWheel)  message to store
+        @return (bool) True if a new message is available
+        """
+        self.received += 1
+        mergeKey = self._getMergeKey(message)
+        if self.size < self.capacity:
+            tail = (self.head + self.size) % self.capacity
+            self.messages[tail] = message
+            self.mergeKeys[tail] = mergeKey
+            self.size += 1
+            self.highWaterMark = max(self.highWaterMark, self.size)
+            return True
+        # end if
+
+        if self.policy == self.DROP_NEWEST:
+            self.dropped += 1
+            return False
+        # end if
+        if self.policy == self.COALESCE:
+            newest = (self.head + self.size - 1) % self.capacity
+            if mergeKey is not None and self.mergeKeys[newest] == mergeKey:
+                merged = self.merge(self.messages[newest], message)
+                if merged is not None:
+                    self.messages[newest] = merged
+                    self.coalesced += 1
+                    return False
+                # end if
+            # end if
+        # end if
+        self.messages[self.head] = message
+        self.mergeKeys[self.head] = mergeKey
+        self.head = (self.head + 1) % self.capacity
+        self.dropped += 1
+        return False
+    # end def _append
+
+    def _pop(self):
+        """
+        Removes the oldest message
+
+        @return (HiResWheel) oldest message
+        """
+        message = self.messages[self.head]
+        self.messages[self.head] = None
+        self.mergeKeys[self.head] = None
+        self.head = (self.head + 1) % self.capacity
+        self.size -= 1
+        return message
+    # end def _pop
+
+    def _getMergeKey(self, message):
+        """
+        Gets the key a message must share with the newest one to be merged into it
+
+        @param  message                [in] (HiResWheel)  incoming message
+        @return (int) boundary sequence number, None if the message is never merged
+        """
+        if issubclass(messageClassOf(message), WheelMovement) and \
+                int(message.resAndPeriods) & WheelMovement.PERIODS_MASK != 1:
+            return None
+        # end if
+        return 0 if self.boundary is None else self.boundary()
+    # end def _getMergeKey
+# end class HiResWheelRingBuffer
+
+
+class WheelMovementCoalescer(object):
+    """
+    Pipeline stage merging consecutive WheelMovement notifications
+
+    WheelMovement notifications are held and merged with mergeWheelMovements()
+    until one of these happens:
+     - the window, counted from the first held notification, expires
+     - maxCount notifications were merged
+     - the next notification cannot be merged (other device or resolution,
+       deltaV or periods overflow)
+     - any other message goes through, a RatchetSwitch event or a
+       SetWheelModeResponse for instance, which is never merged across
+     - flush() is called
+    The merged notification is then passed to the output, so the net scroll
+    is exact while far fewer objects reach the queues.
+    """
+
+    def __init__(self, output, window=None, maxCount=None, clock=time.time):
+        """
+        Constructor
+
+        @param  output                 [in] (callable)  receives every message leaving the stage
+        @param  window                 [in] (float)     maximum merge duration in seconds, None for no limit
+        @param  maxCount               [in] (int)       maximum number of merged notifications, None for no limit
+        @param  clock                  [in] (callable)  time source
+        """
+        self.output = output
+        self.window = window
+        self.maxCount = maxCount
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.pending = None
+        self.pendingStart = None
+        self.pendingCount = 0
+        self.received = 0
+        self.coalesced = 0
+    # end def __init__
+
+    def push(self, message):
+        """
+        Feeds one message into the stage
+
+        @param  message                [in] (HiResWheel)  incoming message
+        """
+        with self.lock:
+            self.received += 1
+            if not issubclass(messageClassOf(message), WheelMovement):
+                self._flush()
+                self.output(message)
+                return
+            # end if
+
+            now = self.clock()
+            if self.pending is not None:
+                merged = None
+                if not self._isExpired(now):
+                    merged = mergeWheelMovements(self.pending, message)
+                # end if
+                if merged is not None:
+                    self.pending = merged
+                    self.pendingCount += 1
+                    self.coalesced += 1
+                    if self.maxCount is not None and self.pendingCount >= self.maxCount:
+                        self._flush()
+                    # end if
+                    return
+                # end if
+                self._flush()
+            # end if
+            self.pending = message
+            self.pendingStart = now
+            self.pendingCount = 1
+        # end with
+    # end def push
+
+    def poll(self):
+        """
+        Releases the held notification if its window expired
+        """
+        with self.lock:
+            if self.pending is not None and self._isExpired(self.clock()):
+                self._flush()
+            # end if
+        # end with
+    # end def poll
+
+    def _isExpired(self, now):
+        """
+        Tells if the window of the held notification expired, called with the lock held
+
+        @param  now                    [in] (float)  current time
+        @return (bool) True if the window expired
+        """
+        return self.window is not None and now >= self.pendingStart + self.window
+    # end def _isExpired
+
+    def getTimeout(self):
+        """
+        Gets the time before poll() has to be called again
+
+        @return (float) time left in the window of the held notification, the whole window when nothing is held,
+                        None without window
+        """
+        with self.lock:
+            if self.window is None:
+                return None
+            elif self.pending is None:
+                return self.window
+            # end if
+            return max(self.pendingStart + self.window - self.clock(), 0.0)
+        # end with
+    # end def getTimeout
+
+    def flush(self):
+        """
+        Releases the held notification
+        """
+        with self.lock:
+            self._flush()
+        # end with
+    # end def flush
+
+    def _flush(self):
+        """
+        Releases the held notification, called with the lock held
+        """
+        if self.pending is not None:
+            pending = self.pending
+            self.pending = None
+            self.pendingCount = 0
+            self.output(pending)
+        # end if
+    # end def _flush
+# end class WheelMovementCoalescer
+
+
+class HiResWheelDispatcherQueue(object):
+    """
+    HID dispatcher queue with the 0x2121 reports taken out by a HiResWheelRouter
+
+    The HID dispatcher puts every raw report it reads into its queues. put()
+    hands the report to the router first, and only queues the reports the
+    router leaves. An error of the router is logged and the report is queued
+    as if no router were installed: the dispatcher thread never sees it.
+    Every other attribute is the one of the dispatcher queue.
+
+    put() also counts the DeviceConnection notifications of each device:
+    with the session number of the queue, they tell the connections of a
+    device apart, see getConnectionKey().
+    """
+    # HID++ 1.0 DeviceConnection notification, sent by the receiver when a device connects
+    DEVICE_CONNECTION = (0x10, 0x41)
+    sessions = itertools.count(1)
+
+    def __init__(self, messageQueue, router=None):
+        """
+        Constructor
+
+        @param  messageQueue           [in] (queue.Queue)  queue of the HID dispatcher
+        @param  router                 [in] (HiResWheelRouter)  router of the 0x2121 reports, None to queue them all
+        """
+        self.messageQueue = messageQueue
+        self.router = router
+        self.session = next(self.sessions)
+        self.connections = {}
+    # end def __init__
+
+    def put(self, report, block=True, timeout=None):
+        """
+        Routes or queues a report read by the HID dispatcher
+
+        @param  report                 [in] (HexList)  raw report
+        @param  block                  [in] (bool)  see queue.Queue.put()
+        @param  timeout                [in] (float) see queue.Queue.put()
+        """
+        if len(report) > 2 and (report[0], report[2]) == self.DEVICE_CONNECTION:
+            self.connections[report[1]] = self.connections.get(report[1], 0) + 1
+        # end if
+        router = self.router
+        if router is not None:
+            try:
+                if router.dispatch(report):
+                    return
+                # end if
+            except Exception:
+                LOGGER.exception('0x2121 routing failed, report left to the HID dispatcher: %r', report)
+            # end try
+        # end if
+        self.messageQueue.put(report, block, timeout)
+    # end def put
+
+    def put_nowait(self, report):
+        """
+        Routes or queues a report read by the HID dispatcher, see put()
+
+        @param  report                 [in] (HexList)  raw report
+        """
+        self.put(report, block=False)
+    # end def put_nowait
+
+    def __getattr__(self, name):
+        """
+        Gets the other attributes from the dispatcher queue
+
+        @param  name                   [in] (str)  attribute name
+        @return (object) attribute of the dispatcher queue
+        """
+        return getattr(self.messageQueue, name)
+    # end def __getattr__
+# end class HiResWheelDispatcherQueue
+
+
+def wrapDispatcherQueues(dispatcher, names=DISPATCHER_QUEUES):
+    """
+    Wraps the queues of a HID dispatcher in HiResWheelDispatcherQueue, once
+
+    @param  dispatcher             [in] (HidDispatcher)  HID dispatcher reading the device
+    @param  names                  [in] (tuple)  names of the dispatcher queues
+    @return (list) HiResWheelDispatcherQueue of each name
+    """
+    wrappedQueues = []
+    for name in names:
+        messageQueue = getattr(dispatcher, name)
+        if not isinstance(messageQueue, HiResWheelDispatcherQueue):
+            messageQueue = HiResWheelDispatcherQueue(messageQueue)
+            setattr(dispatcher, name, messageQueue)
+        # end if
+        wrappedQueues.append(messageQueue)
+    # end for
+    return wrappedQueues
+# end def wrapDispatcherQueues
+
+
+def getConnectionKey(dispatcher, deviceIndex):
+    """
+    Identifies the current connection of a device
+
+    The key changes with the HID dispatcher, which is opened again when the
+    device enumerates again, with each DeviceConnection notification of the
+    device and with resetConnection(). A reset or a firmware update always
+    ends the connection, so a key never outlives the feature indexes of the
+    firmware it was taken with.
+
+    @param  dispatcher             [in] (HidDispatcher)  HID dispatcher reading the device
+    @param  deviceIndex            [in] (int)  device index
+    @return (tuple) device index, dispatcher session and connection number
+    """
+    wrappedQueues = wrapDispatcherQueues(dispatcher)
+    return (deviceIndex, wrappedQueues[0].session,
+            sum(messageQueue.connections.get(deviceIndex, 0) for messageQueue in wrappedQueues))
+# end def getConnectionKey
+
+
+def resetConnection(dispatcher, deviceIndex):
+    """
+    Starts a new connection key for a device reset by the test itself
+
+    @param  dispatcher             [in] (HidDispatcher)  HID dispatcher reading the device
+    @param  deviceIndex            [in] (int)  device index
+    """
+    messageQueue = wrapDispatcherQueues(dispatcher)[0]
+    messageQueue.connections[deviceIndex] = messageQueue.connections.get(deviceIndex, 0) + 1
+# end def resetConnection
+
+
+class HiResWheelRouter(object):
+    """
+    Routes incoming 0x2121 reports into one queue per message class
+
+    The HID dispatcher calls dispatch() for every report it reads, once the
+    router is installed on it with install(). 0x2121 responses, events and
+    error reports are decoded and queued as they arrive. Any other report
+    is left to the dispatcher, which keeps it in its usual queue. A
+    GetWheelModeResponse therefore never waits behind WheelMovement events.
+
+    With an eventCapacity, the events are kept in HiResWheelRingBuffer
+    queues, so memory stays flat whatever the notification rate. With a
+    coalesceWindow or a coalesceCount, the messages go through a
+    WheelMovementCoalescer before being queued.
+
+    boundarySequence counts the messages other than WheelMovement queued so
+    far. The ring buffers do not coalesce WheelMovement events across it.
+
+    Besides the condition of each queue, a router-wide condition is
+    notified for every queued message: waitForAny() blocks on it until one
+    of several classes has a message, a response or its error report for
+    instance.
+
+    With a capture, every short and long report read is recorded as it
+    arrives, raw and before routing: the notifications nobody reads are
+    captured too. A capture error is logged, the report is still routed.
+
+    Usage:
+        router = HiResWheelRouter(featureIndex=0x0B)
+        router.install(hidDispatcher)
+        response = router.getMessage(GetWheelModeResponse, timeout=2.0)
+        router.uninstall(hidDispatcher)
+    """
+    DISPATCHER_QUEUES = DISPATCHER_QUEUES
+    ERROR_FEATURE_INDEX = 0xFF
+
+    def __init__(self, featureIndex, messageClasses=RESPONSE_CLASSES + EVENT_CLASSES,
+                 eventCapacity=None, overflowPolicy=HiResWheelRingBuffer.DROP_OLDEST,
+                 coalesceWindow=None, coalesceCount=None, clock=SYSTEM_CLOCK, capture=None):
+        """
+        Constructor
+
+        @param  featureIndex           [in] (int)    feature index of 0x2121 on the device
+        @param  messageClasses         [in] (tuple)  response and event classes to route
+        @param  eventCapacity          [in] (int)    capacity of the event queues, None for unbounded queues
+        @param  overflowPolicy         [in] (str)    HiResWheelRingBuffer policy of the event queues
+        @param  coalesceWindow         [in] (float)  WheelMovement merge window in seconds, None for no limit
+        @param  coalesceCount          [in] (int)    maximum number of merged WheelMovement, None for no limit
+        @param  clock                  [in] (SystemClock)  time source of the waits and of the coalescing window
+        @param  capture                [in] (HiResWheelCaptureWriter)  records the reports read, None for no capture
+        """
+        self.classifier = HiResWheelClassifier(featureIndex, messageClasses)
+        self.featureIndex = featureIndex
+        self.capture = capture
+        self.boundarySequence = 0
+        self.queues = {ErrorCodes: HiResWheelMessageQueue(clock)}
+        for messageClass in messageClasses:
+            if messageClass.EVENT and eventCapacity is not None:
+                self.queues[messageClass] = HiResWheelRingBuffer(eventCapacity, overflowPolicy, clock=clock,
+                                                                 boundary=lambda: self.boundarySequence)
+            else:
+                self.queues[messageClass] = HiResWheelMessageQueue(clock)
+            # end if
+        # end for
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.coalescer = None
+        if coalesceWindow is not None or coalesceCount is not None:
+            self.coalescer = WheelMovementCoalescer(self._queue, coalesceWindow, coalesceCount, clock.time)
+        # end if
+    # end def __init__
+
+    def dispatch(self, report):
+        """
+        Queues a report if it belongs to 0x2121
+
+        @param  report                 [in] (HexList, bytes)  raw report read from the device
+        @return (bool) True if the report was queued, False if the dispatcher has to handle it
+        """
+        if self.capture is not None and len(report) in REPORT_SIZES:
+            try:
+                self.capture.write(RECEIVED, report)
+            except Exception:
+                LOGGER.exception('0x2121 capture failed, report not recorded: %r', report)
+            # end try
+        # end if
+        if len(report) > 3 and report[2] == self.ERROR_FEATURE_INDEX and report[3] == self.featureIndex:
+            self._queue(ErrorCodes.fromHexList(report))
+            return True
+        # end if
+        messageClass = self.classifier.getMessageClass(report)
+        if messageClass is None:
+            return False
+        # end if
+        message = messageClass.fromHexList(report, trusted=True)
+        if self.coalescer is not None:
+            self.coalescer.push(message)
+        else:
+            self._queue(message)
+        # end if
+        return True
+    # end def dispatch
+
+    def _queue(self, message):
+        """
+        Queues a decoded message, or a message leaving the coalescing stage
+
+        @param  message                [in] (HiResWheel)  decoded message
+        """
+        messageClass = messageClassOf(message)
+        if not issubclass(messageClass, WheelMovement):
+            self.boundarySequence += 1
+        # end if
+        self.queues[messageClass].put(message)
+        with self.condition:
+            self.condition.notify_all()
+        # end with
+    # end def _queue
+
+    def install(self, dispatcher):
+        """
+        Takes the 0x2121 reports out of the queues of a HID dispatcher
+
+        The DISPATCHER_QUEUES of the dispatcher are wrapped in a
+        HiResWheelDispatcherQueue once, installing another router replaces
+        this one.
+
+        @param  dispatcher             [in] (HidDispatcher)  HID dispatcher reading the device
+        """
+        for messageQueue in wrapDispatcherQueues(dispatcher, self.DISPATCHER_QUEUES):
+            messageQueue.router = self
+        # end for
+    # end def install
+
+    def uninstall(self, dispatcher):
+        """
+        Leaves the 0x2121 reports to a HID dispatcher again
+
+        @param  dispatcher             [in] (HidDispatcher)  HID dispatcher given to install()
+        """
+        for name in self.DISPATCHER_QUEUES:
+            messageQueue = getattr(dispatcher, name)
+            if isinstance(messageQueue, HiResWheelDispatcherQueue) and messageQueue.router is self:
+                messageQueue.router = None
+            # end if
+        # end for
+    # end def uninstall
+
+    def routes(self, messageClass):
+        """
+        Tells if the messages of a class are queued by the router
+
+        @param  messageClass           [in] (type)  message class
+        @return (bool) True if getMessage() accepts the class
+        """
+        return messageClass in self.queues
+    # end def routes
+
+    def getQueue(self, messageClass):
+        """
+        Gets the queue of a message class
+
+        @param  messageClass           [in] (type)  response, event or ErrorCodes class
+        @return (HiResWheelMessageQueue) queue receiving the messages of the class
+        """
+        return self.queues[messageClass]
+    # end def getQueue
+
+    def waitForAny(self, messageClasses, timeout=None):
+        """
+        Waits until one of several classes has a queued message
+
+        @param  messageClasses         [in] (tuple)  response, event or ErrorCodes classes, by priority
+        @param  timeout                [in] (float)  maximum wait in seconds, None to wait forever
+        @return (type) first class of messageClasses with a queued message, None on timeout
+        """
+        messageQueues = [(messageClass, self.queues[messageClass]) for messageClass in messageClasses]
+
+        def getReadyClass():
+            return next((messageClass for messageClass, messageQueue in messageQueues if not messageQueue.empty()),
+                        None)
+        # end def getReadyClass
+
+        with self.condition:
+            self.clock.waitFor(self.condition, lambda: getReadyClass() is not None, timeout)
+            return getReadyClass()
+        # end with
+    # end def waitForAny
+
+    def getMessage(self, messageClass, timeout=None):
+        """
+        Waits for the next message of a class
+
+        The events held by the coalescing stage are released when the wait
+        starts, then whenever their window expires during the wait, and
+        when the wait times out.
+
+        @param  messageClass           [in] (type)  response, event or ErrorCodes class
+        @param  timeout                [in] (float) maximum wait in seconds, None to wait forever
+        @return (HiResWheel) received message, None on timeout
+        """
+        messageQueue = self.queues[messageClass]
+        if self.coalescer is None or not getattr(messageClass, 'EVENT', False):
+            try:
+                return messageQueue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            # end try
+        # end if
+
+        self.coalescer.flush()
+        deadline = None if timeout is None else self.clock.time() + timeout
+        while deadline is None or self.clock.time() < deadline:
+            self.coalescer.poll()
+            waits = [self.coalescer.getTimeout()]
+            if deadline is not None:
+                waits.append(deadline - self.clock.time())
+            # end if
+            waits = [wait for wait in waits if wait is not None]
+            try:
+                return messageQueue.get(timeout=max(min(waits), 0.0) if waits else None)
+            except queue.Empty:
+                pass
+            # end try
+        # end while
+        self.coalescer.flush()
+        try:
+            return messageQueue.get_nowait()
+        except queue.Empty:
+            return None
+        # end try
+    # end def getMessage
+# end class HiResWheelRouter
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelemulator
+
+@brief  HID++ 2.0 HiResWheel device emulator
+
+Software stand-in for a 0x2121 device on a local SOCK_SEQPACKET socket
+pair: every read returns one whole report, like a hidraw node.
+
+Usage: python hireswheelemulator.py [--count 100000] [--rate 5000] [--ratchet 0.01]
+
+The command line runs a load test: random wheel spins and ratchet toggles
+are generated at the given rate and decoded on the host side.
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error           import ErrorCodes
+from pyhid.hidpp.features.hireswheel      import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel      import GetWheelCapabilityResponse
+from pyhid.hidpp.features.hireswheel      import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import HiResWheelClassifier
+from pyhid.hidpp.features.hireswheel      import HiResWheelLayout
+from pyhid.hidpp.features.hireswheel      import RatchetSwitch
+from pyhid.hidpp.features.hireswheel      import SetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import WheelMovement
+from pyhid.hidpp.features.hireswheelclock import SYSTEM_CLOCK
+
+import argparse
+import random
+import select
+import socket
+import sys
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelEmulator(object):
+    """
+    Emulated 0x2121 device
+
+    Requests written on the host socket are answered from a server thread:
+    GetWheelCapability, GetWheelMode, SetWheelMode and GetRatchetSwitchState,
+    any other function index gets an INVALID_FUNCTION_ID error report.
+    Reports for another device or feature index are ignored.
+
+    Wheel spins and ratchet toggles are generated with spin(), toggleRatchet()
+    or play(). As on the device, WheelMovement is only notified when the
+    wheelMode target bit is set (HID++ reporting), the wheel is reported as
+    native HID otherwise, and the invert bit reverses deltaV. Unless given,
+    periods is the number of PERIOD elapsed since the previous movement.
+    The device takes SWITCH_TIME to apply a SetWheelMode or a ratchet
+    toggle before confirming it, so a scroll interrupted by either reports
+    periods greater than 1. A new wheelMode starts a new scroll.
+
+    With a VirtualClock and an output callable, the reports are handed
+    directly to output(), a HiResWheelRouter.dispatch for instance, and
+    the device runs in simulated time: the confirmations are sent when a
+    wait of the host moves the clock past them.
+
+    Usage:
+        emulator = HiResWheelEmulator(deviceIndex=1, featureIndex=0x0B)
+        emulator.start()
+        os.write(emulator.host.fileno(), request)
+        emulator.play([(WHEEL, 120), (RATCHET,)], rate=2000)
+        emulator.close()
+    """
+    ERROR_FEATURE_INDEX = 0xFF
+    REPORT_SIZE = 64
+
+    TARGET_MASK = 0x01
+    RESOLUTION_MASK = 0x02
+    INVERT_MASK = 0x04
+
+    # Sampling period of the wheel, in seconds
+    PERIOD = 0.008
+    # Time taken to apply a wheelMode or ratchetMode change, before confirming it
+    SWITCH_TIME = 2 * PERIOD
+    SET_WHEEL_MODE = 2
+
+    # Scripted actions, see play()
+    WHEEL = 'wheel'
+    RATCHET = 'ratchet'
+
+    def __init__(self, deviceIndex=1, featureIndex=0x0B, multiplier=8, capabilities=0x0C, wheelMode=0,
+                 ratchetMode=1, clock=SYSTEM_CLOCK, output=None):
+        """
+        Constructor
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  featureIndex           [in] (int)  feature index of 0x2121
+        @param  multiplier             [in] (int)  GetWheelCapability multiplier
+        @param  capabilities           [in] (int)  GetWheelCapability capabilities, hasSwitch and hasInvert
+        @param  wheelMode              [in] (int)  initial wheelMode
+        @param  ratchetMode            [in] (int)  initial ratchetMode, 1 for ratchet, 0 for free wheel
+        @param  clock                  [in] (SystemClock)  time source of play() and of the periods
+        @param  output                 [in] (callable)  receives the reports instead of the host socket
+        """
+        self.deviceIndex = deviceIndex
+        self.featureIndex = featureIndex
+        self.multiplier = multiplier
+        self.capabilities = capabilities
+        self.wheelMode = wheelMode
+        self.ratchetMode = ratchetMode
+        self.clock = clock
+        self.output = output
+        self.lastMovement = None
+
+        self.host, self.device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+        self.requests = 0
+        self.notifications = 0
+        self.nativeReports = 0
+    # end def __init__
+
+    def start(self):
+        """
+        Starts answering the requests
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name='HiResWheelEmulator')
+        self.thread.daemon = True
+        self.thread.start()
+    # end def start
+
+    def close(self):
+        """
+        Stops the server thread and closes both ends of the transport
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # end if
+        self.device.close()
+        self.host.close()
+    # end def close
+
+    def _serve(self):
+        """
+        Answers the requests until close() is called
+        """
+        while self.running:
+            readable, _, _ = select.select([self.device], [], [], 0.05)
+            if not readable:
+                continue
+            # end if
+            try:
+                report = self.device.recv(self.REPORT_SIZE)
+            except OSError:
+                break
+            # end try
+            if not report:
+                break
+            # end if
+            self.request(report)
+        # end while
+    # end def _serve
+
+    def _send(self, report):
+        """
+        Writes one report to the host
+
+        @param  report                 [in] (bytes)  raw report
+        """
+        if self.output is not None:
+            self.output(report)
+            return
+        # end if
+        with self.lock:
+            self.device.send(report)
+        # end with
+    # end def _send
+
+    @staticmethod
+    def _encode(message, softwareId):
+        """
+        Encodes a message with the given SoftwareID
+
+        @param  message                [in] (HiResWheel)  message to encode
+        @param  softwareId             [in] (int)  SoftwareID
+        @return (bytes) raw report
+        """
+        message.softwareId = softwareId
+        return bytes(message.LAYOUT.pack(message))
+    # end def _encode
+
+    def request(self, report):
+        """
+        Answers a request without going through the socket, see output
+
+        @param  report                 [in] (bytes)  raw request
+        """
+        report = bytearray(report)
+        response = self.answer(report)
+        if response is None:
+            return
+        # end if
+        if report[3] >> 4 == self.SET_WHEEL_MODE:
+            self.clock.callLater(self.SWITCH_TIME, self._send, response)
+        else:
+            self._send(response)
+        # end if
+    # end def request
+
+    def answer(self, report):
+        """
+        Builds the answer of a request
+
+        @param  report                 [in] (bytearray)  raw request
+        @return (bytes) raw response or error report, None if the request is not for this feature
+        """
+        if (len(report) not in (HiResWheelLayout.SHORT_SIZE, HiResWheelLayout.LONG_SIZE)
+                or report[0] not in (HiResWheelLayout.SHORT_REPORT_ID, HiResWheelLayout.LONG_REPORT_ID)
+                or report[1] != self.deviceIndex or report[2] != self.featureIndex):
+            return None
+        # end if
+        self.requests += 1
+        functionIndex = report[3] >> 4
+        softwareId = report[3] & 0x0F
+
+        if functionIndex == 0:
+            return self._encode(GetWheelCapabilityResponse(self.deviceIndex, self.featureIndex,
+                                                           multiplier=self.multiplier,
+                                                           capabilities=self.capabilities), softwareId)
+        elif functionIndex == 1:
+            return self._encode(GetWheelModeResponse(self.deviceIndex, self.featureIndex,
+                                                     wheelMode=self.wheelMode), softwareId)
+        elif functionIndex == self.SET_WHEEL_MODE:
+            if report[4] != self.wheelMode:
+                self.lastMovement = None
+            # end if
+            self.wheelMode = report[4]
+            return self._encode(SetWheelModeResponse(self.deviceIndex, self.featureIndex,
+                                                     wheelMode=self.wheelMode), softwareId)
+        elif functionIndex == 3:
+            return self._encode(GetRatchetSwitchStateResponse(self.deviceIndex, self.featureIndex,
+                                                              ratchetMode=self.ratchetMode), softwareId)
+        # end if
+
+        error = bytearray(HiResWheelLayout.LONG_SIZE)
+        error[0:5] = (HiResWheelLayout.LONG_REPORT_ID, self.deviceIndex, self.ERROR_FEATURE_INDEX,
+                      self.featureIndex, report[3])
+        error[5] = ErrorCodes.INVALID_FUNCTION_ID
+        return bytes(error)
+    # end def answer
+
+    def _getPeriods(self):
+        """
+        Counts the sampling periods since the previous movement
+
+        @return (int) periods, 1 for the first movement of a scroll
+        """
+        now = self.clock.time()
+        last, self.lastMovement = self.lastMovement, now
+        if last is None:
+            return 1
+        # end if
+        periods = int(round((now - last) / self.PERIOD))
+        if periods > WheelMovement.PERIODS_MASK:
+            return 1
+        # end if
+        return max(periods, 1)
+    # end def _getPeriods
+
+    def spin(self, deltaV, periods=None):
+        """
+        Rolls the wheel
+
+        @param  deltaV                 [in] (int)  signed wheel movement, in the unit of the current resolution
+        @param  periods                [in] (int)  number of sampling periods, 1..15, None to count them
+        @return (bool) True if a WheelMovement was notified, False if the movement was reported as native HID
+        """
+        if periods is None:
+            periods = self._getPeriods()
+        # end if
+        if not self.wheelMode & self.TARGET_MASK:
+            self.nativeReports += 1
+            return False
+        # end if
+        if self.wheelMode & self.INVERT_MASK:
+            deltaV = -deltaV
+        # end if
+        resAndPeriods = periods & WheelMovement.PERIODS_MASK
+        if self.wheelMode & self.RESOLUTION_MASK:
+            resAndPeriods |= WheelMovement.RESOLUTION_MASK
+        # end if
+        self._send(self._encode(WheelMovement(self.deviceIndex, self.featureIndex,
+                                              resAndPeriods=resAndPeriods,
+                                              deltaV=deltaV & 0xFFFF), 0))
+        self.notifications += 1
+        return True
+    # end def spin
+
+    def toggleRatchet(self):
+        """
+        Presses the ratchet switch button, RatchetSwitch is notified SWITCH_TIME later
+        """
+        self.ratchetMode ^= 1
+        self.clock.callLater(self.SWITCH_TIME, self._send,
+                             self._encode(RatchetSwitch(self.deviceIndex, self.featureIndex,
+                                                        ratchetMode=self.ratchetMode), 0))
+        self.notifications += 1
+    # end def toggleRatchet
+
+    def play(self, script, rate):
+        """
+        Plays actions at a fixed rate
+
+        The actions are scheduled on absolute times, so the rate does not
+        drift when one write is late.
+
+        @param  script                 [in] (iterable)  actions, (WHEEL, deltaV[, periods]) or (RATCHET,)
+        @param  rate                   [in] (float)  actions per second, None for as fast as possible
+        @return (int) number of played actions
+        """
+        count = 0
+        start = self.clock.time()
+        for action in script:
+            if rate is not None:
+                delay = start + count / float(rate) - self.clock.time()
+                if delay > 0:
+                    self.clock.sleep(delay)
+                # end if
+            # end if
+            if action[0] == self.WHEEL:
+                self.spin(*action[1:])
+            elif action[0] == self.RATCHET:
+                self.toggleRatchet()
+            else:
+                raise ValueError('Unknown action: %s' % (action,))
+            # end if
+            count += 1
+        # end for
+        return count
+    # end def play
+
+    @classmethod
+    def randomScript(cls, count, ratchetProbability=0.01, maxDeltaV=120, seed=None):
+        """
+        Generates random wheel spins and ratchet toggles
+
+        @param  count                  [in] (int)    number of actions
+        @param  ratchetProbability     [in] (float)  probability of a ratchet toggle
+        @param  maxDeltaV              [in] (int)    maximum absolute deltaV
+        @param  seed                   [in] (int)    random seed, for a reproducible script
+        @return (generator) actions, see play()
+        """
+        generator = random.Random(seed)
+        for _ in range(count):
+            if generator.random() < ratchetProbability:
+                yield (cls.RATCHET,)
+            else:
+                yield (cls.WHEEL, generator.choice((-1, 1)) * generator.randint(1, maxDeltaV))
+            # end if
+        # end for
+    # end def randomScript
+# end class HiResWheelEmulator
+
+
+def main(args):
+    """
+    Runs a load test from the command line
+
+    @param  args                       [in] (list)  command line arguments
+    @return (int) exit code, 1 if notifications were lost
+    """
+    parser = argparse.ArgumentParser(description='HiResWheel emulator load test')
+    parser.add_argument('--count', type=int, default=100000, help='number of actions (default: 100000)')
+    parser.add_argument('--rate', type=float, default=5000, help='actions per second, 0 for unpaced (default: 5000)')
+    parser.add_argument('--ratchet', type=float, default=0.01, help='ratchet toggle probability (default: 0.01)')
+    parser.add_argument('--seed', type=int, help='random seed')
+    options = parser.parse_args(args)
+
+    emulator = HiResWheelEmulator(wheelMode=HiResWheelEmulator.TARGET_MASK | HiResWheelEmulator.RESOLUTION_MASK)
+    classifier = HiResWheelClassifier(emulator.featureIndex)
+    received = [0]
+
+    def consume():
+        while received[0] < options.count:
+            readable, _, _ = select.select([emulator.host], [], [], 1.0)
+            if not readable:
+                break
+            # end if
+            if classifier.decode(emulator.host.recv(emulator.REPORT_SIZE), trusted=True) is not None:
+                received[0] += 1
+            # end if
+        # end while
+    # end def consume
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    start = time.time()
+    emulator.play(emulator.randomScript(options.count, options.ratchet, seed=options.seed), options.rate or None)
+    consumer.join()
+    duration = time.time() - start
+    emulator.close()
+
+    sys.stdout.write('%d notifications sent, %d decoded in %.3f s (%.0f/s)\n'
+                     % (emulator.notifications, received[0], duration, received[0] / duration))
+    return 0 if received[0] == emulator.notifications else 1
+# end def main
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
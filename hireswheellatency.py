@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheellatency
+
+@brief  HID++ 2.0 HiResWheel round-trip latency histograms
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import HiResWheelRequestTemplates
+from pyhid.hidpp.features.hireswheelclock import SYSTEM_CLOCK
+
+import json
+import math
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class LatencyHistogram(object):
+    """
+    HDR-style latency histogram
+
+    Values are counted in microseconds into log-linear buckets: exact below
+    2 * 10^significantDigits, then with a relative error below
+    10^-significantDigits. The memory is fixed by the highest trackable
+    value, whatever the number of recorded values.
+    """
+
+    def __init__(self, highest=60.0, significantDigits=2):
+        """
+        Constructor
+
+        @param  highest                [in] (float)  highest trackable value in seconds, larger values are clamped
+        @param  significantDigits      [in] (int)  precision of the buckets, 1..5
+        """
+        if not 1 <= significantDigits <= 5:
+            raise ValueError('significantDigits must be in [1..5]: %d' % significantDigits)
+        # end if
+        self.subBucketBits = int(math.ceil(math.log(2 * 10 ** significantDigits, 2)))
+        self.subBucketCount = 1 << self.subBucketBits
+        self.subBucketHalf = self.subBucketCount >> 1
+        self.highest = int(highest * 1e6)
+        self.counts = [0] * (self._getIndex(self.highest) + 1)
+        self.count = 0
+        self.min = None
+        self.max = None
+    # end def __init__
+
+    def _getIndex(self, value):
+        """
+        Gets the bucket of a value
+
+        @param  value                  [in] (int)  value in microseconds
+        @return (int) bucket index
+        """
+        if value < self.subBucketCount:
+            return value
+        # end if
+        shift = value.bit_length() - self.subBucketBits
+        return self.subBucketCount + (shift - 1) * self.subBucketHalf + (value >> shift) - self.subBucketHalf
+    # end def _getIndex
+
+    def _getHighestValue(self, index):
+        """
+        Gets the highest value counted in a bucket
+
+        @param  index                  [in] (int)  bucket index
+        @return (int) value in microseconds
+        """
+        if index < self.subBucketCount:
+            return index
+        # end if
+        shift, subBucket = divmod(index - self.subBucketCount, self.subBucketHalf)
+        shift += 1
+        return ((subBucket + self.subBucketHalf + 1) << shift) - 1
+    # end def _getHighestValue
+
+    def record(self, duration):
+        """
+        Counts one value
+
+        @param  duration               [in] (float)  value in seconds
+        """
+        value = min(max(int(duration * 1e6), 0), self.highest)
+        self.counts[self._getIndex(value)] += 1
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    # end def record
+
+    def getValueAtPercentile(self, percentile):
+        """
+        Gets the value below which a percentage of the values fall
+
+        @param  percentile             [in] (float)  percentage, 0..100
+        @return (float) value in seconds, None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        # end if
+        target = max(int(math.ceil(percentile / 100.0 * self.count)), 1)
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= target:
+                return min(self._getHighestValue(index), self.max) / 1e6
+            # end if
+        # end for
+        return self.max / 1e6
+    # end def getValueAtPercentile
+
+    def merge(self, other):
+        """
+        Adds the values of a histogram of the same precision
+
+        @param  other                  [in] (LatencyHistogram)  histogram to add
+        """
+        if other.subBucketBits != self.subBucketBits or len(other.counts) != len(self.counts):
+            raise ValueError('The histograms have different precisions')
+        # end if
+        self.counts = [count + otherCount for count, otherCount in zip(self.counts, other.counts)]
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+            # end if
+        # end for
+    # end def merge
+
+    def getSummary(self):
+        """
+        Gets the exported statistics
+
+        @return (dict) count, p50, p99 and max, in seconds
+        """
+        return {'count': self.count,
+                'p50': self.getValueAtPercentile(50),
+                'p99': self.getValueAtPercentile(99),
+                'max': None if self.max is None else self.max / 1e6}
+    # end def getSummary
+# end class LatencyHistogram
+
+
+class HiResWheelLatencyRecorder(object):
+    """
+    Round-trip latency of each 0x2121 function, per device
+
+    requestSent() starts a measure, responseReceived() ends the measure
+    with the same Device Index and SoftwareID. Error responses are counted
+    apart, under the function name followed by ERROR_SUFFIX, and requests
+    with an unknown function index under INVALID_FUNCTION.
+    """
+    FUNCTION_NAMES = dict((functionIndex, requestClass.__name__) for requestClass, functionIndex
+                          in HiResWheelRequestTemplates.FUNCTION_INDEXES.items())
+    INVALID_FUNCTION = 'InvalidFunction'
+    ERROR_SUFFIX = '.error'
+
+    def __init__(self, clock=SYSTEM_CLOCK, highest=60.0, significantDigits=2):
+        """
+        Constructor
+
+        @param  clock                  [in] (SystemClock)  time source of the measures
+        @param  highest                [in] (float)  highest trackable latency in seconds
+        @param  significantDigits      [in] (int)  precision of the histograms
+        """
+        self.clock = clock
+        self.highest = highest
+        self.significantDigits = significantDigits
+        self.pending = {}
+        self.histograms = {}
+        self.unmatched = 0
+    # end def __init__
+
+    def requestSent(self, deviceIndex, functionIndex, softwareId):
+        """
+        Starts the measure of a request
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  functionIndex          [in] (int)  function index of the request
+        @param  softwareId             [in] (int)  SoftwareID of the request
+        """
+        name = self.FUNCTION_NAMES.get(functionIndex, self.INVALID_FUNCTION)
+        self.pending[(deviceIndex, softwareId)] = (name, self.clock.time())
+    # end def requestSent
+
+    def responseReceived(self, deviceIndex, softwareId, error=False):
+        """
+        Ends the measure of a request
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  softwareId             [in] (int)  SoftwareID of the response
+        @param  error                  [in] (bool)  True for an error response
+        @return (float) round-trip latency in seconds, None if no request was pending
+        """
+        entry = self.pending.pop((deviceIndex, softwareId), None)
+        if entry is None:
+            self.unmatched += 1
+            return None
+        # end if
+        name, start = entry
+        duration = self.clock.time() - start
+        self.record(deviceIndex, name + self.ERROR_SUFFIX if error else name, duration)
+        return duration
+    # end def responseReceived
+
+    def record(self, deviceIndex, name, duration):
+        """
+        Counts one latency
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  name                   [in] (str)  function name
+        @param  duration               [in] (float)  latency in seconds
+        """
+        histogram = self.histograms.get((deviceIndex, name))
+        if histogram is None:
+            histogram = self.histograms[(deviceIndex, name)] = LatencyHistogram(self.highest, self.significantDigits)
+        # end if
+        histogram.record(duration)
+    # end def record
+
+    def getSummary(self):
+        """
+        Gets the statistics of every device and function
+
+        @return (dict) {'0x01': {function name: {count, p50, p99, max}}}, latencies in seconds
+        """
+        summary = {}
+        for (deviceIndex, name), histogram in sorted(self.histograms.items()):
+            summary.setdefault('0x%02X' % deviceIndex, {})[name] = histogram.getSummary()
+        # end for
+        return summary
+    # end def getSummary
+
+    def getReport(self):
+        """
+        Formats the statistics as a table
+
+        @return (str) one line per device and function, latencies in milliseconds
+        """
+        lines = ['%-6s %-34s %8s %10s %10s %10s' % ('Device', 'Function', 'Count', 'p50 (ms)', 'p99 (ms)', 'max (ms)')]
+        for device, functions in sorted(self.getSummary().items()):
+            for name, statistics in sorted(functions.items()):
+                lines.append('%-6s %-34s %8d %10.3f %10.3f %10.3f'
+                             % (device, name, statistics['count'], statistics['p50'] * 1e3,
+                                statistics['p99'] * 1e3, statistics['max'] * 1e3))
+            # end for
+        # end for
+        return '\n'.join(lines)
+    # end def getReport
+
+    def toJson(self):
+        """
+        Formats the statistics as JSON
+
+        @return (str) JSON document of getSummary()
+        """
+        return json.dumps(self.getSummary(), indent=2, sort_keys=True)
+    # end def toJson
+
+    def save(self, path):
+        """
+        Exports the statistics as JSON
+
+        @param  path                   [in] (str)  output file
+        """
+        with open(path, 'w') as outputFile:
+            outputFile.write(self.toJson() + '\n')
+        # end with
+    # end def save
+# end class HiResWheelLatencyRecorder
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelpipeline
+
+@brief  HID++ 2.0 request pipelining on the 4-bit SoftwareID
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from collections                     import OrderedDict
+from concurrent.futures              import Future
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelPipeline(object):
+    """
+    Keeps up to 15 HID++ requests in flight
+
+    Each outstanding request gets a distinct SoftwareID (1..15, 0 is reserved
+    for notifications). Requests are sent at once and the responses, errors
+    included, are matched back to their Future by SoftwareID, so N requests
+    cost about one round trip instead of N.
+
+    The transport is given as two callables:
+     - send(request): writes a request, a message or a HexList/bytearray report
+     - receive(responseClass): returns the next response or error message,
+       whichever comes first, responseClass being the one expected by the
+       oldest outstanding request. It returns None on timeout.
+
+    A request that timed out keeps its SoftwareID until drain(): a late
+    response is then dropped and counted in lateResponses, instead of being
+    taken for the response of a new request that reused the SoftwareID.
+    """
+    MAX_IN_FLIGHT = 15
+    SOFTWARE_IDS = tuple(range(1, MAX_IN_FLIGHT + 1))
+
+    def __init__(self, send, receive, maxInFlight=MAX_IN_FLIGHT):
+        """
+        Constructor
+
+        @param  send                   [in] (callable)  writes one request
+        @param  receive                [in] (callable)  reads the next response, see the class description
+        @param  maxInFlight            [in] (int)       maximum number of outstanding requests, 1..15
+        """
+        if not 1 <= maxInFlight <= self.MAX_IN_FLIGHT:
+            raise ValueError('maxInFlight must be in [1..%d]: %d' % (self.MAX_IN_FLIGHT, maxInFlight))
+        # end if
+        self.send = send
+        self.receive = receive
+        self.maxInFlight = maxInFlight
+        self.pending = OrderedDict()
+        self.timedOut = set()
+        self.lateResponses = 0
+    # end def __init__
+
+    def _isBusy(self, softwareId):
+        """
+        Tells whether a SoftwareID cannot be given to a new request
+
+        @param  softwareId             [in] (int)  SoftwareID, None for any
+        @return (bool) True if the SoftwareID, or every SoftwareID when None, is in use
+        """
+        if len(self.pending) + len(self.timedOut) >= self.maxInFlight:
+            return True
+        # end if
+        return softwareId in self.pending or softwareId in self.timedOut
+    # end def _isBusy
+
+    def submit(self, request, responseClass, softwareId=None):
+        """
+        Sends a request without waiting for its response
+
+        When maxInFlight requests are outstanding or timed out, or the
+        requested SoftwareID is in use, responses are read until a slot is
+        free. When only timed-out requests hold the slots, drain() is called.
+
+        @param  request                [in] (HiResWheel, HexList, bytearray)  request, its SoftwareID is overwritten
+        @param  responseClass          [in] (type)  expected response class
+        @param  softwareId             [in] (int)   SoftwareID to use, None to take a free one
+        @return (Future) resolved with the response or error message
+        """
+        if softwareId is not None and softwareId not in self.SOFTWARE_IDS:
+            raise ValueError('SoftwareID must be in [1..%d]: %d' % (self.MAX_IN_FLIGHT, softwareId))
+        # end if
+        while self._isBusy(softwareId):
+            if self.pending:
+                self._receiveOne()
+            else:
+                self.drain()
+            # end if
+        # end while
+        if softwareId is None:
+            softwareId = next(value for value in self.SOFTWARE_IDS
+                              if value not in self.pending and value not in self.timedOut)
+        # end if
+
+        if isinstance(request, (list, bytearray)):
+            request[3] = (request[3] & 0xF0) | softwareId
+        else:
+            request.softwareId = softwareId
+        # end if
+        future = Future()
+        self.pending[softwareId] = (future, responseClass)
+        self.send(request)
+        return future
+    # end def submit
+
+    def drain(self):
+        """
+        Reads the responses of every outstanding request, then frees the SoftwareIDs of the timed-out ones
+        """
+        while self.pending:
+            self._receiveOne()
+        # end while
+        self.timedOut.clear()
+    # end def drain
+
+    def _receiveOne(self):
+        """
+        Reads one response and resolves the matching Future
+        """
+        oldestSoftwareId, (oldestFuture, responseClass) = next(iter(self.pending.items()))
+        message = self.receive(responseClass)
+        if message is None:
+            del self.pending[oldestSoftwareId]
+            self.timedOut.add(oldestSoftwareId)
+            oldestFuture.set_exception(
+                AssertionError('No %s received for SoftwareID %d' % (responseClass.__name__, oldestSoftwareId)))
+            return
+        # end if
+        softwareId = int(message.softwareId)
+        if softwareId in self.timedOut:
+            self.timedOut.discard(softwareId)
+            self.lateResponses += 1
+            return
+        # end if
+        if softwareId not in self.pending:
+            raise AssertionError('Unexpected response for SoftwareID %d: %s' % (softwareId, message))
+        # end if
+        future, _ = self.pending.pop(softwareId)
+        future.set_result(message)
+    # end def _receiveOne
+# end class HiResWheelPipeline
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
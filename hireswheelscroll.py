@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelscroll
+
+@brief  HID++ 2.0 HiResWheel streaming scroll integrator
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel import WheelMovement
+
+import time
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class ScrollIntegrator(object):
+    """
+    Running totals over a stream of WheelMovement notifications
+
+    Every event is folded into a fixed set of counters, so the memory used
+    does not depend on the stream length. Distances are normalized with the
+    multiplier of GetWheelCapabilityResponse: a low resolution event of
+    deltaV counts one notch per unit, a high resolution event counts one
+    notch per multiplier units.
+    """
+    MAX_PERIODS = WheelMovement.PERIODS_MASK
+
+    def __init__(self, multiplier=1, clock=time.time):
+        """
+        Constructor
+
+        @param  multiplier             [in] (int)       high resolution counts per notch
+        @param  clock                  [in] (callable)  time source for events without a timestamp
+        """
+        self.clock = clock
+        self.setMultiplier(multiplier)
+        self.reset()
+    # end def __init__
+
+    def setMultiplier(self, multiplier):
+        """
+        Sets the high resolution counts per notch
+
+        @param  multiplier             [in] (int)  multiplier returned by GetWheelCapability
+        """
+        multiplier = int(multiplier)
+        if multiplier < 1:
+            raise ValueError('The multiplier must be positive: %d' % multiplier)
+        # end if
+        self.multiplier = multiplier
+    # end def setMultiplier
+
+    def setCapability(self, response):
+        """
+        Sets the multiplier from a GetWheelCapability response
+
+        @param  response               [in] (GetWheelCapabilityResponse)  capability of the device
+        """
+        self.setMultiplier(response.multiplier)
+    # end def setCapability
+
+    def reset(self):
+        """
+        Clears the totals
+        """
+        self.eventCount = 0
+        self.hiResEventCount = 0
+        self.hiResDeltaV = 0
+        self.loResDeltaV = 0
+        self.hiResTotal = 0
+        self.periodCounts = [0] * (self.MAX_PERIODS + 1)
+        self.reversals = 0
+        self.direction = 0
+        self.firstTimestamp = None
+        self.lastTimestamp = None
+    # end def reset
+
+    def add(self, event, timestamp=None):
+        """
+        Folds one notification into the totals
+
+        @param  event                  [in] (WheelMovement)  notification, a view or compact form also works
+        @param  timestamp              [in] (float)  reception time in seconds, defaults to event.timestamp or the clock
+        """
+        resAndPeriods = int(event.resAndPeriods)
+        deltaV = WheelMovement.getSignedDeltaV(event)
+        if resAndPeriods & WheelMovement.RESOLUTION_MASK:
+            self.hiResEventCount += 1
+            self.hiResDeltaV += deltaV
+            self.hiResTotal += deltaV
+        else:
+            self.loResDeltaV += deltaV
+            self.hiResTotal += deltaV * self.multiplier
+        # end if
+        self.periodCounts[resAndPeriods & WheelMovement.PERIODS_MASK] += 1
+
+        if deltaV:
+            direction = 1 if deltaV > 0 else -1
+            if self.direction and direction != self.direction:
+                self.reversals += 1
+            # end if
+            self.direction = direction
+        # end if
+
+        if timestamp is None:
+            timestamp = getattr(event, 'timestamp', None)
+            if timestamp is None:
+                timestamp = self.clock()
+            # end if
+        # end if
+        if self.firstTimestamp is None:
+            self.firstTimestamp = timestamp
+        # end if
+        self.lastTimestamp = timestamp
+        self.eventCount += 1
+    # end def add
+
+    def addAll(self, events):
+        """
+        Folds an iterable of notifications into the totals
+
+        @param  events                 [in] (iterable)  WheelMovement notifications
+        """
+        for event in events:
+            self.add(event)
+        # end for
+    # end def addAll
+
+    def getHiResDistance(self):
+        """
+        Gets the total scroll distance in high resolution counts
+
+        @return (int) signed distance
+        """
+        return self.hiResTotal
+    # end def getHiResDistance
+
+    def getLoResDistance(self):
+        """
+        Gets the total scroll distance in notches
+
+        @return (float) signed distance
+        """
+        return float(self.hiResTotal) / self.multiplier
+    # end def getLoResDistance
+
+    def getEventRate(self):
+        """
+        Gets the mean notification rate
+
+        @return (float) events per second, 0 if less than two events with distinct timestamps were received
+        """
+        if self.eventCount < 2 or self.lastTimestamp == self.firstTimestamp:
+            return 0.0
+        # end if
+        return (self.eventCount - 1) / float(self.lastTimestamp - self.firstTimestamp)
+    # end def getEventRate
+# end class ScrollIntegrator
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
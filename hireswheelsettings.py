@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pytestbox.hid.mouse.hireswheelsettings
+
+@brief  Product settings of the HiRes Wheel tests
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelSettings(object):
+    """
+    Read-only copy of the PRODUCT.MOUSE.HIRESWHEEL settings
+
+    The settings are converted once per session. Besides the individual
+    values, the record holds the expected encoded bytes of the
+    capabilities and wheelMode fields, so a response field can be checked
+    with a single comparison, after masking the bits the settings do not
+    describe (CAPABILITIES_MASK, WHEEL_MODE_MASK). On a mismatch,
+    decodeFields() and getDifferentFields() tell which settings differ.
+    """
+    __slots__ = ('multiplier',
+                 'hasSwitch',
+                 'hasInvert',
+                 'capabilities',
+                 'targetDefault',
+                 'resolutionDefault',
+                 'invertDefault',
+                 'defaultWheelMode',
+                 'target',
+                 'resolution',
+                 'invert',
+                 'wheelMode',
+                 'ratchetMode')
+
+    # Bit positions of the capabilities and wheelMode fields
+    HAS_SWITCH_BIT = 2
+    HAS_INVERT_BIT = 3
+    TARGET_BIT = 0
+    RESOLUTION_BIT = 1
+    INVERT_BIT = 2
+    # Bits of the capabilities and wheelMode fields described by the settings
+    CAPABILITIES_MASK = (1 << HAS_SWITCH_BIT) | (1 << HAS_INVERT_BIT)
+    WHEEL_MODE_MASK = (1 << TARGET_BIT) | (1 << RESOLUTION_BIT) | (1 << INVERT_BIT)
+    # Name and bit position of the settings encoded in the capabilities and wheelMode fields
+    CAPABILITIES_FIELDS = (('hasSwitch', HAS_SWITCH_BIT), ('hasInvert', HAS_INVERT_BIT))
+    WHEEL_MODE_FIELDS = (('target', TARGET_BIT), ('resolution', RESOLUTION_BIT), ('invert', INVERT_BIT))
+
+    def __init__(self, **settings):
+        """
+        Constructor
+
+        @param  settings               [in] (dict)  value of every slot but the encoded ones
+        """
+        for name, value in settings.items():
+            object.__setattr__(self, name, int(value))
+        # end for
+        object.__setattr__(self, 'capabilities', (self.hasSwitch << self.HAS_SWITCH_BIT)
+                                                 | (self.hasInvert << self.HAS_INVERT_BIT))
+        object.__setattr__(self, 'defaultWheelMode', self.encodeWheelMode(self.targetDefault,
+                                                                          self.resolutionDefault,
+                                                                          self.invertDefault))
+        object.__setattr__(self, 'wheelMode', self.encodeWheelMode(self.target, self.resolution, self.invert))
+    # end def __init__
+
+    @classmethod
+    def fromFeatures(cls, features):
+        """
+        Converts the product settings
+
+        @param  features               [in] (object)  settings returned by BaseTestCase.getFeatures()
+        @return (HiResWheelSettings) settings record
+        """
+        hiResWheel = features.PRODUCT.MOUSE.HIRESWHEEL
+        return cls(multiplier=hiResWheel.F_Multiplier,
+                   hasSwitch=hiResWheel.F_HasSwitch,
+                   hasInvert=hiResWheel.F_HasInvert,
+                   targetDefault=hiResWheel.F_Target_Default,
+                   resolutionDefault=hiResWheel.F_Resolution_Default,
+                   invertDefault=hiResWheel.F_Invert_Default,
+                   target=hiResWheel.F_Target,
+                   resolution=hiResWheel.F_Resolution,
+                   invert=hiResWheel.F_Invert,
+                   ratchetMode=hiResWheel.F_RatchetMode)
+    # end def fromFeatures
+
+    @classmethod
+    def encodeWheelMode(cls, target, resolution, invert):
+        """
+        Encodes the wheelMode field
+
+        @param  target                 [in] (int)  target bit
+        @param  resolution             [in] (int)  resolution bit
+        @param  invert                 [in] (int)  invert bit
+        @return (int) wheelMode byte
+        """
+        return (target << cls.TARGET_BIT) | (resolution << cls.RESOLUTION_BIT) | (invert << cls.INVERT_BIT)
+    # end def encodeWheelMode
+
+    @staticmethod
+    def decodeFields(value, fields):
+        """
+        Decodes the settings encoded in a field
+
+        @param  value                  [in] (int)    capabilities or wheelMode byte
+        @param  fields                 [in] (tuple)  CAPABILITIES_FIELDS or WHEEL_MODE_FIELDS
+        @return (dict) bit value by setting name
+        """
+        return dict((name, (value >> bit) & 1) for name, bit in fields)
+    # end def decodeFields
+
+    @staticmethod
+    def getDifferentFields(fields, expected, obtained):
+        """
+        Names the settings that differ between two encoded fields
+
+        @param  fields                 [in] (tuple)  CAPABILITIES_FIELDS or WHEEL_MODE_FIELDS
+        @param  expected               [in] (int)    expected byte
+        @param  obtained               [in] (int)    obtained byte
+        @return (list) names of the differing settings
+        """
+        return [name for name, bit in fields if ((expected ^ obtained) >> bit) & 1]
+    # end def getDifferentFields
+
+    def __setattr__(self, name, value):
+        raise AttributeError('HiResWheelSettings is read-only: %s' % name)
+    # end def __setattr__
+
+    def __repr__(self):
+        return 'HiResWheelSettings(%s)' % ', '.join('%s=%d' % (name, getattr(self, name)) for name in self.__slots__)
+    # end def __repr__
+# end class HiResWheelSettings
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheelstate
+
+@brief  HID++ 2.0 HiResWheel device state tracking
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import GetRatchetSwitchState
+from pyhid.hidpp.features.hireswheel      import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel      import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import HiResWheelRequestTemplates
+from pyhid.hidpp.features.hireswheel      import SetWheelMode
+from pyhid.hidpp.features.hireswheel      import SetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import WheelMovement
+from pyhid.hidpp.features.hireswheel      import messageClassOf
+from pyhid.hidpp.features.hireswheelclock import SYSTEM_CLOCK
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class WheelModeShadow(object):
+    """
+    Last wheelMode confirmed by each device
+
+    The shadow is only updated from SetWheelModeResponse and
+    GetWheelModeResponse, never from the requests. requestSent() forgets
+    the wheelMode when a SetWheelMode goes out, so a request the device
+    did not answer leaves the wheelMode unknown. An unknown wheelMode is
+    considered dirty. Only the target, resolution and invert bits are kept,
+    the reserved bits of wheelMode are ignored.
+    """
+    DEFAULT_WHEEL_MODE = 0
+
+    TARGET_MASK = 0x01
+    RESOLUTION_MASK = 0x02
+    INVERT_MASK = 0x04
+    WHEEL_MODE_MASK = TARGET_MASK | RESOLUTION_MASK | INVERT_MASK
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.wheelModes = {}
+        self.skippedRestores = 0
+    # end def __init__
+
+    def update(self, message):
+        """
+        Records the wheelMode carried by a response, other messages are ignored
+
+        @param  message                [in] (HidppMessage)  received message, full, compact or view
+        """
+        if issubclass(messageClassOf(message), (SetWheelModeResponse, GetWheelModeResponse)):
+            self.wheelModes[int(message.deviceIndex)] = int(message.wheelMode) & self.WHEEL_MODE_MASK
+        # end if
+    # end def update
+
+    def requestSent(self, deviceIndex, functionIndex):
+        """
+        Forgets the wheelMode of a device when a SetWheelMode is sent, until its response comes
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  functionIndex          [in] (int)  function index of the 0x2121 request
+        """
+        if functionIndex == HiResWheelRequestTemplates.FUNCTION_INDEXES[SetWheelMode]:
+            self.wheelModes.pop(deviceIndex, None)
+        # end if
+    # end def requestSent
+
+    def invalidate(self, deviceIndex=None):
+        """
+        Forgets the wheelMode of a device, after a reset or a reconnection
+
+        @param  deviceIndex            [in] (int)  Device Index, None for every device
+        """
+        if deviceIndex is None:
+            self.wheelModes.clear()
+        else:
+            self.wheelModes.pop(deviceIndex, None)
+        # end if
+    # end def invalidate
+
+    def getWheelMode(self, deviceIndex):
+        """
+        Gets the last confirmed wheelMode
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @return (int) wheelMode, None if unknown
+        """
+        return self.wheelModes.get(deviceIndex)
+    # end def getWheelMode
+
+    def isDirty(self, deviceIndex, wheelMode=DEFAULT_WHEEL_MODE):
+        """
+        Tells whether the device may not be in the given wheelMode
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  wheelMode              [in] (int)  expected wheelMode
+        @return (bool) True if the wheelMode differs or is unknown
+        """
+        return self.wheelModes.get(deviceIndex) != wheelMode & self.WHEEL_MODE_MASK
+    # end def isDirty
+
+    def restoreDefaultIfDirty(self, deviceIndex, featureIndex, send, receive, wheelMode=DEFAULT_WHEEL_MODE):
+        """
+        Sends SetWheelMode only when the device may not be in the default wheelMode
+
+        @param  deviceIndex            [in] (int)       Device Index
+        @param  featureIndex           [in] (int)       feature index of 0x2121
+        @param  send                   [in] (callable)  writes one request
+        @param  receive                [in] (callable)  returns the next message of the given class, None on timeout
+        @param  wheelMode              [in] (int)       default wheelMode
+        @return (SetWheelModeResponse) response, None if nothing was sent
+        """
+        if not self.isDirty(deviceIndex, wheelMode):
+            self.skippedRestores += 1
+            return None
+        # end if
+        send(SetWheelMode(deviceIndex, featureIndex, wheelMode=wheelMode))
+        response = receive(SetWheelModeResponse)
+        if response is None:
+            self.invalidate(deviceIndex)
+        else:
+            self.update(response)
+        # end if
+        return response
+    # end def restoreDefaultIfDirty
+# end class WheelModeShadow
+
+
+class HiResWheelStateMirror(WheelModeShadow):
+    """
+    Local copy of the HiRes Wheel state of each device
+
+    The mirror is fed with every received message: RatchetSwitch events and
+    GetRatchetSwitchState responses give the ratchetMode, wheel mode
+    responses give the target, resolution and invert bits and WheelMovement
+    events cross-check the resolution. A value is confident while nothing
+    contradicts it; a WheelMovement reported with another resolution, or a
+    call to markUncertain() after notifications were lost, makes it
+    uncertain until the device answers again.
+
+    The mirror only sees the messages actually read: a RatchetSwitch left
+    in the queue does not reach it. The ratchetMode is therefore confident
+    for ratchetModeMaxAge seconds after the message that reported it, then
+    the device is asked again.
+
+    In verify mode, getRatchetSwitchState() always asks the device and
+    counts the answers that differ from the mirror.
+    """
+    RATCHET_MODE = 'ratchetMode'
+    WHEEL_MODE = 'wheelMode'
+
+    def __init__(self, verify=False, ratchetModeMaxAge=0.1, clock=SYSTEM_CLOCK):
+        """
+        Constructor
+
+        @param  verify                 [in] (bool)         check every local answer against the device
+        @param  ratchetModeMaxAge      [in] (float)        time a ratchetMode stays confident, in seconds
+        @param  clock                  [in] (SystemClock)  time source of the ratchetMode age
+        """
+        super(HiResWheelStateMirror, self).__init__()
+        self.verify = verify
+        self.ratchetModeMaxAge = ratchetModeMaxAge
+        self.clock = clock
+        self.ratchetModes = {}
+        self.ratchetModeTimes = {}
+        self.uncertain = set()
+        self.localAnswers = 0
+        self.mismatches = 0
+    # end def __init__
+
+    def update(self, message):
+        """
+        Records the state carried by a message, other messages are ignored
+
+        @param  message                [in] (HidppMessage)  received message, full, compact or view
+        """
+        super(HiResWheelStateMirror, self).update(message)
+        messageClass = messageClassOf(message)
+        if issubclass(messageClass, (SetWheelModeResponse, GetWheelModeResponse)):
+            self.uncertain.discard((int(message.deviceIndex), self.WHEEL_MODE))
+        elif issubclass(messageClass, GetRatchetSwitchStateResponse):
+            # RatchetSwitch events derive from GetRatchetSwitchStateResponse
+            deviceIndex = int(message.deviceIndex)
+            self.ratchetModes[deviceIndex] = int(message.ratchetMode)
+            self.ratchetModeTimes[deviceIndex] = self.clock.time()
+            self.uncertain.discard((deviceIndex, self.RATCHET_MODE))
+        elif issubclass(messageClass, WheelMovement):
+            deviceIndex = int(message.deviceIndex)
+            wheelMode = self.wheelModes.get(deviceIndex)
+            hiRes = bool(int(message.resAndPeriods) & WheelMovement.RESOLUTION_MASK)
+            if wheelMode is not None and bool(wheelMode & self.RESOLUTION_MASK) != hiRes:
+                self.uncertain.add((deviceIndex, self.WHEEL_MODE))
+            # end if
+        # end if
+    # end def update
+
+    def invalidate(self, deviceIndex=None):
+        """
+        Forgets the state of a device, after a reset or a reconnection
+
+        @param  deviceIndex            [in] (int)  Device Index, None for every device
+        """
+        super(HiResWheelStateMirror, self).invalidate(deviceIndex)
+        if deviceIndex is None:
+            self.ratchetModes.clear()
+            self.ratchetModeTimes.clear()
+            self.uncertain.clear()
+        else:
+            self.ratchetModes.pop(deviceIndex, None)
+            self.ratchetModeTimes.pop(deviceIndex, None)
+            self.uncertain = set(item for item in self.uncertain if item[0] != deviceIndex)
+        # end if
+    # end def invalidate
+
+    def isDirty(self, deviceIndex, wheelMode=WheelModeShadow.DEFAULT_WHEEL_MODE):
+        """
+        Tells whether the device may not be in the given wheelMode, an uncertain wheelMode is dirty
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  wheelMode              [in] (int)  expected wheelMode
+        @return (bool) True if the wheelMode differs, is unknown or uncertain
+        """
+        return ((deviceIndex, self.WHEEL_MODE) in self.uncertain
+                or super(HiResWheelStateMirror, self).isDirty(deviceIndex, wheelMode))
+    # end def isDirty
+
+    def markUncertain(self, deviceIndex):
+        """
+        Flags the state of a device as possibly stale, when notifications were dropped for instance
+
+        @param  deviceIndex            [in] (int)  Device Index
+        """
+        self.uncertain.add((deviceIndex, self.RATCHET_MODE))
+        self.uncertain.add((deviceIndex, self.WHEEL_MODE))
+    # end def markUncertain
+
+    def getRatchetMode(self, deviceIndex):
+        """
+        Gets the mirrored ratchetMode
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @return (tuple) ratchetMode, None if unknown, and confidence flag, False once older than ratchetModeMaxAge
+        """
+        ratchetMode = self.ratchetModes.get(deviceIndex)
+        if ratchetMode is None or (deviceIndex, self.RATCHET_MODE) in self.uncertain:
+            return ratchetMode, False
+        # end if
+        return ratchetMode, self.clock.time() - self.ratchetModeTimes[deviceIndex] < self.ratchetModeMaxAge
+    # end def getRatchetMode
+
+    def _getWheelModeBit(self, deviceIndex, mask):
+        """
+        Gets one bit of the mirrored wheelMode
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @param  mask                   [in] (int)  bit mask
+        @return (tuple) bit value, None if unknown, and confidence flag
+        """
+        wheelMode = self.wheelModes.get(deviceIndex)
+        if wheelMode is None:
+            return None, False
+        # end if
+        return int(bool(wheelMode & mask)), (deviceIndex, self.WHEEL_MODE) not in self.uncertain
+    # end def _getWheelModeBit
+
+    def getTarget(self, deviceIndex):
+        """
+        Gets the mirrored target
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @return (tuple) target, None if unknown, and confidence flag
+        """
+        return self._getWheelModeBit(deviceIndex, self.TARGET_MASK)
+    # end def getTarget
+
+    def getResolution(self, deviceIndex):
+        """
+        Gets the mirrored resolution
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @return (tuple) resolution, None if unknown, and confidence flag
+        """
+        return self._getWheelModeBit(deviceIndex, self.RESOLUTION_MASK)
+    # end def getResolution
+
+    def getInvert(self, deviceIndex):
+        """
+        Gets the mirrored invert
+
+        @param  deviceIndex            [in] (int)  Device Index
+        @return (tuple) invert, None if unknown, and confidence flag
+        """
+        return self._getWheelModeBit(deviceIndex, self.INVERT_MASK)
+    # end def getInvert
+
+    def getRatchetSwitchState(self, deviceIndex, featureIndex, send, receive):
+        """
+        Gets the ratchetMode, from the mirror when it is confident
+
+        @param  deviceIndex            [in] (int)       Device Index
+        @param  featureIndex           [in] (int)       feature index of 0x2121
+        @param  send                   [in] (callable)  writes one request
+        @param  receive                [in] (callable)  returns the next message of the given class, None on timeout
+        @return (int) ratchetMode, None if the device did not answer
+        """
+        ratchetMode, confident = self.getRatchetMode(deviceIndex)
+        if confident and not self.verify:
+            self.localAnswers += 1
+            return ratchetMode
+        # end if
+
+        send(GetRatchetSwitchState(deviceIndex, featureIndex))
+        response = receive(GetRatchetSwitchStateResponse)
+        if response is None:
+            return None
+        # end if
+        if confident and int(response.ratchetMode) != ratchetMode:
+            self.mismatches += 1
+        # end if
+        self.update(response)
+        return int(response.ratchetMode)
+    # end def getRatchetSwitchState
+# end class HiResWheelStateMirror
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.hireswheeltransport
+
+@brief  HID++ 2.0 HiResWheel emulator transport
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error              import ErrorCodes
+from pyhid.hidpp.features.hireswheel         import HiResWheelClassifier
+from pyhid.hidpp.features.hireswheelcapture  import RECEIVED
+from pyhid.hidpp.features.hireswheeldispatch import HiResWheelMessageQueue
+from pyhid.hidpp.features.hireswheelemulator import HiResWheelEmulator
+from pylibrary.tools.hexlist                 import HexList
+
+import logging
+import select
+import threading
+
+
+# ----------------------------------------------------------------------------
+# constants
+# ----------------------------------------------------------------------------
+
+LOGGER = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelTransportQueue(HiResWheelMessageQueue):
+    """
+    Report queue of the transport, holding the reports getMessage() skipped
+
+    The held reports are still waiting to be read: qsize() and empty()
+    count them, and get() returns them first, in their arrival order.
+    """
+
+    def __init__(self, clock):
+        """
+        Constructor
+
+        @param  clock                  [in] (SystemClock)  time source of the waits
+        """
+        super(HiResWheelTransportQueue, self).__init__(clock)
+        self.heldReports = []
+    # end def __init__
+
+    def qsize(self):
+        """
+        Gets the number of reports waiting to be read
+
+        @return (int) held and queued reports
+        """
+        return len(self.heldReports) + len(self.messages)
+    # end def qsize
+
+    def _pop(self):
+        """
+        Removes the oldest report, held ones first
+
+        @return (HexList) oldest report
+        """
+        if self.heldReports:
+            return self.heldReports.pop(0)
+        # end if
+        return super(HiResWheelTransportQueue, self)._pop()
+    # end def _pop
+
+    def take(self, accept, timeout):
+        """
+        Removes the oldest report a predicate accepts, holding the reports read before it
+
+        @param  accept                 [in] (callable)  accept(report), True for the wanted report
+        @param  timeout                [in] (float)  maximum wait in seconds
+        @return (HexList) accepted report, None on timeout
+        """
+        with self.condition:
+            for position, report in enumerate(self.heldReports):
+                if accept(report):
+                    del self.heldReports[position]
+                    return report
+                # end if
+            # end for
+            deadline = self.clock.time() + timeout
+            while True:
+                remaining = deadline - self.clock.time()
+                if remaining <= 0 or not self.clock.waitFor(self.condition, lambda: self.messages, remaining):
+                    return None
+                # end if
+                report = self.messages.popleft()
+                if accept(report):
+                    return report
+                # end if
+                self.heldReports.append(report)
+            # end while
+        # end with
+    # end def take
+# end class HiResWheelTransportQueue
+
+
+class HiResWheelEmulatorTransport(object):
+    """
+    Device and HID dispatcher interface of BaseTestCase over a HiResWheelEmulator
+
+    sendReport() writes the requests on the host socket of the emulator. A
+    reader thread routes the reports of the emulator as the HID dispatcher
+    does: the error reports of the 0x2121 feature index to
+    errorMessageQueue, the responses and notifications to
+    mouseMessageQueue. getMessage() returns the first message of a class
+    and holds the other messages for the next calls. With a capture, every
+    report of the emulator is recorded as it arrives; a capture error is
+    logged and does not stop the reader thread.
+
+    Synchronous, the transport runs no thread: the requests are answered
+    by the calling thread and the reports of the emulator are routed as it
+    sends them. Every wait goes through the clock of the emulator, so with
+    a VirtualClock the waits of the host are what moves the device time.
+
+    Usage:
+        transport = HiResWheelEmulatorTransport(HiResWheelEmulator(deviceIndex=1, featureIndex=0x0B))
+        transport.start()
+        transport.sendReport(data=GetWheelMode(1, 0x0B))
+        response = transport.getMessage(queue=transport.mouseMessageQueue, classType=GetWheelModeResponse)
+        transport.close()
+    """
+    TIMEOUT = 2.0
+
+    def __init__(self, emulator, timeout=TIMEOUT, capture=None, synchronous=False):
+        """
+        Constructor
+
+        @param  emulator               [in] (HiResWheelEmulator)  emulated device, started by start()
+        @param  timeout                [in] (float)  default wait of getMessage(), in seconds
+        @param  capture                [in] (HiResWheelCaptureWriter)  records the reports read, None for no capture
+        @param  synchronous            [in] (bool)  answer the requests and route the reports without threads
+        """
+        self.emulator = emulator
+        self.timeout = timeout
+        self.capture = capture
+        self.synchronous = synchronous
+        self.clock = emulator.clock
+        self.classifier = HiResWheelClassifier(emulator.featureIndex)
+        self.mouseMessageQueue = HiResWheelTransportQueue(self.clock)
+        self.errorMessageQueue = HiResWheelTransportQueue(self.clock)
+        self.thread = None
+        self.running = False
+        self.ignoredReports = 0
+    # end def __init__
+
+    def start(self):
+        """
+        Starts the emulator and the reader thread
+        """
+        if self.synchronous:
+            self.emulator.output = self.dispatch
+            return
+        # end if
+        self.emulator.start()
+        self.running = True
+        self.thread = threading.Thread(target=self._read, name='HiResWheelEmulatorTransport')
+        self.thread.daemon = True
+        self.thread.start()
+    # end def start
+
+    def close(self):
+        """
+        Stops the reader thread and the emulator
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # end if
+        self.emulator.close()
+        self.emulator.output = None
+    # end def close
+
+    def sendReport(self, data):
+        """
+        Writes one request to the emulator
+
+        @param  data                   [in] (HidppMessage, HexList, bytearray)  request
+        """
+        report = bytes(bytearray(data if isinstance(data, (list, bytearray)) else data.toHexList()))
+        if self.synchronous:
+            self.emulator.request(report)
+        else:
+            self.emulator.host.send(report)
+        # end if
+    # end def sendReport
+
+    def _read(self):
+        """
+        Routes the reports of the emulator until close() is called
+        """
+        while self.running:
+            readable, _, _ = select.select([self.emulator.host], [], [], 0.05)
+            if not readable:
+                continue
+            # end if
+            try:
+                report = self.emulator.host.recv(HiResWheelEmulator.REPORT_SIZE)
+            except OSError:
+                break
+            # end try
+            if not report:
+                break
+            # end if
+            self.dispatch(report)
+        # end while
+    # end def _read
+
+    def dispatch(self, report):
+        """
+        Queues one report of the emulator
+
+        @param  report                 [in] (bytes)  raw report
+        """
+        report = HexList(bytearray(report))
+        if self.capture is not None:
+            try:
+                self.capture.write(RECEIVED, report)
+            except Exception:
+                LOGGER.exception('Emulator capture failed, report not recorded: %r', report)
+            # end try
+        # end if
+        if report[2] == HiResWheelEmulator.ERROR_FEATURE_INDEX and report[3] == self.classifier.featureIndex:
+            self.errorMessageQueue.put(report)
+        elif self.classifier.getMessageClass(report) is not None:
+            self.mouseMessageQueue.put(report)
+        else:
+            self.ignoredReports += 1
+        # end if
+    # end def dispatch
+
+    def _getMessageClass(self, queue, report):
+        """
+        Gets the message class of a queued report
+
+        @param  queue                  [in] (HiResWheelTransportQueue)  mouseMessageQueue or errorMessageQueue
+        @param  report                 [in] (HexList)  raw report
+        @return (type) message class
+        """
+        if queue is self.errorMessageQueue:
+            return ErrorCodes
+        # end if
+        return self.classifier.getMessageClass(report)
+    # end def _getMessageClass
+
+    def getMessage(self, queue, classType, timeout=None):
+        """
+        Gets the first message of a class
+
+        The class must match exactly: a RatchetSwitch event is not taken for
+        a GetRatchetSwitchStateResponse.
+
+        @param  queue                  [in] (HiResWheelTransportQueue)  mouseMessageQueue or errorMessageQueue
+        @param  classType              [in] (type)   message class
+        @param  timeout                [in] (float)  maximum wait in seconds, None for the transport timeout
+        @return (HidppMessage) decoded message, None on timeout
+        """
+        report = queue.take(lambda report: self._getMessageClass(queue, report) is classType,
+                            self.timeout if timeout is None else timeout)
+        return None if report is None else classType.fromHexList(report)
+    # end def getMessage
+# end class HiResWheelEmulatorTransport
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
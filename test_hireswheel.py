@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.test_hireswheel
+
+@brief  HID++ 2.0 HiResWheel compiled codec test module
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel import GetRatchetSwitchState
+from pyhid.hidpp.features.hireswheel import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel import GetWheelCapability
+from pyhid.hidpp.features.hireswheel import GetWheelCapabilityResponse
+from pyhid.hidpp.features.hireswheel import GetWheelMode
+from pyhid.hidpp.features.hireswheel import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel import HiResWheel
+from pyhid.hidpp.features.hireswheel import HiResWheelRequestTemplates
+from pyhid.hidpp.features.hireswheel import HiResWheelValidation
+from pyhid.hidpp.features.hireswheel import RatchetSwitch
+from pyhid.hidpp.features.hireswheel import SetWheelMode
+from pyhid.hidpp.features.hireswheel import SetWheelModeResponse
+from pyhid.hidpp.features.hireswheel import WheelMovement
+from pyhid.hidpp.hidppmessage        import HidppMessage
+from pylibrary.tools.hexlist         import HexList
+from pylibrary.tools.numeral         import Numeral
+
+from unittest                        import mock
+
+import unittest
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelLayoutTestCase(unittest.TestCase):
+    """
+    Compares the compiled HiResWheelLayout codec with the generic BitField codec
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+
+    def getMessages(self):
+        """
+        Gets one message of each class, with non-default field values
+
+        @return (list) messages
+        """
+        messages = [GetWheelCapability(self.DEVICE_INDEX, self.FEATURE_INDEX),
+                    GetWheelCapabilityResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, multiplier=8, capabilities=0x0C),
+                    GetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX),
+                    GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x05),
+                    SetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x07),
+                    SetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x07),
+                    GetRatchetSwitchState(self.DEVICE_INDEX, self.FEATURE_INDEX),
+                    GetRatchetSwitchStateResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=1),
+                    WheelMovement(self.DEVICE_INDEX, self.FEATURE_INDEX, resAndPeriods=0x13, deltaV=0xFFFE),
+                    RatchetSwitch(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=0)]
+        for message in messages:
+            message.softwareId = 0 if message.EVENT else 0x05
+        # end for
+        return messages
+    # end def getMessages
+
+    @staticmethod
+    def getPadding(message):
+        """
+        Gets a non-zero padding of the size of a message padding
+
+        @param  message                [in] (HiResWheel)  message
+        @return (HexList) padding bytes
+        """
+        _, _, _, _, size, _, _ = message.LAYOUT.getStep('padding')
+        return HexList(bytearray(range(0xA0, 0xA0 + size)))
+    # end def getPadding
+
+    def test_Encode(self):
+        """
+        Encodes every message class with both codecs, default and explicit padding
+        """
+        for message in self.getMessages():
+            self.assertEqual(HexList(message.toHexList()),
+                             HexList(super(HiResWheel, message).toHexList()),
+                             msg=type(message).__name__)
+            message.padding = self.getPadding(message)
+            self.assertEqual(HexList(message.toHexList()),
+                             HexList(super(HiResWheel, message).toHexList()),
+                             msg=type(message).__name__)
+        # end for
+    # end def test_Encode
+
+    def test_RoundTrip(self):
+        """
+        Decodes the report of every message class with both codecs and compares the fields
+        """
+        for message in self.getMessages():
+            message.padding = self.getPadding(message)
+            messageClass = type(message)
+            report = HexList(super(HiResWheel, message).toHexList())
+
+            compiled = messageClass.fromHexList(report)
+            generic = super(HiResWheel, messageClass).fromHexList(report)
+            for name, _, _, _, _, _, _ in messageClass.LAYOUT.steps:
+                value = getattr(compiled, name)
+                if isinstance(value, HexList):
+                    self.assertEqual(value, HexList(getattr(generic, name)),
+                                     msg='%s.%s' % (messageClass.__name__, name))
+                else:
+                    self.assertEqual(value, int(Numeral(getattr(generic, name))),
+                                     msg='%s.%s' % (messageClass.__name__, name))
+                # end if
+            # end for
+            self.assertIsInstance(compiled.padding, HexList)
+            self.assertEqual(HexList(compiled.toHexList()), report, msg=messageClass.__name__)
+        # end for
+    # end def test_RoundTrip
+# end class HiResWheelLayoutTestCase
+
+
+class HiResWheelValidationTestCase(unittest.TestCase):
+    """
+    Checks the validation modes of the trusted reports
+    """
+    REPORT_COUNT = 20
+
+    def setUp(self):
+        """
+        Prepares a WheelMovement report
+        """
+        super(HiResWheelValidationTestCase, self).setUp()
+        message = WheelMovement(0x01, 0x0B, resAndPeriods=0x01, deltaV=1)
+        message.softwareId = 0
+        self.report = HexList(message.toHexList())
+    # end def setUp
+
+    def decode(self, mode, samplePeriod=4):
+        """
+        Decodes trusted reports with a validation mode
+
+        @param  mode                   [in] (str)  validation mode
+        @param  samplePeriod           [in] (int)  sample period of the SAMPLED mode
+        @return (tuple) validation policy and number of field check runs
+        """
+        validation = HiResWheelValidation(mode, samplePeriod)
+        with mock.patch.object(WheelMovement, 'VALIDATION', validation), \
+                mock.patch.object(WheelMovement, 'checkFields') as checkFields:
+            for _ in range(self.REPORT_COUNT):
+                WheelMovement.fromHexList(self.report, trusted=True)
+            # end for
+        # end with
+        return validation, checkFields.call_count
+    # end def decode
+
+    def test_Modes(self):
+        """
+        Runs the field checks on every report, on one report out of samplePeriod or never
+        """
+        validation, fieldChecks = self.decode(HiResWheelValidation.FULL)
+        self.assertEqual((fieldChecks, validation.validated, validation.skipped),
+                         (self.REPORT_COUNT, self.REPORT_COUNT, 0))
+
+        validation, fieldChecks = self.decode(HiResWheelValidation.SAMPLED, samplePeriod=4)
+        self.assertEqual((fieldChecks, validation.validated, validation.skipped), (5, 5, 15))
+
+        validation, fieldChecks = self.decode(HiResWheelValidation.OFF)
+        self.assertEqual((fieldChecks, validation.validated, validation.skipped), (0, 0, self.REPORT_COUNT))
+    # end def test_Modes
+
+    def test_FieldChecksRun(self):
+        """
+        Runs the compiled field checks in FULL mode, without the generic BitField decoder
+        """
+        report = HexList(self.report)
+        report[5] = 0x100
+        with mock.patch.object(WheelMovement, 'VALIDATION', HiResWheelValidation(HiResWheelValidation.FULL)), \
+                mock.patch.object(HidppMessage, 'fromHexList') as fromHexList:
+            WheelMovement.fromHexList(self.report, trusted=True)
+            self.assertRaises(ValueError, WheelMovement.fromHexList, report, trusted=True)
+        # end with
+        self.assertEqual(fromHexList.call_count, 0)
+    # end def test_FieldChecksRun
+
+    def test_Length(self):
+        """
+        Rejects a report of the wrong length whatever the mode
+        """
+        for mode in (HiResWheelValidation.FULL, HiResWheelValidation.SAMPLED, HiResWheelValidation.OFF):
+            with mock.patch.object(WheelMovement, 'VALIDATION', HiResWheelValidation(mode)):
+                for report in (self.report + HexList(bytearray(5)), self.report[:-1]):
+                    self.assertRaises(ValueError, WheelMovement.fromHexList, report, trusted=True)
+                # end for
+            # end with
+        # end for
+    # end def test_Length
+# end class HiResWheelValidationTestCase
+
+
+class HiResWheelRequestTemplatesTestCase(unittest.TestCase):
+    """
+    Checks the requests built from the cached templates
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+
+    def test_IndependentRequests(self):
+        """
+        Returns a new buffer on every call, a later call leaves the earlier requests untouched
+        """
+        templates = HiResWheelRequestTemplates()
+        requests = [templates.getRequest(SetWheelMode, self.DEVICE_INDEX, self.FEATURE_INDEX, softwareId=softwareId,
+                                         wheelMode=wheelMode)
+                    for softwareId, wheelMode in ((1, 0x07), (2, 0x01))]
+
+        for request, (softwareId, wheelMode) in zip(requests, ((1, 0x07), (2, 0x01))):
+            expected = SetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=wheelMode)
+            expected.softwareId = softwareId
+            self.assertEqual(HexList(request), HexList(expected.toHexList()))
+        # end for
+        requests[0][4] = 0x00
+        self.assertEqual(templates.getRequest(SetWheelMode, self.DEVICE_INDEX, self.FEATURE_INDEX, softwareId=1)[4],
+                         0x07)
+    # end def test_IndependentRequests
+# end class HiResWheelRequestTemplatesTestCase
+
+
+if __name__ == '__main__':
+    unittest.main()
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
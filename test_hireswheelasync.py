@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.test_hireswheelasync
+
+@brief  HID++ 2.0 HiResWheel asyncio transport test module
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import GetWheelMode
+from pyhid.hidpp.features.hireswheel      import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheelasync import HiResWheelAsyncDevice
+
+import asyncio
+import socket
+import unittest
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelAsyncDeviceTestCase(unittest.TestCase):
+    """
+    Checks the SoftwareID allocation of HiResWheelAsyncDevice
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+    TIMEOUT = 0.01
+    QUARANTINE = 0.05
+
+    def setUp(self):
+        """
+        Prepares a device on one end of a socket pair, the test answering on the other end
+        """
+        super(HiResWheelAsyncDeviceTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.host, self.remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(self.host.close)
+        self.addCleanup(self.remote.close)
+        self.host.setblocking(False)
+        self.remote.settimeout(1.0)
+        self.device = HiResWheelAsyncDevice(self.host.fileno(), self.DEVICE_INDEX, self.FEATURE_INDEX,
+                                            loop=self.loop, quarantine=self.QUARANTINE)
+        self.device.start()
+        self.addCleanup(self.device.close)
+    # end def setUp
+
+    def answer(self, softwareId, wheelMode):
+        """
+        Sends a GetWheelModeResponse to the device
+
+        @param  softwareId             [in] (int)  SoftwareID of the response
+        @param  wheelMode              [in] (int)  wheelMode of the response
+        """
+        response = GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=wheelMode)
+        response.softwareId = softwareId
+        self.remote.send(bytes(bytearray(response.toHexList())))
+    # end def answer
+
+    def readSoftwareId(self):
+        """
+        Reads the SoftwareID of the next request sent by the device
+
+        @return (int) SoftwareID
+        """
+        return self.remote.recv(HiResWheelAsyncDevice.REPORT_SIZE)[3] & 0x0F
+    # end def readSoftwareId
+
+    async def lateResponse(self):
+        """
+        Lets a request time out, then answers it while a second request is outstanding
+
+        @return (tuple) SoftwareIDs of both requests, and the response of the second one
+        """
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.device.request(GetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX), timeout=self.TIMEOUT)
+        # end with
+        timedOutSoftwareId = self.readSoftwareId()
+
+        second = self.loop.create_task(self.device.request(GetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX)))
+        await asyncio.sleep(0)
+        softwareId = self.readSoftwareId()
+        self.answer(timedOutSoftwareId, wheelMode=1)
+        await asyncio.sleep(self.TIMEOUT)
+        self.answer(softwareId, wheelMode=2)
+        return timedOutSoftwareId, softwareId, await second
+    # end def lateResponse
+
+    def test_LateResponse(self):
+        """
+        Drops the late response of a timed-out request instead of resolving the request that follows
+        """
+        timedOutSoftwareId, softwareId, response = self.loop.run_until_complete(self.lateResponse())
+
+        self.assertNotEqual(softwareId, timedOutSoftwareId)
+        self.assertEqual((int(response.softwareId), int(response.wheelMode)), (softwareId, 2))
+        self.assertEqual((self.device.lateResponses, self.device.timedOut), (1, {}))
+    # end def test_LateResponse
+
+    async def quarantineOver(self):
+        """
+        Lets a request time out without answer, then sends another one after the quarantine
+
+        @return (tuple) SoftwareIDs of both requests
+        """
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.device.request(GetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX), timeout=self.TIMEOUT)
+        # end with
+        timedOutSoftwareId = self.readSoftwareId()
+        await asyncio.sleep(self.QUARANTINE)
+
+        second = self.loop.create_task(self.device.request(GetWheelMode(self.DEVICE_INDEX, self.FEATURE_INDEX)))
+        await asyncio.sleep(0)
+        softwareId = self.readSoftwareId()
+        self.answer(softwareId, wheelMode=2)
+        await second
+        return timedOutSoftwareId, softwareId
+    # end def quarantineOver
+
+    def test_QuarantineOver(self):
+        """
+        Reuses the SoftwareID of a timed-out request once its quarantine is over
+        """
+        timedOutSoftwareId, softwareId = self.loop.run_until_complete(self.quarantineOver())
+
+        self.assertEqual(softwareId, timedOutSoftwareId)
+        self.assertEqual(self.device.lateResponses, 0)
+    # end def test_QuarantineOver
+# end class HiResWheelAsyncDeviceTestCase
+
+
+if __name__ == '__main__':
+    unittest.main()
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
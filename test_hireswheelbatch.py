@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.test_hireswheelbatch
+
+@brief  HID++ 2.0 HiResWheel columnar batch decoding test module
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import RatchetSwitch
+from pyhid.hidpp.features.hireswheel      import WheelMovement
+from pyhid.hidpp.features.hireswheelbatch import decodeWheelMovements
+
+import unittest
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class DecodeWheelMovementsTestCase(unittest.TestCase):
+    """
+    Checks the rows kept by decodeWheelMovements()
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+
+    @staticmethod
+    def encode(message, softwareId=0):
+        """
+        Encodes a message with the given SoftwareID
+
+        @param  message                [in] (HiResWheel)  message to encode
+        @param  softwareId             [in] (int)  SoftwareID
+        @return (bytes) raw report
+        """
+        message.softwareId = softwareId
+        return bytes(bytearray(message.toHexList()))
+    # end def encode
+
+    def getWheelMovement(self, deltaV, featureIndex=FEATURE_INDEX, softwareId=0):
+        """
+        Encodes a WheelMovement notification of one period
+
+        @param  deltaV                 [in] (int)  signed wheel movement
+        @param  featureIndex           [in] (int)  feature index
+        @param  softwareId             [in] (int)  SoftwareID
+        @return (bytes) raw report
+        """
+        return self.encode(WheelMovement(self.DEVICE_INDEX, featureIndex, resAndPeriods=0x11,
+                                         deltaV=deltaV & 0xFFFF), softwareId)
+    # end def getWheelMovement
+
+    def test_Decode(self):
+        """
+        Decodes the resolution, periods and signed deltaV of each notification
+        """
+        result = decodeWheelMovements(self.getWheelMovement(3) + self.getWheelMovement(-2), self.FEATURE_INDEX)
+
+        self.assertEqual(list(result['deltaV']), [3, -2])
+        self.assertEqual((list(result['resolution']), list(result['periods'])), ([1, 1], [1, 1]))
+    # end def test_Decode
+
+    def test_OtherRowsDropped(self):
+        """
+        Keeps the WheelMovement notifications of the feature index only
+        """
+        data = b''.join((self.getWheelMovement(1),
+                         self.encode(RatchetSwitch(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=1)),
+                         self.encode(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0), 0x0A),
+                         self.getWheelMovement(2, featureIndex=self.FEATURE_INDEX + 1),
+                         self.getWheelMovement(3, softwareId=0x0A),
+                         self.getWheelMovement(4)))
+
+        self.assertEqual(list(decodeWheelMovements(data, self.FEATURE_INDEX)['deltaV']), [1, 4])
+    # end def test_OtherRowsDropped
+
+    def test_WrongLength(self):
+        """
+        Rejects a buffer that is not made of whole long reports
+        """
+        with self.assertRaises(ValueError):
+            decodeWheelMovements(self.getWheelMovement(1)[:-1], self.FEATURE_INDEX)
+        # end with
+    # end def test_WrongLength
+# end class DecodeWheelMovementsTestCase
+
+
+if __name__ == '__main__':
+    unittest.main()
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
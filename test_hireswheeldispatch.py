@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.test_hireswheeldispatch
+
+@brief  HID++ 2.0 HiResWheel message routing test module
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.error               import ErrorCodes
+from pyhid.hidpp.features.hireswheel          import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel          import RatchetSwitch
+from pyhid.hidpp.features.hireswheel          import WheelMovement
+from pyhid.hidpp.features.hireswheelcapture   import HiResWheelCaptureReader
+from pyhid.hidpp.features.hireswheelcapture   import HiResWheelCaptureWriter
+from pyhid.hidpp.features.hireswheelcapture   import RECEIVED
+from pyhid.hidpp.features.hireswheelclock     import VirtualClock
+from pyhid.hidpp.features.hireswheeldispatch  import HiResWheelRingBuffer
+from pyhid.hidpp.features.hireswheeldispatch  import HiResWheelRouter
+from pyhid.hidpp.features.hireswheeldispatch  import getConnectionKey
+from pyhid.hidpp.features.hireswheeldispatch  import resetConnection
+from pyhid.hidpp.features.hireswheelemulator  import HiResWheelEmulator
+from pyhid.hidpp.features.hireswheeltransport import HiResWheelEmulatorTransport
+from pylibrary.tools.hexlist                  import HexList
+
+from queue                                    import Queue
+from unittest                                 import mock
+
+import os
+import shutil
+import tempfile
+import threading
+import types
+import unittest
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class HiResWheelRouterTestCase(unittest.TestCase):
+    """
+    Checks the WheelMovement coalescing stage of HiResWheelRouter
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+    COALESCE_WINDOW = 0.01
+    EVENT_COUNT = 3
+
+    def getReport(self, deltaV):
+        """
+        Encodes a WheelMovement notification of one period
+
+        @param  deltaV                 [in] (int)  vertical wheel motion delta
+        @return (HexList) raw report
+        """
+        message = WheelMovement(self.DEVICE_INDEX, self.FEATURE_INDEX, resAndPeriods=0x01, deltaV=deltaV & 0xFFFF)
+        message.softwareId = 0
+        return message.toHexList()
+    # end def getReport
+
+    def test_CoalescedDuringWaitVirtualClock(self):
+        """
+        Releases the WheelMovement events dispatched during the wait when their window expires
+        """
+        clock = VirtualClock()
+        router = HiResWheelRouter(self.FEATURE_INDEX, coalesceWindow=self.COALESCE_WINDOW, clock=clock)
+        for index in range(self.EVENT_COUNT):
+            clock.callLater(0.1 + index * 0.001, router.dispatch, self.getReport(1))
+        # end for
+
+        message = router.getMessage(WheelMovement, timeout=1.0)
+
+        self.assertIsNotNone(message)
+        self.assertEqual(message.getSignedDeltaV(), self.EVENT_COUNT)
+        self.assertEqual(int(message.resAndPeriods) & WheelMovement.PERIODS_MASK, self.EVENT_COUNT)
+        self.assertLess(clock.time(), 0.2)
+    # end def test_CoalescedDuringWaitVirtualClock
+
+    def test_CoalescedDuringWait(self):
+        """
+        Releases the WheelMovement events dispatched by another thread during the wait
+        """
+        router = HiResWheelRouter(self.FEATURE_INDEX, coalesceWindow=self.COALESCE_WINDOW)
+
+        def dispatchEvents():
+            for _ in range(self.EVENT_COUNT):
+                router.dispatch(self.getReport(1))
+            # end for
+        # end def dispatchEvents
+
+        dispatcher = threading.Timer(0.05, dispatchEvents)
+        dispatcher.start()
+        try:
+            message = router.getMessage(WheelMovement, timeout=1.0)
+        finally:
+            dispatcher.join()
+        # end try
+
+        self.assertIsNotNone(message)
+        self.assertEqual(message.getSignedDeltaV(), self.EVENT_COUNT)
+    # end def test_CoalescedDuringWait
+
+    def test_ReleasedOnTimeout(self):
+        """
+        Releases a notification held without window when the wait times out
+        """
+        clock = VirtualClock()
+        router = HiResWheelRouter(self.FEATURE_INDEX, coalesceCount=10, clock=clock)
+        clock.callLater(0.1, router.dispatch, self.getReport(-2))
+
+        message = router.getMessage(WheelMovement, timeout=1.0)
+
+        self.assertIsNotNone(message)
+        self.assertEqual(message.getSignedDeltaV(), -2)
+    # end def test_ReleasedOnTimeout
+
+    def test_WaitForAny(self):
+        """
+        Wakes on the first message of either class, the error report of a request for instance
+        """
+        clock = VirtualClock()
+        router = HiResWheelRouter(self.FEATURE_INDEX, clock=clock)
+        errorReport = HexList([0x11, self.DEVICE_INDEX, 0xFF, self.FEATURE_INDEX, 0x4A, ErrorCodes.INVALID_FUNCTION_ID]
+                              + [0x00] * 14)
+        clock.callLater(0.1, router.dispatch, self.getReport(1))
+        clock.callLater(0.2, router.dispatch, errorReport)
+
+        self.assertIs(router.waitForAny((ErrorCodes, GetWheelModeResponse), timeout=1.0), ErrorCodes)
+        self.assertEqual(clock.time(), 0.2)
+        self.assertEqual(int(router.getMessage(ErrorCodes, timeout=0).errorCode), ErrorCodes.INVALID_FUNCTION_ID)
+        self.assertIsNone(router.waitForAny((ErrorCodes, GetWheelModeResponse), timeout=0.5))
+        self.assertEqual(clock.time(), 0.7)
+    # end def test_WaitForAny
+
+    def test_WaitForAnyThreaded(self):
+        """
+        Wakes on a message dispatched by another thread
+        """
+        router = HiResWheelRouter(self.FEATURE_INDEX)
+        timer = threading.Timer(0.05, router.dispatch, (self.getReport(1),))
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertIs(router.waitForAny((GetWheelModeResponse, WheelMovement), timeout=2.0), WheelMovement)
+    # end def test_WaitForAnyThreaded
+
+    def test_CaptureUnreadReports(self):
+        """
+        Records every dispatched report at its arrival time, read or not
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'run.hrwc')
+        clock = VirtualClock()
+        capture = HiResWheelCaptureWriter(path, clock=clock)
+        router = HiResWheelRouter(self.FEATURE_INDEX, clock=clock, capture=capture)
+        reports = [self.getReport(deltaV) for deltaV in range(1, self.EVENT_COUNT + 1)]
+        for report in reports:
+            clock.advance(0.01)
+            router.dispatch(report)
+        # end for
+        capture.close()
+
+        with HiResWheelCaptureReader(path) as reader:
+            records = [(timestamp, direction, bytes(payload)) for timestamp, direction, payload in reader]
+        # end with
+        self.assertEqual(records, [(0.01 * (index + 1), RECEIVED, bytes(bytearray(report)))
+                                   for index, report in enumerate(reports)])
+    # end def test_CaptureUnreadReports
+
+    def test_CaptureErrorLogged(self):
+        """
+        Routes the reports when the capture cannot record them
+        """
+        capture = mock.Mock()
+        capture.write.side_effect = OSError('No space left on device')
+        router = HiResWheelRouter(self.FEATURE_INDEX, capture=capture)
+
+        with self.assertLogs('pyhid.hidpp.features.hireswheeldispatch', 'ERROR'):
+            self.assertTrue(router.dispatch(self.getReport(2)))
+        # end with
+        self.assertEqual(router.getMessage(WheelMovement, timeout=0).getSignedDeltaV(), 2)
+    # end def test_CaptureErrorLogged
+
+    def test_InstalledOnDispatcher(self):
+        """
+        Takes the 0x2121 reports out of the HID dispatcher queues, and leaves it the others even on a router error
+        """
+        dispatcher = types.SimpleNamespace(mouseMessageQueue=Queue(), errorMessageQueue=Queue())
+        mouseMessageQueue = dispatcher.mouseMessageQueue
+        router = HiResWheelRouter(self.FEATURE_INDEX)
+        router.install(dispatcher)
+        otherReport = HexList([0x11, self.DEVICE_INDEX, 0x05] + [0x00] * 17)
+
+        dispatcher.mouseMessageQueue.put(self.getReport(2))
+        dispatcher.mouseMessageQueue.put(otherReport)
+        with mock.patch.object(router.classifier, 'getMessageClass', side_effect=RuntimeError):
+            dispatcher.mouseMessageQueue.put(self.getReport(3))
+        # end with
+        router.uninstall(dispatcher)
+        dispatcher.mouseMessageQueue.put(self.getReport(4))
+
+        self.assertEqual(router.getMessage(WheelMovement, timeout=0).getSignedDeltaV(), 2)
+        self.assertIsNone(router.getMessage(WheelMovement, timeout=0))
+        self.assertEqual([mouseMessageQueue.get_nowait() for _ in range(mouseMessageQueue.qsize())],
+                         [otherReport, self.getReport(3), self.getReport(4)])
+    # end def test_InstalledOnDispatcher
+
+    def test_OverflowOnDispatcherPath(self):
+        """
+        Keeps the newest WheelMovement events read by the HID dispatcher when the test reads them too late
+        """
+        capacity = 4
+        eventCount = 10
+        emulator = HiResWheelEmulator(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=HiResWheelEmulator.TARGET_MASK)
+        transport = HiResWheelEmulatorTransport(emulator)
+        emulator.output = transport.dispatch
+        router = HiResWheelRouter(self.FEATURE_INDEX, eventCapacity=capacity,
+                                  overflowPolicy=HiResWheelRingBuffer.DROP_OLDEST)
+        router.install(transport)
+        for deltaV in range(1, eventCount + 1):
+            emulator.spin(deltaV, periods=1)
+        # end for
+
+        events = router.getQueue(WheelMovement)
+        self.assertEqual((events.received, events.dropped, events.highWaterMark),
+                         (eventCount, eventCount - capacity, capacity))
+        self.assertEqual([router.getMessage(WheelMovement, timeout=0).getSignedDeltaV() for _ in range(capacity)],
+                         list(range(eventCount - capacity + 1, eventCount + 1)))
+        self.assertTrue(transport.mouseMessageQueue.empty())
+    # end def test_OverflowOnDispatcherPath
+
+    def test_ConnectionKey(self):
+        """
+        Keeps the connection key of a device until a DeviceConnection notification, a reset or a new dispatcher
+        """
+        dispatcher = types.SimpleNamespace(mouseMessageQueue=Queue(), errorMessageQueue=Queue())
+        deviceConnection = HexList([0x10, self.DEVICE_INDEX, 0x41, 0x04, 0x01, 0x00, 0x00])
+        key = getConnectionKey(dispatcher, self.DEVICE_INDEX)
+
+        dispatcher.mouseMessageQueue.put(self.getReport(2))
+        dispatcher.mouseMessageQueue.put(HexList([0x10, self.DEVICE_INDEX + 1, 0x41, 0x04, 0x01, 0x00, 0x00]))
+        self.assertEqual(getConnectionKey(dispatcher, self.DEVICE_INDEX), key)
+
+        dispatcher.mouseMessageQueue.put(deviceConnection)
+        reconnectedKey = getConnectionKey(dispatcher, self.DEVICE_INDEX)
+        self.assertNotEqual(reconnectedKey, key)
+        self.assertEqual(dispatcher.mouseMessageQueue.qsize(), 3)
+
+        resetConnection(dispatcher, self.DEVICE_INDEX)
+        self.assertNotIn(getConnectionKey(dispatcher, self.DEVICE_INDEX), (key, reconnectedKey))
+
+        otherDispatcher = types.SimpleNamespace(mouseMessageQueue=Queue(), errorMessageQueue=Queue())
+        self.assertNotEqual(getConnectionKey(otherDispatcher, self.DEVICE_INDEX), key)
+    # end def test_ConnectionKey
+
+    def test_TransportHeldReports(self):
+        """
+        Counts the reports the transport held while waiting for another class as still queued
+        """
+        emulator = HiResWheelEmulator(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=HiResWheelEmulator.TARGET_MASK,
+                                      clock=VirtualClock())
+        transport = HiResWheelEmulatorTransport(emulator, synchronous=True)
+        transport.start()
+        for deltaV in (2, 3):
+            emulator.spin(deltaV)
+        # end for
+        emulator.toggleRatchet()
+
+        ratchetSwitch = transport.getMessage(transport.mouseMessageQueue, RatchetSwitch)
+        self.assertEqual(int(ratchetSwitch.ratchetMode), emulator.ratchetMode)
+        self.assertEqual(emulator.clock.time(), HiResWheelEmulator.SWITCH_TIME)
+        self.assertFalse(transport.mouseMessageQueue.empty())
+        self.assertEqual(transport.mouseMessageQueue.qsize(), 2)
+        self.assertEqual(transport.getMessage(transport.mouseMessageQueue, WheelMovement).getSignedDeltaV(), 2)
+        self.assertEqual(WheelMovement.fromHexList(transport.mouseMessageQueue.get_nowait()).getSignedDeltaV(), 3)
+        self.assertTrue(transport.mouseMessageQueue.empty())
+        transport.close()
+    # end def test_TransportHeldReports
+# end class HiResWheelRouterTestCase
+
+
+if __name__ == '__main__':
+    unittest.main()
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------
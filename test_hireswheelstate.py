@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+# ------------------------------------------------------------------------------
+# Python Test Box
+# ------------------------------------------------------------------------------
+""" @package    pyhid.hidpp.features.test_hireswheelstate
+
+@brief  HID++ 2.0 HiResWheel device state tracking test module
+
+@author Andy Su
+
+@date   2019/3/19
+"""
+# ----------------------------------------------------------------------------
+# imports
+# ----------------------------------------------------------------------------
+
+from pyhid.hidpp.features.hireswheel      import GetRatchetSwitchStateResponse
+from pyhid.hidpp.features.hireswheel      import GetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import RatchetSwitch
+from pyhid.hidpp.features.hireswheel      import SetWheelMode
+from pyhid.hidpp.features.hireswheel      import SetWheelModeResponse
+from pyhid.hidpp.features.hireswheel      import WheelMovement
+from pyhid.hidpp.features.hireswheelclock import VirtualClock
+from pyhid.hidpp.features.hireswheelstate import HiResWheelStateMirror
+from pyhid.hidpp.features.hireswheelstate import WheelModeShadow
+
+import unittest
+
+
+# ----------------------------------------------------------------------------
+# implementation
+# ----------------------------------------------------------------------------
+
+
+class WheelModeShadowTestCase(unittest.TestCase):
+    """
+    Checks when WheelModeShadow restores the default wheelMode
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+    SET_WHEEL_MODE = 2
+    GET_WHEEL_MODE = 1
+
+    def setUp(self):
+        """
+        Prepares a shadow and a device answering SetWheelMode
+        """
+        super(WheelModeShadowTestCase, self).setUp()
+        self.shadow = WheelModeShadow()
+        self.requests = []
+        self.answered = True
+    # end def setUp
+
+    def restoreDefaultIfDirty(self):
+        """
+        Restores the default wheelMode through the shadow
+
+        @return (SetWheelModeResponse) response, None if nothing was sent or the device did not answer
+        """
+        def receive(responseClass):
+            if not self.answered:
+                return None
+            # end if
+            return responseClass(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=self.requests[-1].wheelMode)
+        # end def receive
+        return self.shadow.restoreDefaultIfDirty(self.DEVICE_INDEX, self.FEATURE_INDEX,
+                                                 send=self.requests.append, receive=receive)
+    # end def restoreDefaultIfDirty
+
+    def test_SkippedRestore(self):
+        """
+        Sends nothing when the device confirmed the default wheelMode
+        """
+        self.shadow.update(SetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX,
+                                                wheelMode=WheelModeShadow.DEFAULT_WHEEL_MODE))
+
+        self.assertIsNone(self.restoreDefaultIfDirty())
+        self.assertEqual((self.requests, self.shadow.skippedRestores), ([], 1))
+    # end def test_SkippedRestore
+
+    def test_RestoreAfterUnansweredSetWheelMode(self):
+        """
+        Restores the default wheelMode when a SetWheelMode was sent and not answered
+        """
+        self.shadow.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX,
+                                                wheelMode=WheelModeShadow.DEFAULT_WHEEL_MODE))
+        self.shadow.requestSent(self.DEVICE_INDEX, self.GET_WHEEL_MODE)
+        self.assertFalse(self.shadow.isDirty(self.DEVICE_INDEX))
+        self.shadow.requestSent(self.DEVICE_INDEX, self.SET_WHEEL_MODE)
+        self.assertIsNone(self.shadow.getWheelMode(self.DEVICE_INDEX))
+
+        response = self.restoreDefaultIfDirty()
+        self.assertEqual([type(request) for request in self.requests], [SetWheelMode])
+        self.assertEqual(int(response.wheelMode), WheelModeShadow.DEFAULT_WHEEL_MODE)
+        self.assertEqual(self.shadow.getWheelMode(self.DEVICE_INDEX), WheelModeShadow.DEFAULT_WHEEL_MODE)
+        self.assertEqual(self.shadow.skippedRestores, 0)
+    # end def test_RestoreAfterUnansweredSetWheelMode
+
+    def test_InvalidatedOnTimeout(self):
+        """
+        Forgets the wheelMode when the restoring SetWheelMode is not answered
+        """
+        self.shadow.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x05))
+        self.answered = False
+
+        self.assertIsNone(self.restoreDefaultIfDirty())
+        self.assertEqual(len(self.requests), 1)
+        self.assertIsNone(self.shadow.getWheelMode(self.DEVICE_INDEX))
+        self.assertTrue(self.shadow.isDirty(self.DEVICE_INDEX))
+    # end def test_InvalidatedOnTimeout
+
+    def test_ReservedBitsMasked(self):
+        """
+        Keeps the target, resolution and invert bits only
+        """
+        self.shadow.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0xF8))
+
+        self.assertEqual(self.shadow.getWheelMode(self.DEVICE_INDEX), WheelModeShadow.DEFAULT_WHEEL_MODE)
+        self.assertIsNone(self.restoreDefaultIfDirty())
+        self.assertEqual(self.shadow.skippedRestores, 1)
+    # end def test_ReservedBitsMasked
+# end class WheelModeShadowTestCase
+
+
+class HiResWheelStateMirrorTestCase(unittest.TestCase):
+    """
+    Checks the ratchetMode answers of HiResWheelStateMirror
+    """
+    DEVICE_INDEX = 0x01
+    FEATURE_INDEX = 0x0B
+    MAX_AGE = 0.1
+
+    def setUp(self):
+        """
+        Prepares a mirror and a device answering GetRatchetSwitchState
+        """
+        super(HiResWheelStateMirrorTestCase, self).setUp()
+        self.clock = VirtualClock()
+        self.mirror = HiResWheelStateMirror(ratchetModeMaxAge=self.MAX_AGE, clock=self.clock)
+        self.requests = []
+        self.deviceRatchetMode = 1
+    # end def setUp
+
+    def getRatchetSwitchState(self):
+        """
+        Gets the ratchetMode through the mirror
+
+        @return (int) ratchetMode
+        """
+        return self.mirror.getRatchetSwitchState(
+            self.DEVICE_INDEX, self.FEATURE_INDEX,
+            send=self.requests.append,
+            receive=lambda responseClass: responseClass(self.DEVICE_INDEX, self.FEATURE_INDEX,
+                                                        ratchetMode=self.deviceRatchetMode))
+    # end def getRatchetSwitchState
+
+    def test_LocalAnswer(self):
+        """
+        Answers from the mirror while the consumed RatchetSwitch is fresh
+        """
+        self.mirror.update(RatchetSwitch(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=0))
+        self.clock.advance(self.MAX_AGE / 2)
+
+        self.assertEqual(self.getRatchetSwitchState(), 0)
+        self.assertEqual((self.requests, self.mirror.localAnswers), ([], 1))
+    # end def test_LocalAnswer
+
+    def test_StaleAnswer(self):
+        """
+        Asks the device once the ratchetMode is older than ratchetModeMaxAge, a RatchetSwitch may be unread
+        """
+        self.mirror.update(GetRatchetSwitchStateResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=0))
+        self.clock.advance(self.MAX_AGE)
+
+        self.assertEqual(self.mirror.getRatchetMode(self.DEVICE_INDEX), (0, False))
+        self.assertEqual(self.getRatchetSwitchState(), self.deviceRatchetMode)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.mirror.getRatchetMode(self.DEVICE_INDEX), (self.deviceRatchetMode, True))
+    # end def test_StaleAnswer
+
+    def getWheelModeBits(self):
+        """
+        Gets the mirrored wheelMode bits
+
+        @return (tuple) target, resolution and invert, each with its confidence flag
+        """
+        return (self.mirror.getTarget(self.DEVICE_INDEX), self.mirror.getResolution(self.DEVICE_INDEX),
+                self.mirror.getInvert(self.DEVICE_INDEX))
+    # end def getWheelModeBits
+
+    def test_WheelModeBits(self):
+        """
+        Splits the confirmed wheelMode in its target, resolution and invert bits
+        """
+        self.assertEqual(self.getWheelModeBits(), ((None, False), (None, False), (None, False)))
+
+        self.mirror.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x05))
+        self.assertEqual(self.getWheelModeBits(), ((1, True), (0, True), (1, True)))
+
+        self.mirror.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x02))
+        self.assertEqual(self.getWheelModeBits(), ((0, True), (1, True), (0, True)))
+    # end def test_WheelModeBits
+
+    def test_ResolutionMismatch(self):
+        """
+        Makes the wheelMode uncertain when a WheelMovement reports another resolution, until the device answers
+        """
+        self.mirror.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x03))
+        self.mirror.update(WheelMovement(self.DEVICE_INDEX, self.FEATURE_INDEX, resAndPeriods=0x11, deltaV=1))
+        self.assertEqual(self.mirror.getResolution(self.DEVICE_INDEX), (1, True))
+
+        self.mirror.update(WheelMovement(self.DEVICE_INDEX, self.FEATURE_INDEX, resAndPeriods=0x01, deltaV=1))
+        self.assertEqual(self.getWheelModeBits(), ((1, False), (1, False), (0, False)))
+        self.assertTrue(self.mirror.isDirty(self.DEVICE_INDEX, 0x03))
+
+        self.mirror.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x01))
+        self.assertEqual(self.getWheelModeBits(), ((1, True), (0, True), (0, True)))
+        self.assertFalse(self.mirror.isDirty(self.DEVICE_INDEX, 0x01))
+    # end def test_ResolutionMismatch
+
+    def test_MarkUncertain(self):
+        """
+        Asks the device again for a state marked uncertain, however fresh
+        """
+        self.mirror.update(RatchetSwitch(self.DEVICE_INDEX, self.FEATURE_INDEX, ratchetMode=0))
+        self.mirror.update(GetWheelModeResponse(self.DEVICE_INDEX, self.FEATURE_INDEX, wheelMode=0x00))
+        self.mirror.markUncertain(self.DEVICE_INDEX)
+
+        self.assertEqual(self.mirror.getRatchetMode(self.DEVICE_INDEX), (0, False))
+        self.assertEqual(self.mirror.getTarget(self.DEVICE_INDEX), (0, False))
+        self.assertTrue(self.mirror.isDirty(self.DEVICE_INDEX, 0x00))
+        self.assertEqual(self.getRatchetSwitchState(), self.deviceRatchetMode)
+        self.assertEqual((len(self.requests), self.mirror.localAnswers), (1, 0))
+        self.assertEqual(self.mirror.getRatchetMode(self.DEVICE_INDEX), (self.deviceRatchetMode, True))
+    # end def test_MarkUncertain
+# end class HiResWheelStateMirrorTestCase
+
+
+if __name__ == '__main__':
+    unittest.main()
+# end if
+
+# ----------------------------------------------------------------------------
+# END OF FILE
+# ----------------------------------------------------------------------------